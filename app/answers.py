@@ -0,0 +1,120 @@
+import prepared
+
+# Answers arrive as the text the exam page sends: "0,2" for choice questions
+# and free text for short answers. Choice answers are stored as a bitmask in
+# answer_mask (see choice_mask in database.py) and short answers in
+# answer_text, so grading a choice question is one integer compare against
+# questions.correct_mask.
+
+# Starts a submission, or resumes the student's existing one, in one round
+# trip. A sitting provisioned ahead of time (see prewarm.py) is claimed by
+# flipping it to 'in-progress'; otherwise the upsert only inserts for a first
+# visit. A resume gets back the answers saved so far ("0,2" or the text,
+# keyed by question id), the seconds left, counted on the server from
+# when the submission started, and the paper stored once it was drawn.
+# $1 student id, $2 exam id, $3 seed for a new submission, $4 duration in minutes.
+START_SUBMISSION_QUERY = """
+    WITH claimed AS (
+        UPDATE exam_submissions SET status = 'in-progress', start_time = LOCALTIMESTAMP
+        WHERE student_id = $1 AND exam_id = $2 AND status = 'not-started'
+        RETURNING id, seed, paper, status, start_time, TRUE AS started
+    ), created AS (
+        INSERT INTO exam_submissions (student_id, exam_id, seed)
+        SELECT $1, $2, $3 WHERE NOT EXISTS (SELECT 1 FROM claimed)
+        ON CONFLICT (student_id, exam_id) DO NOTHING
+        RETURNING id, seed, paper, status, start_time, TRUE AS started
+    ), submission AS (
+        SELECT * FROM claimed
+        UNION ALL
+        SELECT * FROM created
+        UNION ALL
+        SELECT id, seed, paper, status, start_time, FALSE FROM exam_submissions
+        WHERE student_id = $1 AND exam_id = $2 AND status <> 'not-started'
+    )
+    SELECT s.id, s.seed, s.paper, s.status, s.started,
+           GREATEST(0, CEIL(EXTRACT(EPOCH FROM COALESCE(s.start_time, LOCALTIMESTAMP) + make_interval(mins => $4) - LOCALTIMESTAMP)))::int AS remaining,
+           (SELECT COALESCE(jsonb_object_agg(sa.question_id, COALESCE(sa.answer_text, choice_text(sa.answer_mask))), '{}')
+            FROM student_answers sa WHERE sa.submission_id = s.id) AS answers
+    FROM submission s
+"""
+
+
+def latest_answers(submission_id, answers):
+    """Collapses a batch of answer deltas to the newest one per question.
+
+    Returns (submission_id, question_id, seq, answer_text) rows keyed by question id.
+    """
+    latest = {}
+    for answer in answers:
+        question_id = int(answer['question_id'])
+        seq = int(answer['seq'])
+        if question_id not in latest or latest[question_id][2] < seq:
+            latest[question_id] = (submission_id, question_id, seq, answer['answer_text'])
+    return latest
+
+
+# Upserts a batch of answer deltas, collapsed by latest_answers, in one
+# statement. A row is only overwritten by a delta with a higher seq, and
+# xmax is 0 only for freshly inserted rows, which tells new answers from
+# overwrites. $1 submission id, then the question ids, seqs and answer
+# texts as parallel arrays (see save_answers_params).
+SAVE_ANSWERS_QUERY = """
+    INSERT INTO student_answers (submission_id, question_id, seq, answer_text, answer_mask)
+    SELECT $1, a.question_id, a.seq,
+           CASE WHEN q.question_type = 'short-answer' THEN a.answer_text END,
+           CASE WHEN q.question_type <> 'short-answer' THEN choice_mask(a.answer_text) END
+    FROM unnest($2::int[], $3::bigint[], $4::text[]) AS a(question_id, seq, answer_text)
+    JOIN questions q ON q.id = a.question_id
+    ON CONFLICT (submission_id, question_id) DO UPDATE
+        SET answer_text = EXCLUDED.answer_text, answer_mask = EXCLUDED.answer_mask, seq = EXCLUDED.seq
+        WHERE student_answers.seq IS NULL OR student_answers.seq < EXCLUDED.seq
+    RETURNING (xmax = 0) AS inserted
+"""
+prepared.register('save_answers', 'int, int[], bigint[], text[]', SAVE_ANSWERS_QUERY)
+
+# Saves one answer outside a batch, overwriting whatever was there, if the
+# submission is the student's and still in progress. No row means it
+# isn't; a NULL inserted means there is no such question.
+# $1 submission id, $2 question id, $3 answer text, $4 student id.
+SAVE_ANSWER_QUERY = """
+    WITH submission AS (
+        SELECT id, exam_id FROM exam_submissions WHERE id = $1 AND student_id = $4 AND status = 'in-progress'
+    ), saved AS (
+        INSERT INTO student_answers (submission_id, question_id, answer_text, answer_mask)
+        SELECT s.id, q.id,
+               CASE WHEN q.question_type = 'short-answer' THEN $3::text END,
+               CASE WHEN q.question_type <> 'short-answer' THEN choice_mask($3::text) END
+        FROM submission s, questions q WHERE q.id = $2
+        ON CONFLICT (submission_id, question_id) DO UPDATE
+            SET answer_text = EXCLUDED.answer_text, answer_mask = EXCLUDED.answer_mask
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT s.exam_id, saved.inserted FROM submission s LEFT JOIN saved ON TRUE
+"""
+
+
+def save_answers_params(submission_id, latest):
+    """Returns the SAVE_ANSWERS_QUERY parameters for the rows from latest_answers."""
+    rows = list(latest.values())
+    return submission_id, [row[1] for row in rows], [row[2] for row in rows], [row[3] for row in rows]
+
+
+def saved_counts(latest, saved):
+    """Returns the highest seq in a batch and how many of its saved rows were new answers."""
+    return max(row[2] for row in latest.values()), sum(1 for row in saved if row[0])
+
+
+def save_answers(cur, submission_id, answers):
+    """Upserts a batch of answer deltas for one submission in a single statement.
+
+    answers is a list of dicts with question_id, answer_text and seq. Deltas
+    are idempotent and last-writer-wins: a row is only overwritten by a delta
+    with a higher seq, so replaying a batch after a lost response is harmless.
+    Returns the highest seq in the batch and the number of questions that
+    had no answer before.
+    """
+    latest = latest_answers(submission_id, answers)
+    if not latest:
+        return None, 0
+    prepared.execute(cur, 'save_answers', save_answers_params(submission_id, latest))
+    return saved_counts(latest, cur.fetchall())
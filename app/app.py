@@ -2,33 +2,92 @@ import os
 import psycopg2
 import psycopg2.extras
 import json
-import pandas as pd
 from datetime import datetime, timedelta
 import secrets
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, session
+import time
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, session, send_file, Response, abort
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from database import get_db_connection, init_db
+from database import get_db_connection, init_db, read_replica
 from models import User
+import ratelimit
+import sessions
+import shared_state
+import storage
+import question_bank
+import papers
+import answers
+import prepared
+import prewarm
+import archive
+import assets
+import compression
+import regrade
+import short_answers
+import result_slips
+import reaper
+import telemetry
+import chunked_uploads
+from live import exam_events
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_mail import Mail, Message
-from fpdf import FPDF
-import xlsxwriter
 from io import BytesIO
 import click
-import random
-import requests
-from google.oauth2 import credentials
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
-from google_auth_oauthlib.flow import Flow
-from cachecontrol import CacheControl
+
+# pandas, fpdf, xlsxwriter, the Google OAuth libraries and numpy (through
+# collusion) are heavy to import and only used by the upload, export, OAuth
+# and answer similarity routes, so they are imported inside those routes to
+# keep worker startup lean.
+
+# Under a gevent worker (see the README), psycopg2 would wait for Postgres
+# inside C and stall every greenlet of the worker, so it is made to yield
+# to the gevent hub instead. This needs the psycogreen package.
+try:
+    from gevent import monkey
+except ImportError:
+    monkey = None
+if monkey is not None and monkey.is_module_patched('socket'):
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_secret_key')
 app.config['UPLOAD_FOLDER'] = 'uploads'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True) # Create upload folder if it doesn't exist
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30) # Session timeout
+# Sliding expiry: the session cookie is only re-issued once this fraction of
+# its lifetime has passed, instead of on every request.
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+app.config['SESSION_REFRESH_THRESHOLD'] = float(os.environ.get('SESSION_REFRESH_THRESHOLD', 0.5))
+# 'cookie' keeps the session in a signed cookie; 'sqlite' keeps it on the server;
+# 'shared' keeps it in the shared state, for several app nodes.
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'cookie')
+app.config['SESSION_SQLITE_PATH'] = os.environ.get('SESSION_SQLITE_PATH', 'sessions.sqlite3')
+
+# Scale-out. SHARED_STATE_URL (e.g. redis://host:6379/0) shares caches, rate
+# limits, job records, sessions and broadcasts between app nodes; empty keeps
+# them in this process. UPLOAD_STORAGE_URL (e.g. s3://bucket/prefix) does the
+# same for uploaded files; empty keeps them in UPLOAD_FOLDER.
+app.config['SHARED_STATE_URL'] = os.environ.get('SHARED_STATE_URL')
+app.config['UPLOAD_STORAGE_URL'] = os.environ.get('UPLOAD_STORAGE_URL')
+
+# Password hashing and login throttling. PASSWORD_HASH_METHOD is passed to
+# Werkzeug's generate_password_hash; the default, plain 'scrypt', follows
+# the library's own cost parameters, and a hash made with other parameters
+# is redone at the user's next login. Limits are "<attempts>/<seconds>"
+# of failed attempts, counted against both the client IP and the account,
+# so a whole school signing in from behind one NAT address isn't locked out.
+# Buckets live in the shared state, unless RATELIMIT_STORAGE_PATH is set to
+# share them between the workers on a host through a local SQLite file.
+# Behind a reverse proxy, set PROXY_FIX_HOPS to the number of proxies in
+# front of the app so the client IP is read from X-Forwarded-For; leave it
+# at 0 when clients connect directly, since the header can then be forged.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['LOGIN_RATE_LIMIT_IP'] = os.environ.get('LOGIN_RATE_LIMIT_IP', '100/60')
+app.config['LOGIN_RATE_LIMIT_ACCOUNT'] = os.environ.get('LOGIN_RATE_LIMIT_ACCOUNT', '5/300')
+app.config['RATELIMIT_STORAGE_PATH'] = os.environ.get('RATELIMIT_STORAGE_PATH')
+app.config['PROXY_FIX_HOPS'] = int(os.environ.get('PROXY_FIX_HOPS', 0))
 
 # Mail configuration
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER')
@@ -42,37 +101,93 @@ app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_USERNAME')
 app.config['GOOGLE_CLIENT_ID'] = os.environ.get('GOOGLE_CLIENT_ID', 'YOUR_GOOGLE_CLIENT_ID')
 app.config['GOOGLE_CLIENT_SECRET'] = os.environ.get('GOOGLE_CLIENT_SECRET', 'YOUR_GOOGLE_CLIENT_SECRET')
 app.config['REDIRECT_URI'] = '/google/callback'
+# The secrets file and cert/issuer settings can point at a local fake OIDC provider for testing.
+app.config['GOOGLE_CLIENT_SECRETS_FILE'] = os.environ.get('GOOGLE_CLIENT_SECRETS_FILE', os.path.join(os.path.dirname(__file__), 'client_secret.json'))
+app.config['GOOGLE_CERTS_URL'] = os.environ.get('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+app.config['GOOGLE_ISSUERS'] = os.environ.get('GOOGLE_ISSUERS', 'accounts.google.com,https://accounts.google.com').split(',')
+
+# Response compression
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500)) # bytes
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+# Deleted exams and users are hidden at once and removed in the background
+# by the reaper, this many rows per transaction with a pause in between.
+app.config['REAPER_BATCH_SIZE'] = int(os.environ.get('REAPER_BATCH_SIZE', reaper.BATCH_SIZE))
+app.config['REAPER_PAUSE'] = float(os.environ.get('REAPER_PAUSE', reaper.PAUSE)) # seconds
+
+# Chunked uploads: chunks are assembled in UPLOAD_CHUNK_FOLDER (kept apart
+# from UPLOAD_FOLDER, whose files are served), at most UPLOAD_CHUNK_SIZE
+# bytes per request, up to the size limit for each kind of file.
+app.config['UPLOAD_CHUNK_FOLDER'] = os.environ.get('UPLOAD_CHUNK_FOLDER', 'upload_chunks')
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', chunked_uploads.CHUNK_SIZE)) # bytes
+app.config['MAX_QUESTION_FILE_SIZE'] = int(os.environ.get('MAX_QUESTION_FILE_SIZE', chunked_uploads.MAX_SIZES['questions'])) # bytes
+app.config['MAX_IMAGE_FILE_SIZE'] = int(os.environ.get('MAX_IMAGE_FILE_SIZE', chunked_uploads.MAX_SIZES['image'])) # bytes
 
 # Allow insecure transport for development only.
 if os.environ.get('FLASK_DEBUG') == '1':
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+if app.config['PROXY_FIX_HOPS']:
+    hops = app.config['PROXY_FIX_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+shared = shared_state.create_state(app.config['SHARED_STATE_URL'])
+uploads = storage.create_storage(app.config['UPLOAD_STORAGE_URL'], app.config['UPLOAD_FOLDER'])
+papers.use_shared_state(shared)
+exam_events.use_shared_state(shared)
+static_assets = assets.init_app(app)
+compression.init_app(app)
+
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    app.session_interface = sessions.ServerSideSessionInterface(sessions.SQLiteSessionStore(app.config['SESSION_SQLITE_PATH']))
+elif app.config['SESSION_BACKEND'] == 'shared':
+    app.session_interface = sessions.ServerSideSessionInterface(sessions.SharedStateSessionStore(shared))
+
 mail = Mail(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'student_login'
 
+rate_limit_backend = ratelimit.create_backend(app.config['RATELIMIT_STORAGE_PATH']) if app.config['RATELIMIT_STORAGE_PATH'] else shared
+login_ip_limiter = ratelimit.RateLimiter('login-ip', *ratelimit.parse_limit(app.config['LOGIN_RATE_LIMIT_IP']), rate_limit_backend)
+login_failure_limiter = ratelimit.RateLimiter('login-failures', *ratelimit.parse_limit(app.config['LOGIN_RATE_LIMIT_ACCOUNT']), rate_limit_backend)
+
 def from_json(value):
     if isinstance(value, str):
         return json.loads(value)
     return value
 app.jinja_env.filters['fromjson'] = from_json
 
+prepared.register('load_user', 'int', "SELECT id, fullname, email, role FROM users WHERE id = $1 AND deleted_at IS NULL")
+
 @login_manager.user_loader
 def load_user(user_id):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT id, fullname, email, role FROM users WHERE id = %s", (user_id,))
+    prepared.execute(cur, 'load_user', (user_id,))
     user_data = cur.fetchone()
+    cur.close()
+    conn.close()
     if user_data:
         return User(id=user_data['id'], fullname=user_data['fullname'], email=user_data['email'], role=user_data['role'])
     return None
 
 @app.before_request
 def before_request():
-    session.permanent = True
-    app.permanent_session_lifetime = timedelta(minutes=30)
-    session.modified = True
+    # Anonymous visitors and static files don't need a session refresh.
+    if request.endpoint == 'static' or not session:
+        return
+    if not session.permanent:
+        session.permanent = True
+    now = int(time.time())
+    refreshed_at = session.get('_refreshed_at', 0)
+    if now - refreshed_at >= app.permanent_session_lifetime.total_seconds() * app.config['SESSION_REFRESH_THRESHOLD']:
+        session['_refreshed_at'] = now
+
+def invalidate_user_sessions(user_id):
+    """Ends every session of a user when the server-side session backend is in use."""
+    if isinstance(app.session_interface, sessions.ServerSideSessionInterface):
+        app.session_interface.invalidate_user(user_id)
 
 @app.cli.command('initdb')
 def initdb_command():
@@ -80,6 +195,130 @@ def initdb_command():
     init_db()
     print('Initialized the database.')
 
+@app.cli.command('purge-sessions')
+def purge_sessions_command():
+    """Removes expired server-side sessions."""
+    if not isinstance(app.session_interface, sessions.ServerSideSessionInterface):
+        print('Sessions are kept in cookies (SESSION_BACKEND=cookie); there is nothing to purge.')
+        return
+    app.session_interface.store.purge_expired()
+    print('Purged expired sessions.')
+
+@app.cli.command('purge-telemetry')
+@click.option('--days', default=30, show_default=True, help='Keep this many days of exam page timings.')
+def purge_telemetry_command(days):
+    """Removes exam page timings older than --days."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM client_metrics WHERE recorded_at < %s", (datetime.utcnow() - timedelta(days=days),))
+    conn.commit()
+    print(f'Removed {cur.rowcount} timing(s).')
+    cur.close()
+    conn.close()
+
+@app.cli.command('purge-uploads')
+@click.option('--hours', default=24, show_default=True, help='Remove unfinished uploads idle for this many hours.')
+def purge_uploads_command(hours):
+    """Removes the chunks of uploads that were never finished."""
+    removed = chunked_uploads.purge_abandoned(app.config['UPLOAD_CHUNK_FOLDER'], hours * 3600)
+    print(f'Removed {removed} unfinished upload(s).')
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Writes precompressed copies of the static CSS and JS bundles."""
+    built = static_assets.build()
+    print(f'Compressed {len(built)} bundle(s).')
+
+@app.cli.command('archive-term')
+@click.argument('term')
+@click.argument('start', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('end', type=click.DateTime(formats=['%Y-%m-%d']))
+def archive_term_command(term, start, end):
+    """Archives the submissions of exams created from START up to END as TERM."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT COUNT(*) FROM exams WHERE created_at >= %s AND created_at < %s AND end_time > %s",
+            (start, end, datetime.utcnow())
+        )
+        if end > datetime.utcnow() or cur.fetchone()[0]:
+            print(f'Error: term {term} has not closed yet.')
+            return
+        exams, submissions = archive.archive_term(cur, term, start, end)
+        conn.commit()
+        print(f'Archived {submissions} submission(s) from {exams} exam(s) as term {term}.')
+    finally:
+        cur.close()
+        conn.close()
+
+@app.cli.command('prewarm-exams')
+@click.option('--within', default=60, show_default=True, help='Minutes ahead to look for exams starting.')
+def prewarm_exams_command(within):
+    """Provisions the sittings of exams starting soon and caches their papers."""
+    # The payload would be cached in this command's own memory and lost when it exits.
+    cache_papers = not isinstance(shared, shared_state.MemoryState)
+    if not cache_papers:
+        print('Warning: SHARED_STATE_URL is not set, so exam questions are not cached; only sittings are provisioned.')
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    try:
+        now = datetime.utcnow()
+        warmed = prewarm.prewarm_exams(cur, now, now + timedelta(minutes=within), cache_papers)
+        conn.commit()
+        for exam_id, sittings, questions in warmed:
+            cached = f', {questions} question(s) cached' if questions is not None else ''
+            print(f'Exam {exam_id}: {sittings} sitting(s) provisioned{cached}.')
+        print(f'Prewarmed {len(warmed)} exam(s).')
+    finally:
+        cur.close()
+        conn.close()
+
+@app.cli.command('reap-deleted')
+def reap_deleted_command():
+    """Removes deleted exams and users with their rows, in batches."""
+    conn = get_db_connection()
+    try:
+        def progress(kind, target_id, table, deleted):
+            print(f'{kind[:-1].capitalize()} {target_id}: {deleted} row(s) removed from {table}.')
+
+        removed = reaper.reap(conn, app.config['REAPER_BATCH_SIZE'], app.config['REAPER_PAUSE'], progress)
+        if removed is None:
+            print('Error: another reaper is running.')
+        else:
+            print(f'Removed {removed[0]} exam(s) and {removed[1]} user(s).')
+    finally:
+        conn.close()
+
+@app.cli.command('detect-collusion')
+@click.option('--exam', 'exam_id', type=int, help='Analyse this exam only.')
+@click.option('--ended-within', default=60, show_default=True, help='Minutes back to look for exams that have ended.')
+def detect_collusion_command(exam_id, ended_within):
+    """Flags submissions with suspiciously alike answers in recently ended exams."""
+    import collusion
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        if exam_id is None:
+            now = datetime.utcnow()
+            cur.execute("""
+                SELECT id FROM exams
+                WHERE end_time > %s AND end_time <= %s AND deleted_at IS NULL AND archived_term IS NULL
+                ORDER BY end_time
+            """, (now - timedelta(minutes=ended_within), now))
+            exam_ids = [row[0] for row in cur.fetchall()]
+            conn.commit()
+        else:
+            exam_ids = [exam_id]
+        for exam_id in exam_ids:
+            submissions, pairs = collusion.analyse_exam(conn, exam_id)
+            print(f'Exam {exam_id}: {submissions} submission(s) compared, {pairs} pair(s) flagged.')
+        print(f'Analysed {len(exam_ids)} exam(s).')
+    finally:
+        cur.close()
+        conn.close()
+
 @app.cli.command('create-admin')
 @click.argument('name')
 @click.argument('email')
@@ -88,7 +327,7 @@ def create_admin_command(name, email, password):
     """Creates a new admin user."""
     conn = get_db_connection()
     cur = conn.cursor()
-    password_hash = generate_password_hash(password)
+    password_hash = hash_password(password)
     try:
         cur.execute(
             "INSERT INTO users (fullname, email, password_hash, role, status) VALUES (%s, %s, %s, 'admin', 'approved')",
@@ -106,6 +345,51 @@ def create_admin_command(name, email, password):
 def index():
     return render_template('index.html')
 
+_password_hash_prefix = None
+
+def hash_password(password):
+    return generate_password_hash(password, method=app.config['PASSWORD_HASH_METHOD'])
+
+def password_needs_rehash(password_hash):
+    """Returns True if password_hash was made with different parameters than PASSWORD_HASH_METHOD."""
+    global _password_hash_prefix
+    if _password_hash_prefix is None:
+        _password_hash_prefix = hash_password('').split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _password_hash_prefix
+
+def authenticate(email, password, role, approved_only=False):
+    """Checks a login attempt.
+
+    Returns (user, throttled). Throttled attempts are rejected before any
+    database or hashing work is done; only failed attempts use up the limits.
+    """
+    account = f"{role}:{email.lower()}"
+    if login_ip_limiter.blocked(request.remote_addr) or login_failure_limiter.blocked(account):
+        return None, True
+
+    query = "SELECT id, fullname, email, role, password_hash FROM users WHERE email = %s AND role = %s AND deleted_at IS NULL"
+    if approved_only:
+        query += " AND status = 'approved'"
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    cur.execute(query, (email, role))
+    user_data = cur.fetchone()
+
+    user = None
+    if user_data and check_password_hash(user_data['password_hash'], password):
+        # Transparently move old hashes over to the current parameters.
+        if password_needs_rehash(user_data['password_hash']):
+            cur.execute("UPDATE users SET password_hash = %s WHERE id = %s", (hash_password(password), user_data['id']))
+            conn.commit()
+        user = User(id=user_data['id'], fullname=user_data['fullname'], email=user_data['email'], role=user_data['role'])
+    else:
+        login_ip_limiter.hit(request.remote_addr)
+        login_failure_limiter.hit(account)
+
+    cur.close()
+    conn.close()
+    return user, False
+
 def send_email(subject, recipients, body):
     msg = Message(subject, recipients=recipients)
     msg.body = body
@@ -118,19 +402,13 @@ def send_email(subject, recipients, body):
 @app.route('/teacher/login', methods=['GET', 'POST'])
 def teacher_login():
     if request.method == 'POST':
-        email = request.form['email']
-        password = request.form['password']
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute("SELECT * FROM users WHERE email = %s AND role = 'teacher' AND status = 'approved'", (email,))
-        user_data = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if user_data and check_password_hash(user_data['password_hash'], password):
-            user = User(id=user_data['id'], fullname=user_data['fullname'], email=user_data['email'], role=user_data['role'])
+        user, throttled = authenticate(request.form['email'], request.form['password'], 'teacher', approved_only=True)
+        if user:
             login_user(user)
             return redirect(url_for('teacher_dashboard'))
+        elif throttled:
+            flash('Too many login attempts. Please wait a few minutes and try again.')
+            return render_template('teacher_login.html'), 429
         else:
             flash('Invalid email or password, or account not approved.')
 
@@ -144,7 +422,7 @@ def teacher_register():
         password = request.form['password']
         gender = request.form['gender']
 
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
 
         conn = get_db_connection()
         cur = conn.cursor()
@@ -171,6 +449,7 @@ def teacher_documentation():
 
 @app.route('/teacher/dashboard')
 @login_required
+@read_replica
 def teacher_dashboard():
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
@@ -181,8 +460,8 @@ def teacher_dashboard():
             e.id, e.title, e.class, e.duration, e.start_time, e.end_time,
             COUNT(s.id) AS submission_count
         FROM exams e
-        LEFT JOIN exam_submissions s ON e.id = s.exam_id
-        WHERE e.teacher_id = %s
+        LEFT JOIN exam_submissions s ON e.id = s.exam_id AND s.status <> 'not-started'
+        WHERE e.teacher_id = %s AND e.deleted_at IS NULL
         GROUP BY e.id
         ORDER BY e.created_at DESC
     """, (current_user.id,))
@@ -202,7 +481,7 @@ def teacher_dashboard():
         exam['is_active'] = is_active
 
         # Calculate completion rate for each exam
-        cur.execute("SELECT COUNT(id) FROM users WHERE role = 'student' AND class = %s", (exam['class'],))
+        cur.execute("SELECT COUNT(id) FROM users WHERE role = 'student' AND class = %s AND deleted_at IS NULL", (exam['class'],))
         total_students_in_class = cur.fetchone()[0]
 
         completion_rate = 0
@@ -216,7 +495,7 @@ def teacher_dashboard():
     activities = []
 
     # 1. Fetch recent exam creations
-    cur.execute("SELECT title, created_at FROM exams WHERE teacher_id = %s ORDER BY created_at DESC LIMIT 5", (current_user.id,))
+    cur.execute("SELECT title, created_at FROM exams WHERE teacher_id = %s AND deleted_at IS NULL ORDER BY created_at DESC LIMIT 5", (current_user.id,))
     for exam in cur.fetchall():
         activities.append({
             'type': 'exam_created',
@@ -231,7 +510,7 @@ def teacher_dashboard():
         FROM exam_submissions s
         JOIN users u ON s.student_id = u.id
         JOIN exams e ON s.exam_id = e.id
-        WHERE e.teacher_id = %s AND s.status = 'submitted'
+        WHERE e.teacher_id = %s AND e.deleted_at IS NULL AND s.status = 'submitted'
         ORDER BY s.end_time DESC
         LIMIT 5
     """, (current_user.id,))
@@ -245,14 +524,14 @@ def teacher_dashboard():
 
     # 3. (Optional) Fetch new student registrations in the teacher's classes.
     # This is a bit more complex as we need to infer the teacher's classes.
-    cur.execute("SELECT DISTINCT class FROM exams WHERE teacher_id = %s", (current_user.id,))
+    cur.execute("SELECT DISTINCT class FROM exams WHERE teacher_id = %s AND deleted_at IS NULL", (current_user.id,))
     teacher_classes = [row['class'] for row in cur.fetchall()]
 
     if teacher_classes:
         cur.execute("""
             SELECT fullname, created_at
             FROM users
-            WHERE role = 'student' AND class IN %s
+            WHERE role = 'student' AND class IN %s AND deleted_at IS NULL
             ORDER BY created_at DESC
             LIMIT 5
         """, (tuple(teacher_classes),))
@@ -285,12 +564,17 @@ def create_exam():
         end_time = request.form.get('end_time') or None
         randomize_questions = 'randomize_questions' in request.form
         delay_results = 'delay_results' in request.form
+        try:
+            draw_spec = papers.parse_draw_spec(request.form.get('draw_spec'))
+        except ValueError:
+            flash('Invalid question draw rules. Use one "topic, difficulty, count" rule per line.')
+            return render_template('create_exam.html')
 
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO exams (title, class, duration, description, teacher_id, start_time, end_time, randomize_questions, delay_results) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
-            (title, exam_class, duration, description, current_user.id, start_time, end_time, randomize_questions, delay_results)
+            "INSERT INTO exams (title, class, duration, description, teacher_id, start_time, end_time, randomize_questions, delay_results, draw_spec) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+            (title, exam_class, duration, description, current_user.id, start_time, end_time, randomize_questions, delay_results, json.dumps(draw_spec) if draw_spec else None)
         )
         exam_id = cur.fetchone()[0]
         conn.commit()
@@ -307,13 +591,162 @@ def create_exam():
 def manage_exam(exam_id):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s", (exam_id, current_user.id))
+    cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
     exam = cur.fetchone()
-    cur.execute("SELECT * FROM questions WHERE exam_id = %s ORDER BY id", (exam_id,))
+    cur.execute(question_bank.EXAM_QUESTIONS_QUERY, (exam_id,))
     questions = cur.fetchall()
+    cur.execute("SELECT id, title, class FROM exams WHERE teacher_id = %s AND id <> %s AND deleted_at IS NULL ORDER BY created_at DESC", (current_user.id, exam_id))
+    other_exams = cur.fetchall()
     cur.close()
     conn.close()
-    return render_template('manage_exam.html', exam=exam, questions=questions)
+    draw_spec = papers.format_draw_spec(exam['draw_spec']) if exam else ''
+    return render_template('manage_exam.html', exam=exam, questions=questions, other_exams=other_exams, draw_spec=draw_spec)
+
+@app.route('/teacher/exam/<int:exam_id>/draw_spec', methods=['POST'])
+@login_required
+def update_draw_spec(exam_id):
+    try:
+        draw_spec = papers.parse_draw_spec(request.form.get('draw_spec'))
+    except ValueError:
+        flash('Invalid question draw rules. Use one "topic, difficulty, count" rule per line.')
+        return redirect(url_for('manage_exam', exam_id=exam_id))
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE exams SET draw_spec = %s WHERE id = %s AND teacher_id = %s",
+                (json.dumps(draw_spec) if draw_spec else None, exam_id, current_user.id))
+    conn.commit()
+    cur.close()
+    conn.close()
+    flash('Question draw rules saved.')
+    return redirect(url_for('manage_exam', exam_id=exam_id))
+
+@app.route('/teacher/exam/<int:exam_id>/assemble', methods=['POST'])
+@login_required
+def assemble_exam(exam_id):
+    source_exam_ids = [int(i) for i in request.form.getlist('source_exam_id')]
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
+    if not cur.fetchone():
+        cur.close()
+        conn.close()
+        flash('Permission denied.')
+        return redirect(url_for('teacher_dashboard'))
+
+    added = question_bank.assemble_from_exams(cur, exam_id, source_exam_ids, current_user.id)
+    conn.commit()
+    papers.invalidate_pools(exam_id)
+    cur.close()
+    conn.close()
+    flash(f'{added} question(s) added from the question bank.')
+    return redirect(url_for('manage_exam', exam_id=exam_id))
+
+@app.route('/teacher/exam/<int:exam_id>/link_questions', methods=['POST'])
+@login_required
+def link_bank_questions(exam_id):
+    question_ids = [int(i) for i in request.form.getlist('question_id')]
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
+    if not cur.fetchone():
+        cur.close()
+        conn.close()
+        flash('Permission denied.')
+        return redirect(url_for('teacher_dashboard'))
+
+    cur.execute("SELECT id FROM questions WHERE id = ANY(%s::int[]) AND teacher_id = %s ORDER BY array_position(%s::int[], id)",
+                (question_ids, current_user.id, question_ids))
+    added = question_bank.link_questions(cur, exam_id, [row[0] for row in cur.fetchall()])
+    conn.commit()
+    papers.invalidate_pools(exam_id)
+    cur.close()
+    conn.close()
+    flash(f'{added} question(s) added from the question bank.')
+    return redirect(url_for('manage_exam', exam_id=exam_id))
+
+@app.route('/teacher/questions/search')
+@login_required
+def search_questions():
+    """Searches the teacher's question bank; JSON, one page of results at a time."""
+    terms = request.args.get('q', '').strip()
+    question_type = request.args.get('type') or None
+    if not terms:
+        return jsonify({'status': 'error', 'message': 'Enter something to search for.'}), 400
+    if question_type is not None and question_type not in question_bank.QUESTION_TYPES:
+        return jsonify({'status': 'error', 'message': 'Unknown question type.'}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    rows, has_more = question_bank.search_questions(
+        cur, current_user.id, terms, exam_id=request.args.get('exam_id', type=int),
+        class_name=request.args.get('class') or None, question_type=question_type, page=page
+    )
+    cur.close()
+    conn.close()
+    return jsonify({
+        'status': 'success',
+        'page': page,
+        'has_more': has_more,
+        'questions': [{
+            'id': row['id'],
+            'question_text': row['question_text'],
+            'question_type': row['question_type'],
+            'topic': row['topic'],
+            'difficulty': row['difficulty'],
+            'rank': row['rank']
+        } for row in rows]
+    })
+
+@app.route('/teacher/exam/<int:exam_id>/monitor')
+@login_required
+def monitor_exam(exam_id):
+    """Live view of a sitting: the page loads a snapshot, then follows the event stream."""
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
+    exam = cur.fetchone()
+    if not exam:
+        cur.close()
+        conn.close()
+        flash('Permission denied.')
+        return redirect(url_for('teacher_dashboard'))
+
+    cur.execute("""
+        SELECT s.id AS submission_id, u.fullname AS student, s.status,
+               COUNT(sa.id) AS answered,
+               GREATEST(0, %s * 60 - EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP::timestamp - s.start_time)))::int AS remaining
+        FROM exam_submissions s
+        JOIN users u ON u.id = s.student_id
+        LEFT JOIN student_answers sa ON sa.submission_id = s.id
+        WHERE s.exam_id = %s AND s.status <> 'not-started'
+        GROUP BY s.id, u.fullname
+        ORDER BY s.start_time
+    """, (exam['duration'], exam_id))
+    sittings = [dict(row) for row in cur.fetchall()]
+    paper_size = len(papers.paper_question_ids(cur, exam, 0))
+    cur.close()
+    conn.close()
+    return render_template('exam_monitor.html', exam=exam, sittings=sittings, paper_size=paper_size)
+
+@app.route('/teacher/exam/<int:exam_id>/monitor/stream')
+@login_required
+def monitor_exam_stream(exam_id):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
+    allowed = cur.fetchone()
+    cur.close()
+    conn.close()
+    if not allowed:
+        return jsonify({'status': 'error', 'message': 'Permission denied.'}), 403
+
+    # The generator does not need the request context, so none is held open with the stream.
+    response = Response(exam_events.stream(exam_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/teacher/exam/<int:exam_id>/add_question', methods=['GET', 'POST'])
 @login_required
@@ -330,9 +763,10 @@ def add_question(exam_id):
             file = request.files['question_image']
             if file.filename != '':
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                uploads.save(filename, file.stream)
                 question_image = filename
+        # Or sent beforehand in chunks, by the page's script.
+        question_image = _uploaded_image(request.form.get('question_image_upload')) or question_image
 
         if question_type in ['single-choice', 'multiple-choice']:
             form_options = [request.form[key] for key in request.form if key.startswith('option_')]
@@ -347,11 +781,19 @@ def add_question(exam_id):
 
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO questions (exam_id, question_text, question_image, question_type, options, correct_answer) VALUES (%s, %s, %s, %s, %s, %s)",
-            (exam_id, question_text, question_image, question_type, options, correct_answer)
-        )
+        question_ids = question_bank.upsert_questions(cur, current_user.id, [{
+            'exam_id': exam_id,
+            'question_text': question_text,
+            'question_image': question_image,
+            'question_type': question_type,
+            'options': options,
+            'correct_answer': correct_answer,
+            'topic': request.form.get('topic') or None,
+            'difficulty': request.form.get('difficulty') or None
+        }])
+        question_bank.link_questions(cur, exam_id, question_ids, [float(request.form.get('weight') or 1)])
         conn.commit()
+        papers.invalidate_pools(exam_id)
         cur.close()
         conn.close()
         flash('Question added successfully.')
@@ -370,26 +812,46 @@ def add_question(exam_id):
 def delete_exam(exam_id):
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("DELETE FROM exams WHERE id = %s AND teacher_id = %s", (exam_id, current_user.id))
+    # Hidden now; the reaper removes its submissions, answers and archive rows.
+    cur.execute("UPDATE exams SET deleted_at = LOCALTIMESTAMP WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL",
+                (exam_id, current_user.id))
+    deleted = cur.rowcount
     conn.commit()
     cur.close()
     conn.close()
+    if deleted:
+        papers.invalidate_pools(exam_id)
+        reaper.start_reaper(shared, app.config['REAPER_BATCH_SIZE'], app.config['REAPER_PAUSE'])
     flash('Exam deleted.')
     return redirect(url_for('teacher_dashboard'))
 
 @app.route('/teacher/question/delete/<int:question_id>')
 @login_required
 def delete_question(question_id):
+    # Questions can be shared by several exams, so deleting removes the
+    # question from one exam; the bank row goes once no exam uses it.
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT q.exam_id FROM questions q JOIN exams e ON q.exam_id = e.id WHERE q.id = %s AND e.teacher_id = %s", (question_id, current_user.id))
+    cur.execute("""
+        SELECT eq.exam_id
+        FROM exam_questions eq
+        JOIN exams e ON eq.exam_id = e.id
+        WHERE eq.question_id = %s AND e.teacher_id = %s AND e.deleted_at IS NULL AND (%s IS NULL OR eq.exam_id = %s)
+        ORDER BY eq.exam_id
+        LIMIT 1
+    """, (question_id, current_user.id, request.args.get('exam_id', type=int), request.args.get('exam_id', type=int)))
     question_data = cur.fetchone()
 
     if question_data:
         exam_id = question_data['exam_id']
-        cur.execute("DELETE FROM questions WHERE id = %s", (question_id,))
+        question_bank.unlink_question(cur, exam_id, question_id)
+        conn.commit()
+        papers.invalidate_pools(exam_id)
+        regraded, changed = regrade.regrade_exams(cur, [exam_id])
         conn.commit()
         flash('Question deleted.')
+        if changed:
+            flash(f'Regraded {regraded} submission(s), {changed} score(s) changed.')
         cur.close()
         conn.close()
         return redirect(url_for('manage_exam', exam_id=exam_id))
@@ -402,41 +864,17 @@ def delete_question(question_id):
 def upload_questions(exam_id):
     file = request.files['file']
     if file:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-
-        if filename.endswith('.csv'):
-            df = pd.read_csv(filepath)
-        else:
-            df = pd.read_excel(filepath)
+        # The sheet is parsed straight from the upload; it is not kept.
+        questions, weights = question_bank.read_question_sheet(file.stream, secure_filename(file.filename), exam_id)
 
+        # Re-uploading the same file for another section reuses the existing
+        # bank questions and only adds links.
         conn = get_db_connection()
         cur = conn.cursor()
-        for index, row in df.iterrows():
-            question_text = row['question_text']
-            question_type = row['question_type']
-            options = None
-            correct_answer = ''
-
-            if question_type in ['single-choice', 'multiple-choice']:
-                opts = []
-                correct_indices = []
-                for i in range(1, 5):
-                    if f'option{i}' in row and pd.notna(row[f'option{i}']):
-                        opts.append(row[f'option{i}'])
-
-                options_data = [{'text': text, 'correct': str(i+1) in str(row['correct_answer']).split(',')} for i, text in enumerate(opts)]
-                options = json.dumps(options_data)
-                correct_answer = json.dumps(str(row['correct_answer']).split(','))
-            else:
-                correct_answer = row['correct_answer']
-
-            cur.execute(
-                "INSERT INTO questions (exam_id, question_text, question_type, options, correct_answer) VALUES (%s, %s, %s, %s, %s)",
-                (exam_id, question_text, question_type, options, correct_answer)
-            )
+        question_ids = question_bank.upsert_questions(cur, current_user.id, questions)
+        question_bank.link_questions(cur, exam_id, question_ids, weights)
         conn.commit()
+        papers.invalidate_pools(exam_id)
         cur.close()
         conn.close()
         flash('Questions uploaded successfully.')
@@ -459,9 +897,11 @@ def edit_question(question_id):
             file = request.files['question_image']
             if file.filename != '':
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                uploads.save(filename, file.stream)
                 cur.execute("UPDATE questions SET question_image = %s WHERE id = %s", (filename, question_id))
+        uploaded_image = _uploaded_image(request.form.get('question_image_upload'))
+        if uploaded_image:
+            cur.execute("UPDATE questions SET question_image = %s WHERE id = %s", (uploaded_image, question_id))
 
         if question['question_type'] in ['single-choice', 'multiple-choice']:
             form_options = [request.form[key] for key in sorted(request.form.keys()) if key.startswith('option_')]
@@ -476,51 +916,34 @@ def edit_question(question_id):
             correct_answer = request.form['correct_answer']
             cur.execute("UPDATE questions SET correct_answer = %s WHERE id = %s", (correct_answer, question_id))
 
-        cur.execute("UPDATE questions SET question_text = %s WHERE id = %s", (question_text, question_id))
+        cur.execute("UPDATE questions SET question_text = %s, topic = %s, difficulty = %s WHERE id = %s",
+                    (question_text, request.form.get('topic') or None, request.form.get('difficulty') or None, question_id))
+        question_bank.rehash_question(cur, question_id)
         conn.commit()
+        # The question may be in several exams' pools.
+        cur.execute("SELECT exam_id FROM exam_questions WHERE question_id = %s", (question_id,))
+        for (exam_id,) in cur.fetchall():
+            papers.invalidate_pools(exam_id)
 
         flash('Question updated successfully.')
+        cur.execute("SELECT correct_mask, correct_answer FROM questions WHERE id = %s", (question_id,))
+        if tuple(cur.fetchone()) != (question['correct_mask'], question['correct_answer']):
+            regraded, changed = regrade.regrade_question(cur, question_id)
+            conn.commit()
+            flash(f'Answer key changed: regraded {regraded} submission(s), {changed} score(s) changed.')
         cur.close()
         conn.close()
-        return redirect(url_for('manage_exam', exam_id=question['exam_id']))
+        return redirect(url_for('manage_exam', exam_id=request.args.get('exam_id', type=int) or question['exam_id']))
 
     cur.close()
     conn.close()
-    return render_template('edit_question.html', question=question)
+    return render_template('edit_question.html', question=question, exam_id=request.args.get('exam_id', type=int))
 
 def calculate_score(submission_id):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-
-    # Get exam_id from submission
-    cur.execute("SELECT exam_id FROM exam_submissions WHERE id = %s", (submission_id,))
-    exam_id = cur.fetchone()['exam_id']
-
-    # Get all objective questions for the exam
-    cur.execute("SELECT COUNT(*) FROM questions WHERE exam_id = %s AND question_type IN ('single-choice', 'multiple-choice')", (exam_id,))
-    total_objective_questions = cur.fetchone()[0]
-
-    # Get student's answers
-    cur.execute("""
-        SELECT sa.answer_text, q.question_type, q.correct_answer
-        FROM student_answers sa
-        JOIN questions q ON sa.question_id = q.id
-        WHERE sa.submission_id = %s
-    """, (submission_id,))
-    answers = cur.fetchall()
-
-    score = 0
-    for answer in answers:
-        if answer['question_type'] in ['single-choice', 'multiple-choice']:
-            student_answer_indices = set(answer['answer_text'].split(','))
-            correct_answer_indices = set(json.loads(answer['correct_answer']))
-            if student_answer_indices == correct_answer_indices:
-                score += 1
-
-    final_score = (score / total_objective_questions) * 100 if total_objective_questions > 0 else 0
-    cur.execute("UPDATE exam_submissions SET score = %s WHERE id = %s", (final_score, submission_id))
+    regrade.score_submissions(cur, [submission_id])
     conn.commit()
-
     cur.close()
     conn.close()
 
@@ -532,15 +955,24 @@ def submit_exam_route():
 
     conn = get_db_connection()
     cur = conn.cursor()
+    # Answers still queued on the page are applied with the submission.
+    added = 0
+    if data.get('answers'):
+        cur.execute("SELECT 1 FROM exam_submissions WHERE id = %s AND student_id = %s AND status = 'in-progress'", (submission_id, current_user.id))
+        if cur.fetchone():
+            added = answers.save_answers(cur, submission_id, data['answers'])[1]
     cur.execute(
-        "UPDATE exam_submissions SET status = 'submitted', end_time = %s WHERE id = %s",
+        "UPDATE exam_submissions SET status = 'submitted', end_time = %s WHERE id = %s RETURNING exam_id",
         (datetime.utcnow(), submission_id)
     )
+    submitted = cur.fetchone()
     conn.commit()
     cur.close()
     conn.close()
 
     calculate_score(submission_id)
+    if submitted:
+        exam_events.publish(submitted[0], {'type': 'submitted', 'submission_id': submission_id, 'added': added})
 
     flash('Exam submitted successfully!')
     return jsonify({'status': 'success'})
@@ -553,28 +985,39 @@ def view_results(submission_id):
 
     cur.execute("SELECT * FROM exam_submissions WHERE id = %s AND student_id = %s", (submission_id, current_user.id))
     submission = cur.fetchone()
+    if submission:
+        cur.execute("""
+            SELECT q.*, COALESCE(sa.answer_text, choice_text(sa.answer_mask)) AS answer_text, sa.answer_mask
+            FROM questions q
+            JOIN student_answers sa ON q.id = sa.question_id
+            WHERE sa.submission_id = %s
+        """, (submission_id,))
+        answers = cur.fetchall()
+    else:
+        # Results from archived terms are read from the archive.
+        submission, answers = archive.fetch_archived_submission(cur, submission_id, current_user.id)
+    if not submission:
+        cur.close()
+        conn.close()
+        flash('Result not found.')
+        return redirect(url_for('student_dashboard'))
 
-    cur.execute("SELECT * FROM exams WHERE id = %s", (submission['exam_id'],))
+    cur.execute("SELECT * FROM exams WHERE id = %s AND deleted_at IS NULL", (submission['exam_id'],))
     exam = cur.fetchone()
-
-    cur.execute("""
-        SELECT q.*, sa.answer_text
-        FROM questions q
-        JOIN student_answers sa ON q.id = sa.question_id
-        WHERE sa.submission_id = %s
-    """, (submission_id,))
-    answers = cur.fetchall()
+    if not exam:
+        cur.close()
+        conn.close()
+        flash('Result not found.')
+        return redirect(url_for('student_dashboard'))
 
     results = []
     for answer in answers:
         is_correct = False
         if answer['question_type'] in ['single-choice', 'multiple-choice']:
-            student_ans = set(answer['answer_text'].split(','))
-            correct_ans = set(json.loads(answer['correct_answer']))
-            if student_ans == correct_ans:
+            if answer['answer_mask'] is not None and answer['answer_mask'] == answer['correct_mask']:
                 is_correct = True
         else:
-            if answer['answer_text'].lower() == answer['correct_answer'].lower():
+            if short_answers.is_correct(answer['answer_text'], answer['correct_answer']):
                 is_correct = True
 
         results.append({
@@ -590,12 +1033,13 @@ def view_results(submission_id):
 @app.route('/teacher/analytics/', defaults={'exam_id': None})
 @app.route('/teacher/analytics/<int:exam_id>')
 @login_required
+@read_replica
 def teacher_analytics(exam_id):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
     if exam_id:
-        cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s", (exam_id, current_user.id))
+        cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
         exam = cur.fetchone()
         cur.execute("""
             SELECT u.fullname, s.score
@@ -611,17 +1055,17 @@ def teacher_analytics(exam_id):
             FROM exam_submissions s
             JOIN users u ON s.student_id = u.id
             JOIN exams e ON s.exam_id = e.id
-            WHERE e.teacher_id = %s AND s.status = 'submitted'
+            WHERE e.teacher_id = %s AND e.deleted_at IS NULL AND s.status = 'submitted'
         """, (current_user.id,))
         submissions = cur.fetchall()
 
     average_score = sum([s['score'] for s in submissions]) / len(submissions) if submissions else 0
 
     # Calculate completion rate for all exams
-    cur.execute("SELECT COUNT(DISTINCT student_id) FROM exam_submissions WHERE exam_id IN (SELECT id FROM exams WHERE teacher_id = %s)", (current_user.id,))
+    cur.execute("SELECT COUNT(DISTINCT student_id) FROM exam_submissions WHERE status <> 'not-started' AND exam_id IN (SELECT id FROM exams WHERE teacher_id = %s AND deleted_at IS NULL)", (current_user.id,))
     total_students_with_submissions = cur.fetchone()[0]
 
-    cur.execute("SELECT COUNT(DISTINCT id) FROM users WHERE role = 'student' AND class IN (SELECT DISTINCT class FROM exams WHERE teacher_id = %s)", (current_user.id,))
+    cur.execute("SELECT COUNT(DISTINCT id) FROM users WHERE role = 'student' AND deleted_at IS NULL AND class IN (SELECT DISTINCT class FROM exams WHERE teacher_id = %s AND deleted_at IS NULL)", (current_user.id,))
     total_students_in_classes = cur.fetchone()[0]
 
     completion_rate = (total_students_with_submissions / total_students_in_classes) * 100 if total_students_in_classes > 0 else 0
@@ -631,13 +1075,60 @@ def teacher_analytics(exam_id):
     conn.close()
     return render_template('teacher_analytics.html', exam=exam, submissions=submissions, average_score=average_score, completion_rate=completion_rate)
 
+@app.route('/teacher/exam/<int:exam_id>/collusion')
+@login_required
+@read_replica
+def collusion_report(exam_id):
+    import collusion
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
+    exam = cur.fetchone()
+    if not exam:
+        cur.close()
+        conn.close()
+        flash('Permission denied.')
+        return redirect(url_for('teacher_dashboard'))
+
+    pairs = collusion.exam_report(cur, exam_id)
+    cur.close()
+    conn.close()
+    return render_template('collusion_report.html', exam=exam, pairs=pairs,
+                           job=collusion.get_job(shared, exam_id), min_shared_wrong=collusion.MIN_SHARED_WRONG)
+
+@app.route('/teacher/exam/<int:exam_id>/collusion', methods=['POST'])
+@login_required
+def analyse_collusion(exam_id):
+    import collusion
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
+    exam = cur.fetchone()
+    cur.close()
+    conn.close()
+    if not exam:
+        flash('Permission denied.')
+        return redirect(url_for('teacher_dashboard'))
+
+    if collusion.start_analysis(shared, exam_id):
+        flash('Comparing answers. Refresh this page in a few seconds to see the report.')
+    else:
+        flash('Answers are already being compared.')
+    return redirect(url_for('collusion_report', exam_id=exam_id))
+
 @app.route('/teacher/exam/<int:exam_id>/export/<format>')
 @login_required
+@read_replica
 def export_results(exam_id, format):
+    import pandas as pd
+    from fpdf import FPDF
+
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
-    cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s", (exam_id, current_user.id))
+    cur.execute("SELECT * FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL", (exam_id, current_user.id))
     exam = cur.fetchone()
 
     cur.execute("""
@@ -671,23 +1162,175 @@ def export_results(exam_id, format):
 
     return redirect(url_for('teacher_analytics', exam_id=exam_id))
 
-# Student routes
-@app.route('/student/login', methods=['GET', 'POST'])
-def student_login():
-    if request.method == 'POST':
-        email = request.form['email']
-        password = request.form['password']
+@app.route('/results/slips', methods=['POST'])
+@login_required
+def start_result_slips():
+    if current_user.role not in ['teacher', 'admin']:
+        return jsonify({'status': 'error', 'message': 'Permission denied.'}), 403
+
+    class_name = request.form.get('class') or (request.json or {}).get('class')
+    if not class_name:
+        return jsonify({'status': 'error', 'message': 'A class is required.'}), 400
+
+    # Teachers only get slips for their own exams; admins get every exam.
+    teacher_id = current_user.id if current_user.role == 'teacher' else None
+    job_id = result_slips.start_slips_job(shared, uploads, class_name, current_user.id, teacher_id)
+    return jsonify({
+        'status': 'success',
+        'job_id': job_id,
+        'status_url': url_for('result_slips_status', job_id=job_id),
+        'download_url': url_for('download_result_slips', job_id=job_id)
+    }), 202
+
+@app.route('/results/slips/<job_id>')
+@login_required
+def result_slips_status(job_id):
+    job = result_slips.get_job(shared, job_id)
+    if not job or job['owner_id'] != current_user.id:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+    return jsonify({
+        'status': job['status'],
+        'done': job['done'],
+        'total': job['total'],
+        'error': job['error']
+    })
+
+@app.route('/results/slips/<job_id>/download')
+@login_required
+def download_result_slips(job_id):
+    job = result_slips.get_job(shared, job_id)
+    if not job or job['owner_id'] != current_user.id or job['status'] != 'finished':
+        flash('Result slips are not ready yet.')
+        return redirect(url_for('teacher_dashboard'))
+    return send_file(uploads.open(job['file']), as_attachment=True,
+                     download_name=f"result_slips_{secure_filename(job['class'])}.zip")
+
+@app.route('/uploads/<path:name>')
+@login_required
+def uploaded_file(name):
+    fileobj = uploads.open(name)
+    if fileobj is None:
+        abort(404)
+    return send_file(fileobj, download_name=os.path.basename(name))
+
+def _import_uploaded_questions(path, upload):
+    """Imports a finished question file upload into the bank and the upload's exam."""
+    with open(path, 'rb') as sheet:
+        questions, weights = question_bank.read_question_sheet(sheet, upload['filename'], upload['exam_id'])
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        question_ids = question_bank.upsert_questions(cur, upload['owner_id'], questions)
+        question_bank.link_questions(cur, upload['exam_id'], question_ids, weights)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    papers.invalidate_pools(upload['exam_id'])
+    return {'questions': len(questions)}
+
+def _store_uploaded_image(path, upload):
+    """Moves a finished image upload into the upload storage."""
+    filename = secure_filename(upload['filename'])
+    with open(path, 'rb') as image:
+        uploads.save(filename, image)
+    return {'filename': filename}
+
+UPLOAD_HANDLERS = {'questions': _import_uploaded_questions, 'image': _store_uploaded_image}
+
+def _upload_status(upload):
+    uploading = upload['status'] == 'uploading'
+    return {
+        'id': upload['id'],
+        'status': upload['status'],
+        'size': upload['size'],
+        'received': chunked_uploads.received(app.config['UPLOAD_CHUNK_FOLDER'], upload['id']) if uploading else upload['size'],
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE'],
+        'result': upload['result'],
+        'error': upload['error'],
+        'url': url_for('upload_session', upload_id=upload['id'])
+    }
+
+def _uploaded_image(upload_id):
+    """Returns the file name of the current user's finished image upload, or None."""
+    upload = chunked_uploads.get_session(shared, upload_id) if upload_id else None
+    if upload and upload['owner_id'] == current_user.id and upload['purpose'] == 'image' and upload['status'] == 'done':
+        return upload['result']['filename']
+    return None
+
+@app.route('/upload-sessions', methods=['POST'])
+@login_required
+def create_upload_session():
+    if current_user.role not in ['teacher', 'admin']:
+        return jsonify({'status': 'error', 'message': 'Permission denied.'}), 403
+
+    data = request.get_json(silent=True) or {}
+    purpose, exam_id = data.get('purpose'), None
+    if purpose == 'questions':
+        exam_id = data.get('exam_id')
         conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute("SELECT * FROM users WHERE email = %s AND role = 'student'", (email,))
-        user_data = cur.fetchone()
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM exams WHERE id = %s AND teacher_id = %s AND deleted_at IS NULL",
+                    (exam_id if isinstance(exam_id, int) else None, current_user.id))
+        exam = cur.fetchone()
         cur.close()
         conn.close()
+        if not exam:
+            return jsonify({'status': 'error', 'message': 'Permission denied.'}), 403
+
+    max_size = {'questions': app.config['MAX_QUESTION_FILE_SIZE'], 'image': app.config['MAX_IMAGE_FILE_SIZE']}.get(purpose)
+    try:
+        upload = chunked_uploads.create_session(shared, app.config['UPLOAD_CHUNK_FOLDER'], current_user.id, purpose,
+                                                secure_filename(data.get('filename') or ''), data.get('size'),
+                                                data.get('sha256'), exam_id, max_size)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(_upload_status(upload)), 201
+
+@app.route('/upload-sessions/<upload_id>', methods=['GET', 'PUT'])
+@login_required
+def upload_session(upload_id):
+    """GET reports an upload's progress; PUT adds the chunk starting at the Upload-Offset header."""
+    upload = chunked_uploads.get_session(shared, upload_id)
+    if not upload or upload['owner_id'] != current_user.id:
+        return jsonify({'status': 'error', 'message': 'Upload not found.'}), 404
+    if request.method == 'GET':
+        return jsonify(_upload_status(upload))
+    if upload['status'] != 'uploading':
+        return jsonify(_upload_status(upload)), 409
+
+    chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+    if request.content_length is None or request.content_length > chunk_size:
+        return jsonify({'status': 'error', 'message': f'Chunks must be at most {chunk_size} bytes.'}), 413
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        crc32 = int(request.headers['X-Chunk-CRC32'], 16)
+    except (KeyError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Upload-Offset and X-Chunk-CRC32 headers are required.'}), 400
 
-        if user_data and check_password_hash(user_data['password_hash'], password):
-            user = User(id=user_data['id'], fullname=user_data['fullname'], email=user_data['email'], role=user_data['role'])
+    folder = app.config['UPLOAD_CHUNK_FOLDER']
+    try:
+        received = chunked_uploads.write_chunk(folder, upload, offset, request.get_data(), crc32)
+    except ValueError as e:
+        # The browser carries on from the bytes received.
+        return jsonify(dict(_upload_status(upload), message=str(e))), 409
+    if received < upload['size']:
+        return jsonify(_upload_status(upload))
+
+    chunked_uploads.finish(shared, folder, upload, UPLOAD_HANDLERS[upload['purpose']])
+    return jsonify(_upload_status(chunked_uploads.get_session(shared, upload_id))), 202
+
+# Student routes
+@app.route('/student/login', methods=['GET', 'POST'])
+def student_login():
+    if request.method == 'POST':
+        user, throttled = authenticate(request.form['email'], request.form['password'], 'student')
+        if user:
             login_user(user)
             return redirect(url_for('student_dashboard'))
+        elif throttled:
+            flash('Too many login attempts. Please wait a few minutes and try again.')
+            return render_template('student_login.html'), 429
         else:
             flash('Invalid email or password.')
 
@@ -702,7 +1345,7 @@ def student_register():
         gender = request.form['gender']
         student_class = request.form['class']
 
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
 
         conn = get_db_connection()
         cur = conn.cursor()
@@ -727,7 +1370,7 @@ def student_register():
 def exam_instructions(exam_id):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT * FROM exams WHERE id = %s", (exam_id,))
+    cur.execute("SELECT * FROM exams WHERE id = %s AND deleted_at IS NULL", (exam_id,))
     exam = cur.fetchone()
     cur.close()
     conn.close()
@@ -742,57 +1385,88 @@ def student_dashboard():
 
     cur.execute("""
         SELECT e.* FROM exams e
-        LEFT JOIN exam_submissions s ON e.id = s.exam_id AND s.student_id = %s
-        WHERE s.id IS NULL AND ((e.start_time <= %s AND e.end_time >= %s) OR e.start_time IS NULL)
+        LEFT JOIN exam_submissions s ON e.id = s.exam_id AND s.student_id = %s AND s.status <> 'not-started'
+        WHERE s.id IS NULL AND e.archived_term IS NULL AND e.deleted_at IS NULL AND ((e.start_time <= %s AND e.end_time >= %s) OR e.start_time IS NULL)
     """, (current_user.id, now, now))
     available_exams = cur.fetchall()
 
     cur.execute("""
         SELECT e.* FROM exams e
-        WHERE e.start_time > %s
+        WHERE e.start_time > %s AND e.deleted_at IS NULL
     """, (now,))
     upcoming_exams = cur.fetchall()
 
     cur.execute("""
         SELECT e.id, e.title, e.class, s.id as submission_id, s.score, e.delay_results FROM exams e
         JOIN exam_submissions s ON e.id = s.exam_id
-        WHERE s.student_id = %s AND s.status = 'submitted'
-    """, (current_user.id,))
+        WHERE s.student_id = %s AND s.status = 'submitted' AND e.deleted_at IS NULL
+        UNION ALL
+        SELECT e.id, e.title, e.class, a.id, a.score, e.delay_results FROM exams e
+        JOIN exam_submissions_archive a ON e.id = a.exam_id
+        WHERE a.student_id = %s AND a.status = 'submitted' AND e.deleted_at IS NULL
+    """, (current_user.id, current_user.id))
     completed_exams = cur.fetchall()
 
     cur.close()
     conn.close()
     return render_template('student_dashboard.html', available_exams=available_exams, upcoming_exams=upcoming_exams, completed_exams=completed_exams, now=now)
 
+prepared.register('start_submission', 'int, int, bigint, int', answers.START_SUBMISSION_QUERY)
+
 @app.route('/student/exam/start/<int:exam_id>')
 @login_required
 def start_exam(exam_id):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    try:
-        cur.execute(
-            "INSERT INTO exam_submissions (student_id, exam_id) VALUES (%s, %s) RETURNING id",
-            (current_user.id, exam_id)
-        )
-        submission_id = cur.fetchone()['id']
-        conn.commit()
-    except psycopg2.IntegrityError:
+    cur.execute("SELECT * FROM exams WHERE id = %s AND deleted_at IS NULL", (exam_id,))
+    exam = cur.fetchone()
+    if not exam or exam['archived_term']:
+        cur.close()
+        conn.close()
+        flash('This exam is no longer available.')
+        return redirect(url_for('student_dashboard'))
+
+    # A submission inserted by a concurrent request isn't visible to the
+    # statement that skipped inserting it, so that one rare case runs twice.
+    for _ in range(2):
+        prepared.execute(cur, 'start_submission', (current_user.id, exam_id, papers.new_seed(), exam['duration']))
+        submission = cur.fetchone()
+        if submission:
+            break
+    if submission is None:
         conn.rollback()
-        cur.execute("SELECT id FROM exam_submissions WHERE student_id = %s AND exam_id = %s", (current_user.id, exam_id))
-        submission_id = cur.fetchone()['id']
+        cur.close()
+        conn.close()
+        flash('The exam could not be started. Please try again.')
+        return redirect(url_for('student_dashboard'))
+    submission_id = submission['id']
+    if submission['status'] == 'submitted':
+        conn.commit()
+        cur.close()
+        conn.close()
+        flash('You have already submitted this exam.')
+        return redirect(url_for('student_dashboard'))
 
-    cur.execute("SELECT * FROM exams WHERE id = %s", (exam_id,))
-    exam = cur.fetchone()
+    # Each student's paper is drawn from the exam's pools with the seed on
+    # their submission, and stored there so later edits to the exam's
+    # questions don't change it.
+    question_ids = papers.submission_paper(cur, exam, submission)
+    conn.commit()
 
-    if exam['randomize_questions']:
-        cur.execute("SELECT * FROM questions WHERE exam_id = %s ORDER BY RANDOM()", (exam_id,))
-    else:
-        cur.execute("SELECT * FROM questions WHERE exam_id = %s ORDER BY id", (exam_id,))
-    questions = cur.fetchall()
+    if submission['started']:
+        exam_events.publish(exam_id, {
+            'type': 'started', 'submission_id': submission_id, 'student': current_user.fullname,
+            'remaining': exam['duration'] * 60
+        })
+
+    questions = papers.fetch_paper_questions(cur, exam, question_ids)
 
     cur.close()
     conn.close()
-    return render_template('take_exam.html', exam=exam, questions=questions, submission_id=submission_id)
+    return render_template('take_exam.html', exam=exam, questions=questions, submission_id=submission_id,
+                           remaining=submission['remaining'], saved_answers=submission['answers'])
+
+prepared.register('save_answer', 'int, int, text, int', answers.SAVE_ANSWER_QUERY)
 
 @app.route('/student/exam/save_answer', methods=['POST'])
 @login_required
@@ -803,23 +1477,56 @@ def save_answer():
     answer_text = data['answer_text']
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("SELECT id FROM student_answers WHERE submission_id = %s AND question_id = %s", (submission_id, question_id))
-    exists = cur.fetchone()
-    if exists:
-        cur.execute(
-            "UPDATE student_answers SET answer_text = %s WHERE id = %s",
-            (answer_text, exists[0])
-        )
-    else:
-        cur.execute(
-            "INSERT INTO student_answers (submission_id, question_id, answer_text) VALUES (%s, %s, %s)",
-            (submission_id, question_id, answer_text)
-        )
+    prepared.execute(cur, 'save_answer', (submission_id, question_id, answer_text, current_user.id))
+    saved = cur.fetchone()
     conn.commit()
     cur.close()
     conn.close()
+    if saved is None:
+        return jsonify({'status': 'error', 'message': 'This exam is no longer in progress.'}), 409
+    exam_id, inserted = saved
+    if inserted is None:
+        return jsonify({'status': 'error', 'message': 'Unknown question.'}), 400
+    if inserted:
+        exam_events.publish(exam_id, {'type': 'answered', 'submission_id': submission_id, 'added': 1})
     return jsonify({'status': 'success'})
 
+@app.route('/student/exam/sync_answers', methods=['POST'])
+@login_required
+def sync_answers():
+    """Applies a batch of queued answer deltas from the exam page."""
+    data = request.get_json(force=True)
+    submission_id = data['submission_id']
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT status, exam_id FROM exam_submissions WHERE id = %s AND student_id = %s", (submission_id, current_user.id))
+    submission = cur.fetchone()
+    if not submission or submission[0] != 'in-progress':
+        cur.close()
+        conn.close()
+        return jsonify({'status': 'error', 'message': 'This exam is no longer in progress.'}), 409
+
+    acked_seq, added = answers.save_answers(cur, submission_id, data.get('answers', []))
+    conn.commit()
+    cur.close()
+    conn.close()
+    if added:
+        exam_events.publish(submission[1], {'type': 'answered', 'submission_id': submission_id, 'added': added})
+    return jsonify({'status': 'success', 'acked_seq': acked_seq})
+
+@app.route('/telemetry', methods=['POST'])
+def record_telemetry():
+    """Takes a beacon of exam page timings. Buffered; written to the database in batches."""
+    # The signed session is enough here; loading the user would cost a query per beacon.
+    if session.get('_user_id') is not None:
+        try:
+            data = json.loads(request.get_data())
+            exam_id = int(data['exam_id'])
+        except (ValueError, TypeError, KeyError):
+            return '', 400
+        telemetry.buffer.add(exam_id, telemetry.parse_events(data.get('events')))
+    return '', 204
+
 @app.route('/logout')
 def logout():
     logout_user()
@@ -829,19 +1536,13 @@ def logout():
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     if request.method == 'POST':
-        email = request.form['email']
-        password = request.form['password']
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute("SELECT * FROM users WHERE email = %s AND role = 'admin'", (email,))
-        user_data = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if user_data and check_password_hash(user_data['password_hash'], password):
-            user = User(id=user_data['id'], fullname=user_data['fullname'], email=user_data['email'], role=user_data['role'])
+        user, throttled = authenticate(request.form['email'], request.form['password'], 'admin')
+        if user:
             login_user(user)
             return redirect(url_for('admin_dashboard'))
+        elif throttled:
+            flash('Too many login attempts. Please wait a few minutes and try again.')
+            return render_template('admin_login.html'), 429
         else:
             flash('Invalid email or password.')
 
@@ -852,7 +1553,7 @@ def admin_login():
 def admin_dashboard():
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT id, fullname, email FROM users WHERE role = 'teacher' AND status = 'pending'")
+    cur.execute("SELECT id, fullname, email FROM users WHERE role = 'teacher' AND status = 'pending' AND deleted_at IS NULL")
     pending_teachers = cur.fetchall()
     cur.close()
     conn.close()
@@ -887,7 +1588,7 @@ def decline_teacher(teacher_id):
 def manage_users():
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT id, fullname, email, role FROM users")
+    cur.execute("SELECT id, fullname, email, role FROM users WHERE deleted_at IS NULL")
     users = cur.fetchall()
     cur.close()
     conn.close()
@@ -895,23 +1596,24 @@ def manage_users():
 
 @app.route('/admin/analytics')
 @login_required
+@read_replica
 def admin_analytics():
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
 
-    cur.execute("SELECT COUNT(*) as total_users FROM users")
+    cur.execute("SELECT COUNT(*) as total_users FROM users WHERE deleted_at IS NULL")
     total_users = cur.fetchone()['total_users']
 
-    cur.execute("SELECT COUNT(*) as total_teachers FROM users WHERE role = 'teacher'")
+    cur.execute("SELECT COUNT(*) as total_teachers FROM users WHERE role = 'teacher' AND deleted_at IS NULL")
     total_teachers = cur.fetchone()['total_teachers']
 
-    cur.execute("SELECT COUNT(*) as total_students FROM users WHERE role = 'student'")
+    cur.execute("SELECT COUNT(*) as total_students FROM users WHERE role = 'student' AND deleted_at IS NULL")
     total_students = cur.fetchone()['total_students']
 
-    cur.execute("SELECT COUNT(*) as total_exams FROM exams")
+    cur.execute("SELECT COUNT(*) as total_exams FROM exams WHERE deleted_at IS NULL")
     total_exams = cur.fetchone()['total_exams']
 
-    cur.execute("SELECT COUNT(*) as total_submissions FROM exam_submissions")
+    cur.execute("SELECT COUNT(*) as total_submissions FROM exam_submissions WHERE status <> 'not-started'")
     total_submissions = cur.fetchone()['total_submissions']
 
     cur.execute("SELECT AVG(score) as average_score FROM exam_submissions WHERE score IS NOT NULL")
@@ -939,12 +1641,14 @@ def bulk_import_users():
         return redirect(url_for('manage_users'))
 
     if file.filename.endswith('.xlsx'):
+        import pandas as pd
+
         df = pd.read_excel(file)
         conn = get_db_connection()
         cur = conn.cursor()
 
         for index, row in df.iterrows():
-            password_hash = generate_password_hash(row['password'])
+            password_hash = hash_password(row['password'])
             try:
                 cur.execute(
                     "INSERT INTO users (fullname, email, password_hash, role, gender, class) VALUES (%s, %s, %s, %s, %s, %s)",
@@ -963,12 +1667,27 @@ def bulk_import_users():
 
     return redirect(url_for('manage_users'))
 
+@app.route('/admin/telemetry')
+@login_required
+@read_replica
+def admin_telemetry():
+    hours = min(max(request.args.get('hours', 24, type=int), 1), 24 * 30)
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    exams, dropped = telemetry.exam_summary(cur, datetime.utcnow() - timedelta(hours=hours))
+    cur.close()
+    conn.close()
+    return render_template('admin_telemetry.html', exams=exams, dropped=dropped, hours=hours)
+
 @app.route('/admin/users/export')
 @login_required
+@read_replica
 def export_users():
+    import pandas as pd
+
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT fullname, email, role, gender, class FROM users")
+    cur.execute("SELECT fullname, email, role, gender, class FROM users WHERE deleted_at IS NULL")
     users = cur.fetchall()
     cur.close()
     conn.close()
@@ -994,15 +1713,22 @@ def edit_user(user_id):
         fullname = request.form['fullname']
         email = request.form['email']
         role = request.form['role']
-        cur.execute("UPDATE users SET fullname = %s, email = %s, role = %s WHERE id = %s",
-                    (fullname, email, role, user_id))
+        cur.execute("""
+            UPDATE users u SET fullname = %s, email = %s, role = %s
+            FROM users old WHERE u.id = %s AND old.id = u.id
+            RETURNING old.role
+        """, (fullname, email, role, user_id))
+        updated = cur.fetchone()
         conn.commit()
         cur.close()
         conn.close()
+        # A change of role signs the user out, so they log in again with a new session.
+        if updated is not None and updated['role'] != role:
+            invalidate_user_sessions(user_id)
         flash('User updated successfully.')
         return redirect(url_for('manage_users'))
 
-    cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+    cur.execute("SELECT * FROM users WHERE id = %s AND deleted_at IS NULL", (user_id,))
     user = cur.fetchone()
     cur.close()
     conn.close()
@@ -1042,13 +1768,32 @@ def admin_reset_password(user_id):
 def delete_user(user_id):
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+    cur.execute("SELECT 1 FROM exams WHERE teacher_id = %s AND deleted_at IS NULL LIMIT 1", (user_id,))
+    if cur.fetchone():
+        cur.close()
+        conn.close()
+        flash('Delete the exams of this teacher first.')
+        return redirect(url_for('manage_users'))
+    # Hidden now; the reaper removes the user's submissions, questions and tokens.
+    cur.execute("UPDATE users SET deleted_at = LOCALTIMESTAMP WHERE id = %s AND deleted_at IS NULL", (user_id,))
+    deleted = cur.rowcount
     conn.commit()
     cur.close()
     conn.close()
+    if deleted:
+        invalidate_user_sessions(user_id)
+        reaper.start_reaper(shared, app.config['REAPER_BATCH_SIZE'], app.config['REAPER_PAUSE'])
     flash('User deleted successfully.')
     return redirect(url_for('manage_users'))
 
+@app.route('/admin/deletions')
+@login_required
+def deletion_progress():
+    """Where the background removal of deleted exams and users has got to."""
+    if current_user.role != 'admin':
+        return jsonify({'status': 'error', 'message': 'Permission denied.'}), 403
+    return jsonify(reaper.get_progress(shared) or {'status': 'idle'})
+
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -1064,8 +1809,7 @@ def profile():
             file = request.files['profile_image']
             if file.filename != '':
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                uploads.save(f'profiles/{filename}', file.stream)
                 cur.execute("UPDATE users SET profile_image = %s WHERE id = %s", (filename, current_user.id))
 
         conn.commit()
@@ -1082,7 +1826,7 @@ def forgot_password():
         email = request.form['email']
         conn = get_db_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute("SELECT * FROM users WHERE email = %s", (email,))
+        cur.execute("SELECT * FROM users WHERE email = %s AND deleted_at IS NULL", (email,))
         user = cur.fetchone()
 
         if user:
@@ -1129,10 +1873,11 @@ def reset_password(token):
             flash('Passwords do not match.')
             return render_template('reset_password.html', token=token)
 
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
         cur.execute("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, token_data['user_id']))
         cur.execute("DELETE FROM password_reset_tokens WHERE token = %s", (token,))
         conn.commit()
+        invalidate_user_sessions(token_data['user_id'])
 
         flash('Your password has been reset successfully.')
         cur.close()
@@ -1143,12 +1888,39 @@ def reset_password(token):
     conn.close()
     return render_template('reset_password.html', token=token)
 
+GOOGLE_SCOPES = ['https://www.googleapis.com/auth/userinfo.profile', 'https://www.googleapis.com/auth/userinfo.email', 'openid']
+
+# Parsed client_secret.json and the cached HTTP session used to fetch Google's
+# signing certificates are shared by every request in the process.
+_google_client_config = None
+_google_token_request = None
+
+def get_google_client_config():
+    """Loads client_secret.json once per process."""
+    global _google_client_config
+    if _google_client_config is None:
+        with open(app.config['GOOGLE_CLIENT_SECRETS_FILE']) as f:
+            _google_client_config = json.load(f)
+    return _google_client_config
+
+def get_google_token_request():
+    """Returns a transport whose session caches certificate responses per their cache headers."""
+    global _google_token_request
+    if _google_token_request is None:
+        import requests
+        from cachecontrol import CacheControl
+        from google.auth.transport import requests as google_requests
+
+        _google_token_request = google_requests.Request(session=CacheControl(requests.session()))
+    return _google_token_request
+
 def get_google_flow():
     """Initializes and returns the Google OAuth Flow object."""
-    client_secrets_file = os.path.join(os.path.dirname(__file__), 'client_secret.json')
-    return Flow.from_client_secrets_file(
-        client_secrets_file,
-        scopes=['https://www.googleapis.com/auth/userinfo.profile', 'https://www.googleapis.com/auth/userinfo.email', 'openid'],
+    from google_auth_oauthlib.flow import Flow
+
+    return Flow.from_client_config(
+        get_google_client_config(),
+        scopes=GOOGLE_SCOPES,
         redirect_uri=url_for('google_callback', _external=True)
     )
 
@@ -1165,41 +1937,59 @@ def google_login():
 
 @app.route('/google/callback')
 def google_callback():
+    from google.auth import exceptions as google_exceptions
+    from google.oauth2 import id_token
+
     flow = get_google_flow()
     flow.fetch_token(authorization_response=request.url)
 
-    credentials = flow.credentials
-    request_session = requests.session()
-    cached_session = CacheControl(request_session)
-    token_request = google_requests.Request(session=cached_session)
-
-    id_info = id_token.verify_oauth2_token(
-        id_token=credentials._id_token,
-        request=token_request,
-        audience=app.config['GOOGLE_CLIENT_ID']
-    )
+    try:
+        id_info = id_token.verify_token(
+            flow.credentials.id_token,
+            get_google_token_request(),
+            audience=app.config['GOOGLE_CLIENT_ID'],
+            certs_url=app.config['GOOGLE_CERTS_URL']
+        )
+        if id_info.get('iss') not in app.config['GOOGLE_ISSUERS']:
+            raise google_exceptions.GoogleAuthError(f"Wrong issuer: {id_info.get('iss')}")
+    except (ValueError, google_exceptions.GoogleAuthError) as e:
+        print(f"Error verifying Google ID token: {e}")
+        flash('Google login failed. Please try again.')
+        return redirect(url_for('student_login'))
 
     email = id_info.get('email')
     name = id_info.get('name')
 
+    # Existing users are returned as-is without a write; new ones are created
+    # as students, and only they need a (random) password hashed.
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cur.execute("SELECT * FROM users WHERE email = %s", (email,))
+    user_query = "SELECT id, fullname, email, role, deleted_at FROM users WHERE email = %s"
+    cur.execute(user_query, (email,))
     user_data = cur.fetchone()
-
-    if not user_data:
-        password_hash = generate_password_hash(secrets.token_hex(16))
-        cur.execute("INSERT INTO users (fullname, email, password_hash, role, status) VALUES (%s, %s, %s, 'student', 'approved')",
-                    (name, email, password_hash))
-        conn.commit()
-        cur.execute("SELECT * FROM users WHERE email = %s", (email,))
+    if user_data is None:
+        cur.execute("""
+            INSERT INTO users (fullname, email, password_hash, role, status)
+            VALUES (%s, %s, %s, 'student', 'approved')
+            ON CONFLICT (email) DO NOTHING
+            RETURNING id, fullname, email, role, deleted_at
+        """, (name, email, hash_password(secrets.token_hex(16))))
         user_data = cur.fetchone()
+        if user_data is None:
+            # Created by a concurrent login since the first lookup.
+            cur.execute(user_query, (email,))
+            user_data = cur.fetchone()
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    # A deleted account keeps its row (and email) until the reaper removes it.
+    if user_data['deleted_at'] is not None:
+        flash('This account has been deleted.')
+        return redirect(url_for('student_login'))
 
     user = User(id=user_data['id'], fullname=user_data['fullname'], email=user_data['email'], role=user_data['role'])
     login_user(user)
-
-    cur.close()
-    conn.close()
     return redirect(url_for('student_dashboard'))
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+import re
+
+from psycopg2 import sql
+
+# Closed terms are moved out of exam_submissions and student_answers into
+# exam_submissions_archive, which is list-partitioned by term. Archived rows
+# pack a submission and all of its answers into one row, and the partitions
+# are created with a low toast_tuple_target so the packed answers are
+# compressed. The hot tables then only hold the terms still in use.
+
+
+def partition_name(term):
+    return 'exam_submissions_archive_' + re.sub(r'[^a-z0-9]+', '_', term.lower()).strip('_')
+
+
+def archive_term(cur, term, start, end):
+    """Archives the submissions of exams created in [start, end) under term.
+
+    Returns (exams archived, submissions archived). Sittings provisioned
+    but never started are dropped. Runs in the caller's transaction, so a
+    failure leaves the hot tables untouched.
+    """
+    cur.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {} PARTITION OF exam_submissions_archive
+        FOR VALUES IN ({}) WITH (toast_tuple_target = 128)
+    """).format(sql.Identifier(partition_name(term)), sql.Literal(term)))
+
+    cur.execute("""
+        INSERT INTO exam_submissions_archive (term, id, student_id, exam_id, start_time, end_time, score, status, seed, paper, answers)
+        SELECT %s, s.id, s.student_id, s.exam_id, s.start_time, s.end_time, s.score, s.status, s.seed, s.paper,
+               COALESCE(a.answers, '{}'::jsonb)
+        FROM exam_submissions s
+        JOIN exams e ON e.id = s.exam_id
+        LEFT JOIN LATERAL (
+            SELECT jsonb_object_agg(sa.question_id, COALESCE(sa.answer_text, choice_text(sa.answer_mask))) AS answers
+            FROM student_answers sa
+            WHERE sa.submission_id = s.id
+        ) a ON TRUE
+        WHERE e.created_at >= %s AND e.created_at < %s AND s.status <> 'not-started'
+    """, (term, start, end))
+    submissions = cur.rowcount
+
+    # Answers are deleted in bulk first rather than one cascade per submission.
+    cur.execute("""
+        DELETE FROM student_answers sa
+        USING exam_submissions s, exams e
+        WHERE sa.submission_id = s.id AND e.id = s.exam_id AND e.created_at >= %s AND e.created_at < %s
+    """, (start, end))
+    cur.execute("""
+        DELETE FROM exam_submissions s
+        USING exams e
+        WHERE e.id = s.exam_id AND e.created_at >= %s AND e.created_at < %s
+    """, (start, end))
+    cur.execute("""
+        UPDATE exams SET archived_term = %s
+        WHERE created_at >= %s AND created_at < %s AND archived_term IS NULL
+    """, (term, start, end))
+    return cur.rowcount, submissions
+
+
+def fetch_archived_submission(cur, submission_id, student_id):
+    """Reads an archived submission and its answered questions.
+
+    Returns (submission, answers) shaped like the rows view_results reads
+    from the hot tables, or (None, []) if there is no such submission.
+    """
+    cur.execute("""
+        SELECT id, student_id, exam_id, start_time, end_time, score, status, seed, term
+        FROM exam_submissions_archive
+        WHERE id = %s AND student_id = %s
+    """, (submission_id, student_id))
+    submission = cur.fetchone()
+    if not submission:
+        return None, []
+    cur.execute("""
+        SELECT q.*, a.value AS answer_text,
+               CASE WHEN q.question_type <> 'short-answer' THEN choice_mask(a.value) END AS answer_mask
+        FROM exam_submissions_archive s
+        CROSS JOIN LATERAL jsonb_each_text(s.answers) a
+        JOIN questions q ON q.id = a.key::int
+        WHERE s.term = %s AND s.id = %s
+    """, (submission['term'], submission_id))
+    return submission, cur.fetchall()
@@ -0,0 +1,117 @@
+import hashlib
+import mimetypes
+import os
+
+from werkzeug.security import safe_join
+
+import compression
+
+# The pages' CSS and JS live in static/css and static/js and are linked with
+# asset_url, which adds a fingerprint of the file's content (?v=...). A
+# fingerprinted URL always names the same bytes, so it is served with a
+# far-future Cache-Control and the browser downloads each bundle once;
+# editing a file changes its fingerprint. `flask build-assets` writes .gz
+# (and .br, with the brotli package) copies next to each bundle, which are
+# sent instead of compressing the file on every request.
+CACHE_SECONDS = 365 * 24 * 3600
+BUNDLE_EXTENSIONS = ('.css', '.js')
+PRECOMPRESSED = {'br': '.br', 'gzip': '.gz'}
+
+
+class Assets:
+    def __init__(self, static_folder, static_url_path='/static'):
+        self.static_folder = static_folder
+        self.static_url_path = static_url_path
+        self._fingerprints = {}
+
+    def _path(self, name):
+        path = safe_join(self.static_folder, name)
+        if path is None:
+            raise FileNotFoundError(name)
+        return path
+
+    def fingerprint(self, name):
+        """Returns a short hash of a static file's content, cached until the file changes."""
+        path = self._path(name)
+        mtime = os.path.getmtime(path)
+        cached = self._fingerprints.get(name)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                cached = (mtime, hashlib.sha256(f.read()).hexdigest()[:12])
+            self._fingerprints[name] = cached
+        return cached[1]
+
+    def url(self, name):
+        return f'{self.static_url_path}/{name}?v={self.fingerprint(name)}'
+
+    def bundles(self):
+        for folder, _, files in os.walk(self.static_folder):
+            for file_name in sorted(files):
+                if file_name.endswith(BUNDLE_EXTENSIONS):
+                    yield os.path.relpath(os.path.join(folder, file_name), self.static_folder)
+
+    def precompressed(self, name, accept_encoding):
+        """Returns (file name, encoding) of an up-to-date compressed copy of name, or None."""
+        if not name.endswith(BUNDLE_EXTENSIONS):
+            return None
+        accepted = compression.accepted_encodings(accept_encoding)
+        for encoding, extension in PRECOMPRESSED.items():
+            if encoding not in accepted:
+                continue
+            try:
+                path = self._path(name)
+                if os.path.getmtime(path + extension) >= os.path.getmtime(path):
+                    return name + extension, encoding
+            except OSError:
+                pass
+        return None
+
+    def build(self, level=9):
+        """Writes compressed copies of every bundle. Returns the bundles written."""
+        encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+        built = []
+        for name in self.bundles():
+            path = os.path.join(self.static_folder, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            for encoding in encodings:
+                with open(path + PRECOMPRESSED[encoding], 'wb') as out:
+                    out.write(compression.compress(data, encoding, level))
+            built.append(name)
+        return built
+
+
+def init_app(app):
+    """Registers asset_url for templates, precompressed bundles and their cache headers."""
+    from flask import request, send_from_directory
+
+    assets = Assets(app.static_folder, app.static_url_path)
+    app.jinja_env.globals['asset_url'] = assets.url
+
+    @app.before_request
+    def send_precompressed_asset():
+        if request.endpoint != 'static':
+            return None
+        name = request.view_args['filename']
+        found = assets.precompressed(name, request.headers.get('Accept-Encoding'))
+        if found is None:
+            return None
+        response = send_from_directory(app.static_folder, found[0], mimetype=mimetypes.guess_type(name)[0])
+        response.headers['Content-Encoding'] = found[1]
+        response.vary.add('Accept-Encoding')
+        return response
+
+    @app.after_request
+    def cache_fingerprinted_asset(response):
+        if request.endpoint == 'static' and response.status_code in (200, 304) and request.args.get('v'):
+            try:
+                current = request.args['v'] == assets.fingerprint(request.view_args['filename'])
+            except OSError:
+                current = False
+            if current:
+                response.cache_control.public = True
+                response.cache_control.max_age = CACHE_SECONDS
+                response.cache_control.immutable = True
+        return response
+
+    return assets
@@ -0,0 +1,298 @@
+"""Async serving mode for the exam-taking endpoints.
+
+Serves start_exam, save_answer, sync_answers and submit_exam_route with
+Quart and an asyncpg connection pool, so a worker waiting on Postgres
+can keep serving other candidates instead of holding a thread. It runs
+next to app.py against the same database and schema, and shares the
+sessions app.py writes, so a load balancer can send /student/exam/ to it
+and everything else to the Flask app:
+
+    uvicorn async_app:app --workers 4 --port 8001
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import asyncpg
+from dotenv import load_dotenv
+from quart import Quart, flash, jsonify, redirect, render_template, request, session, url_for
+from werkzeug.routing import Rule
+
+import answers
+import assets
+import compression
+import papers
+import regrade
+import sessions
+import shared_state
+from live import exam_events
+
+load_dotenv()
+
+app = Quart(__name__)
+# These must match app.py for the Flask app's sessions to be readable here.
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_secret_key')
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+app.config['SESSION_REFRESH_THRESHOLD'] = float(os.environ.get('SESSION_REFRESH_THRESHOLD', 0.5))
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'cookie')
+app.config['SESSION_SQLITE_PATH'] = os.environ.get('SESSION_SQLITE_PATH', 'sessions.sqlite3')
+app.config['SHARED_STATE_URL'] = os.environ.get('SHARED_STATE_URL')
+app.config['ASYNC_DB_POOL_MIN'] = int(os.environ.get('ASYNC_DB_POOL_MIN', 2))
+app.config['ASYNC_DB_POOL_MAX'] = int(os.environ.get('ASYNC_DB_POOL_MAX', 20))
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+# Pages served by the Flask app, so templates and redirects can link to them.
+for rule, endpoint in [('/student/dashboard', 'student_dashboard'), ('/student/login', 'student_login'),
+                       ('/uploads/<path:name>', 'uploaded_file'), ('/telemetry', 'record_telemetry')]:
+    app.url_map.add(Rule(rule, endpoint=endpoint, build_only=True))
+
+
+def from_json(value):
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+app.jinja_env.filters['fromjson'] = from_json
+# The bundles themselves are served, precompressed and cached, by app.py.
+app.jinja_env.globals['asset_url'] = assets.Assets(app.static_folder, app.static_url_path).url
+
+
+@app.after_request
+async def compress_text_response(response):
+    if compression.should_compress(response, app.config['COMPRESS_MIN_SIZE']):
+        response = compression.compress_response(response, request.headers.get('Accept-Encoding'),
+                                                 await response.get_data(), app.config['COMPRESS_LEVEL'])
+    return response
+
+
+class ServerSideSessionInterface(sessions.ServerSideSessionInterface):
+    """Async counterpart of sessions.ServerSideSessionInterface, sharing its store and cookie.
+
+    Store calls block, so they run in a thread.
+    """
+
+    async def open_session(self, app, request):
+        sid = self.session_id(app, request)
+        return self.make_session(sid, await asyncio.to_thread(self.store.load, sid) if sid else None)
+
+    async def save_session(self, app, session, response):
+        writes = self.store_writes(app, session)
+        for function, args in writes:
+            await asyncio.to_thread(function, *args)
+        if writes:
+            self.update_cookie(app, session, response)
+
+
+shared = shared_state.create_state(app.config['SHARED_STATE_URL'])
+papers.use_shared_state(shared)
+exam_events.use_shared_state(shared)
+
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    app.session_interface = ServerSideSessionInterface(sessions.SQLiteSessionStore(app.config['SESSION_SQLITE_PATH']))
+elif app.config['SESSION_BACKEND'] == 'shared':
+    app.session_interface = ServerSideSessionInterface(sessions.SharedStateSessionStore(shared))
+
+
+@app.before_request
+async def refresh_session():
+    # The same sliding expiry as app.py, so a candidate sitting an exam here stays logged in.
+    if not session:
+        return
+    if not session.permanent:
+        session.permanent = True
+    now = int(time.time())
+    refreshed_at = session.get('_refreshed_at', 0)
+    if now - refreshed_at >= app.permanent_session_lifetime.total_seconds() * app.config['SESSION_REFRESH_THRESHOLD']:
+        session['_refreshed_at'] = now
+
+
+pool = None
+
+
+async def init_connection(conn):
+    await conn.set_type_codec('jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+
+@app.before_serving
+async def open_pool():
+    global pool
+    pool = await asyncpg.create_pool(
+        os.environ['DATABASE_URL'], min_size=app.config['ASYNC_DB_POOL_MIN'],
+        max_size=app.config['ASYNC_DB_POOL_MAX'], init=init_connection
+    )
+
+
+@app.after_serving
+async def close_pool():
+    await pool.close()
+
+
+async def current_user(conn):
+    """Returns the logged-in user's row, the same user Flask-Login would load."""
+    user_id = session.get('_user_id')
+    if user_id is None:
+        return None
+    return await conn.fetchrow("SELECT id, fullname FROM users WHERE id = $1 AND deleted_at IS NULL", int(user_id))
+
+
+def login_required_response():
+    return jsonify({'status': 'error', 'message': 'Please log in.'}), 401
+
+
+async def get_pools(conn, exam_id):
+    pools = papers.cached_pools(exam_id)
+    if pools is None:
+        rows = await conn.fetch(papers.POOLS_QUERY, exam_id)
+        pools = papers.build_pools(rows)
+        papers.store_pools(exam_id, pools)
+    return pools
+
+
+async def paper_question_ids(conn, exam, seed):
+    return papers.draw_paper(await get_pools(conn, exam['id']), exam, seed)
+
+
+async def submission_paper(conn, exam, submission):
+    """Async counterpart of papers.submission_paper."""
+    if submission['paper'] is not None:
+        return list(submission['paper'])
+    question_ids = await paper_question_ids(conn, exam, papers.submission_seed(submission))
+    return list(await conn.fetchval(papers.STORE_PAPER_QUERY, submission['id'], question_ids))
+
+
+async def save_answers(conn, submission_id, batch):
+    """Async counterpart of answers.save_answers, with the same last-writer-wins rules."""
+    latest = answers.latest_answers(submission_id, batch)
+    if not latest:
+        return None, 0
+    saved = await conn.fetch(answers.SAVE_ANSWERS_QUERY, *answers.save_answers_params(submission_id, latest))
+    return answers.saved_counts(latest, saved)
+
+
+async def calculate_score(conn, submission_id):
+    """Scores a submission with the same statements and rules as regrade.score_submissions."""
+    submission_ids = [submission_id]
+    submissions = await conn.fetch(regrade.PAPERS_QUERY, submission_ids)
+    answered = []
+    unstored = regrade.unstored_papers(submissions)
+    if unstored:
+        answered = await conn.fetch(regrade.ANSWERED_QUERY, unstored)
+    short_rows = await conn.fetch(regrade.SHORT_ANSWERS_QUERY, submission_ids)
+    await conn.execute(regrade.SCORE_QUERY, *regrade.score_params(submission_ids, submissions, answered, short_rows))
+
+
+@app.route('/student/exam/start/<int:exam_id>')
+async def start_exam(exam_id):
+    async with pool.acquire() as conn:
+        user = await current_user(conn)
+        if user is None:
+            return redirect(url_for('student_login', next=request.path))
+
+        exam = await conn.fetchrow("SELECT * FROM exams WHERE id = $1 AND deleted_at IS NULL", exam_id)
+        if not exam or exam['archived_term']:
+            await flash('This exam is no longer available.')
+            return redirect(url_for('student_dashboard'))
+
+        # Run twice only when a concurrent request created the submission.
+        for _ in range(2):
+            submission = await conn.fetchrow(
+                answers.START_SUBMISSION_QUERY, user['id'], exam_id, papers.new_seed(), exam['duration']
+            )
+            if submission:
+                break
+        if submission is None:
+            await flash('The exam could not be started. Please try again.')
+            return redirect(url_for('student_dashboard'))
+        if submission['status'] == 'submitted':
+            await flash('You have already submitted this exam.')
+            return redirect(url_for('student_dashboard'))
+
+        question_ids = await submission_paper(conn, exam, submission)
+        # The shared state's client blocks, so it is called off the event loop, as the session store is.
+        questions = await asyncio.to_thread(papers.cached_paper_questions, exam, question_ids)
+        if questions is None:
+            rows = await conn.fetch(papers.PAPER_QUESTIONS_QUERY, exam_id, question_ids)
+            by_id = {row['id']: dict(row) for row in rows}
+            questions = [by_id[question_id] for question_id in question_ids if question_id in by_id]
+
+    if submission['started']:
+        await asyncio.to_thread(exam_events.publish, exam_id, {
+            'type': 'started', 'submission_id': submission['id'], 'student': user['fullname'],
+            'remaining': exam['duration'] * 60
+        })
+    return await render_template('take_exam.html', exam=dict(exam), questions=questions, submission_id=submission['id'],
+                                 remaining=submission['remaining'], saved_answers=submission['answers'])
+
+
+@app.route('/student/exam/save_answer', methods=['POST'])
+async def save_answer():
+    data = await request.get_json()
+    submission_id = int(data['submission_id'])
+    async with pool.acquire() as conn:
+        user = await current_user(conn)
+        if user is None:
+            return login_required_response()
+        row = await conn.fetchrow(answers.SAVE_ANSWER_QUERY, submission_id, int(data['question_id']), data['answer_text'],
+                                  user['id'])
+    if row is None:
+        return jsonify({'status': 'error', 'message': 'This exam is no longer in progress.'}), 409
+    if row['inserted'] is None:
+        return jsonify({'status': 'error', 'message': 'Unknown question.'}), 400
+    if row['inserted']:
+        await asyncio.to_thread(exam_events.publish, row['exam_id'],
+                                {'type': 'answered', 'submission_id': submission_id, 'added': 1})
+    return jsonify({'status': 'success'})
+
+
+@app.route('/student/exam/sync_answers', methods=['POST'])
+async def sync_answers():
+    data = await request.get_json(force=True)
+    submission_id = int(data['submission_id'])
+    async with pool.acquire() as conn:
+        user = await current_user(conn)
+        if user is None:
+            return login_required_response()
+        submission = await conn.fetchrow(
+            "SELECT status, exam_id FROM exam_submissions WHERE id = $1 AND student_id = $2", submission_id, user['id']
+        )
+        if not submission or submission['status'] != 'in-progress':
+            return jsonify({'status': 'error', 'message': 'This exam is no longer in progress.'}), 409
+        acked_seq, added = await save_answers(conn, submission_id, data.get('answers', []))
+    if added:
+        await asyncio.to_thread(exam_events.publish, submission['exam_id'],
+                                {'type': 'answered', 'submission_id': submission_id, 'added': added})
+    return jsonify({'status': 'success', 'acked_seq': acked_seq})
+
+
+@app.route('/student/exam/submit', methods=['POST'])
+async def submit_exam_route():
+    data = await request.get_json()
+    submission_id = int(data['submission_id'])
+    async with pool.acquire() as conn:
+        user = await current_user(conn)
+        if user is None:
+            return login_required_response()
+        async with conn.transaction():
+            added = 0
+            if data.get('answers'):
+                in_progress = await conn.fetchval(
+                    "SELECT 1 FROM exam_submissions WHERE id = $1 AND student_id = $2 AND status = 'in-progress'",
+                    submission_id, user['id']
+                )
+                if in_progress:
+                    added = (await save_answers(conn, submission_id, data['answers']))[1]
+            exam_id = await conn.fetchval(
+                "UPDATE exam_submissions SET status = 'submitted', end_time = $1 WHERE id = $2 RETURNING exam_id",
+                datetime.utcnow(), submission_id
+            )
+            if exam_id is not None:
+                await calculate_score(conn, submission_id)
+    if exam_id is not None:
+        await asyncio.to_thread(exam_events.publish, exam_id,
+                                {'type': 'submitted', 'submission_id': submission_id, 'added': added})
+
+    await flash('Exam submitted successfully!')
+    return jsonify({'status': 'success'})
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+
+# Large question files and images are sent a chunk at a time, so a slow or
+# flaky link only ever resends the chunk it lost, and no web worker is held
+# for the whole upload. The browser opens an upload session with the file's
+# name, size and (when it can compute one) SHA-256, then PUTs chunks of at
+# most CHUNK_SIZE bytes, each with the offset it starts at and its CRC32.
+# Chunks are written into one file per session under the chunk folder, and
+# the bytes already on disk are the session's progress: after a dropped
+# connection or a page reload the browser asks how much arrived and carries
+# on from there. Once the last chunk is in, the whole file is checked
+# against the SHA-256 and handed to a background thread for the session's
+# purpose (importing questions, storing an image); the browser polls the
+# session for the outcome. Session records live in the shared state, so
+# with several nodes the chunk folder must be shared too.
+CHUNK_SIZE = 1024 * 1024
+MAX_SIZES = {'questions': 20 * 1024 * 1024, 'image': 5 * 1024 * 1024}
+EXTENSIONS = {'questions': ('.csv', '.xlsx'), 'image': ('.png', '.jpg', '.jpeg', '.gif', '.webp')}
+SESSION_TTL = 24 * 60 * 60
+
+
+def _session_key(upload_id):
+    return f'upload-session:{upload_id}'
+
+
+def _part_path(folder, upload_id):
+    return os.path.join(folder, f'{upload_id}.part')
+
+
+def _save(state, upload):
+    state.set(_session_key(upload['id']), json.dumps(upload), ttl=SESSION_TTL)
+
+
+def create_session(state, folder, owner_id, purpose, filename, size, sha256=None, exam_id=None, max_size=None):
+    """Opens an upload session and returns its record. Raises ValueError for a file that can't be accepted."""
+    if purpose not in MAX_SIZES:
+        raise ValueError('Unknown upload type.')
+    if not filename or not filename.lower().endswith(EXTENSIONS[purpose]):
+        raise ValueError(f"Only {', '.join(EXTENSIONS[purpose])} files can be uploaded.")
+    max_size = max_size or MAX_SIZES[purpose]
+    if not isinstance(size, int) or isinstance(size, bool) or not 0 < size <= max_size:
+        raise ValueError(f'Files must be between 1 byte and {max_size // (1024 * 1024)} MB.')
+    if sha256 is not None and (not isinstance(sha256, str) or len(sha256) != 64
+                               or any(c not in '0123456789abcdef' for c in sha256.lower())):
+        raise ValueError('Invalid SHA-256 checksum.')
+
+    upload = {
+        'id': uuid.uuid4().hex,
+        'owner_id': owner_id,
+        'purpose': purpose,
+        'exam_id': exam_id,
+        'filename': filename,
+        'size': size,
+        'sha256': sha256.lower() if sha256 else None,
+        'status': 'uploading',
+        'result': None,
+        'error': None,
+    }
+    os.makedirs(folder, exist_ok=True)
+    open(_part_path(folder, upload['id']), 'wb').close()
+    _save(state, upload)
+    return upload
+
+
+def get_session(state, upload_id):
+    upload = state.get(_session_key(upload_id))
+    return json.loads(upload) if upload else None
+
+
+def received(folder, upload_id):
+    """Returns how many bytes of an upload are on this node's disk."""
+    try:
+        return os.path.getsize(_part_path(folder, upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+def write_chunk(folder, upload, offset, data, crc32):
+    """Writes a chunk at offset and returns the bytes received so far.
+
+    Raises ValueError when the chunk doesn't continue the file where it
+    ends, runs past the declared size or fails its CRC32; the caller
+    reports the bytes received so the browser can resend from there.
+    """
+    path = _part_path(folder, upload['id'])
+    if not os.path.exists(path):
+        raise ValueError('The upload has expired.')
+    if offset != os.path.getsize(path):
+        raise ValueError('The chunk does not start where the upload ends.')
+    if not data or offset + len(data) > upload['size']:
+        raise ValueError('The chunk runs past the end of the file.')
+    if zlib.crc32(data) != crc32:
+        raise ValueError('The chunk was damaged in transit.')
+    with open(path, 'r+b') as part:
+        part.seek(offset)
+        part.write(data)
+    return offset + len(data)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _process(state, upload, path, handler):
+    try:
+        if upload['sha256'] and _sha256(path) != upload['sha256']:
+            upload.update(status='failed', error='The file arrived damaged. Please upload it again.')
+        else:
+            upload.update(status='done', result=handler(path, upload))
+    except Exception as e:
+        print(f"Error processing upload {upload['id']}: {e}")
+        upload.update(status='failed', error=str(e))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    _save(state, upload)
+
+
+def finish(state, folder, upload, handler):
+    """Checks a complete upload and runs handler(path, upload) on it in the background.
+
+    handler's return value becomes the session's result; the file is
+    removed afterwards either way. Returns False if another request already
+    finished the upload.
+    """
+    path = _part_path(folder, upload['id'])
+    ready = path[:-len('.part')] + '.ready'
+    try:
+        # Only one of two requests racing to finish gets to move the file.
+        os.rename(path, ready)
+    except FileNotFoundError:
+        return False
+    upload['status'] = 'processing'
+    _save(state, upload)
+    threading.Thread(target=_process, args=(state, upload, ready, handler), daemon=True).start()
+    return True
+
+
+def purge_abandoned(folder, older_than):
+    """Removes chunk files untouched for older_than seconds. Returns how many were removed."""
+    removed = 0
+    cutoff = time.time() - older_than
+    if not os.path.isdir(folder):
+        return removed
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.endswith(('.part', '.ready')) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
@@ -0,0 +1,217 @@
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+import psycopg2.extras
+
+import short_answers
+from database import get_db_connection
+
+# Flags pairs of submissions to an exam whose answers are suspiciously
+# alike, above all the same wrong answers. Each submission becomes three
+# rows of bits, packed into uint64 words:
+#   answered   one bit per question the student answered
+#   responses  one bit per distinct (question, answer) given by anyone
+#   wrong      the responses bits of the answers that are wrong
+# so the number of questions two students answered identically is the
+# popcount of their responses rows ANDed, and likewise for identical wrong
+# answers and questions both answered. Pairs are compared a block of rows
+# against all later rows at a time, so memory stays near BLOCK_BYTES
+# however many candidates sat the exam. A pair is reported when it shares
+# at least MIN_SHARED_WRONG wrong answers, ranked by shared wrong answers
+# per question the two answered differently (plus one), and only the top
+# REPORT_SIZE pairs are kept.
+MIN_SHARED_WRONG = 3
+REPORT_SIZE = 100
+BLOCK_BYTES = 32 * 1024 * 1024
+JOB_TTL = 24 * 60 * 60
+
+if hasattr(np, 'bitwise_count'):
+    def _count_bits(words):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int32)
+else:
+    _BYTE_BITS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _count_bits(words):
+        return _BYTE_BITS[words.view(np.uint8)].sum(axis=-1, dtype=np.int32)
+
+
+def pack_rows(bits):
+    """Packs a 2-D boolean array into rows of uint64 words."""
+    packed = np.packbits(bits, axis=1)
+    width = max(8, -(-packed.shape[1] // 8) * 8)
+    words = np.zeros((bits.shape[0], width), dtype=np.uint8)
+    words[:, :packed.shape[1]] = packed
+    return words.view(np.uint64)
+
+
+def encode_answers(submission_ids, rows):
+    """Encodes answer rows as the packed (answered, responses, wrong) matrices.
+
+    rows are (submission_id, question_id, answer_mask, answer_text,
+    question_type, correct_mask, correct_answer) tuples; matrix rows follow
+    submission_ids. Short answers count as the same response when they
+    normalize to the same text.
+    """
+    row_of = {submission_id: i for i, submission_id in enumerate(submission_ids)}
+    question_of, column_of, wrong_columns = {}, {}, []
+    rows_idx, questions_idx, columns_idx = [], [], []
+    for submission_id, question_id, answer_mask, answer_text, question_type, correct_mask, correct_answer in rows:
+        if submission_id not in row_of:
+            continue
+        if question_type in ('single-choice', 'multiple-choice'):
+            if not answer_mask:
+                continue
+            response = (question_id, answer_mask)
+        else:
+            normalized = short_answers.normalize(answer_text or '')
+            if not normalized:
+                continue
+            response = (question_id, normalized)
+        column = column_of.get(response)
+        if column is None:
+            column = column_of[response] = len(wrong_columns)
+            if question_type in ('single-choice', 'multiple-choice'):
+                wrong_columns.append(answer_mask != correct_mask)
+            else:
+                wrong_columns.append(not short_answers.is_correct(answer_text, correct_answer))
+        rows_idx.append(row_of[submission_id])
+        questions_idx.append(question_of.setdefault(question_id, len(question_of)))
+        columns_idx.append(column)
+
+    answered = np.zeros((len(submission_ids), len(question_of)), dtype=bool)
+    answered[rows_idx, questions_idx] = True
+    responses = np.zeros((len(submission_ids), len(wrong_columns)), dtype=bool)
+    responses[rows_idx, columns_idx] = True
+    wrong = responses[:, np.array(wrong_columns, dtype=bool)]
+    return pack_rows(answered), pack_rows(responses), pack_rows(wrong)
+
+
+def score_pairs(answered, responses, wrong, min_shared_wrong=MIN_SHARED_WRONG, limit=REPORT_SIZE,
+                block_bytes=BLOCK_BYTES):
+    """Returns the most alike pairs, best first, as (i, j, shared_wrong, differing, compared, score).
+
+    i < j are row numbers of the packed matrices from encode_answers.
+    """
+    count = wrong.shape[0]
+    block = max(1, block_bytes // (max(count, 1) * wrong.shape[1] * wrong.itemsize))
+    best_i = best_j = np.empty(0, dtype=np.int64)
+    best_shared = np.empty(0, dtype=np.int32)
+    best_score = np.empty(0, dtype=np.float64)
+    for start in range(0, count - 1, block):
+        stop = min(start + block, count)
+        # Shared wrong answers of this block's rows against every later row.
+        shared = _count_bits(wrong[start:stop, None, :] & wrong[None, start + 1:, :])
+        rows, offsets = np.nonzero(shared >= min_shared_wrong)
+        i, j = rows + start, offsets + start + 1
+        keep = j > i
+        i, j = i[keep], j[keep]
+        if not len(i):
+            continue
+        shared = shared[rows[keep], offsets[keep]]
+        same = _count_bits(responses[i] & responses[j])
+        compared = _count_bits(answered[i] & answered[j])
+        score = shared / (compared - same + 1)
+        best_i, best_j = np.concatenate([best_i, i]), np.concatenate([best_j, j])
+        best_shared, best_score = np.concatenate([best_shared, shared]), np.concatenate([best_score, score])
+        if len(best_score) > limit:
+            top = np.argpartition(-best_score, limit - 1)[:limit]
+            best_i, best_j, best_shared, best_score = best_i[top], best_j[top], best_shared[top], best_score[top]
+
+    order = np.lexsort((-best_shared, -best_score))
+    pairs = []
+    for k in order:
+        i, j = int(best_i[k]), int(best_j[k])
+        compared = int(_count_bits(answered[i] & answered[j]))
+        same = int(_count_bits(responses[i] & responses[j]))
+        pairs.append((i, j, int(best_shared[k]), compared - same, compared, float(best_score[k])))
+    return pairs
+
+
+def fetch_answers(cur, exam_id):
+    """Returns the ids of an exam's submitted submissions and their answer rows, for encode_answers."""
+    cur.execute("""
+        SELECT s.id FROM exam_submissions s
+        JOIN users u ON u.id = s.student_id
+        WHERE s.exam_id = %s AND s.status = 'submitted' AND u.deleted_at IS NULL
+        ORDER BY s.id
+    """, (exam_id,))
+    submission_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT sa.submission_id, sa.question_id, sa.answer_mask, sa.answer_text,
+               q.question_type, q.correct_mask, q.correct_answer
+        FROM student_answers sa
+        JOIN exam_submissions s ON s.id = sa.submission_id
+        JOIN questions q ON q.id = sa.question_id
+        WHERE s.exam_id = %s AND s.status = 'submitted'
+    """, (exam_id,))
+    return submission_ids, cur.fetchall()
+
+
+def analyse_exam(conn, exam_id):
+    """Replaces an exam's report in collusion_pairs. Returns (submissions compared, pairs flagged)."""
+    cur = conn.cursor()
+    submission_ids, rows = fetch_answers(cur, exam_id)
+    pairs = score_pairs(*encode_answers(submission_ids, rows))
+    cur.execute("DELETE FROM collusion_pairs WHERE exam_id = %s", (exam_id,))
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO collusion_pairs (exam_id, rank, submission_a, submission_b, shared_wrong, differing, compared, score)
+        VALUES %s
+    """, [(exam_id, rank, submission_ids[i], submission_ids[j], shared, differing, compared, score)
+          for rank, (i, j, shared, differing, compared, score) in enumerate(pairs, 1)])
+    conn.commit()
+    cur.close()
+    return len(submission_ids), len(pairs)
+
+
+def exam_report(cur, exam_id):
+    """An exam's flagged pairs, most alike first. cur must be a DictCursor."""
+    cur.execute("""
+        SELECT p.rank, p.shared_wrong, p.differing, p.compared, p.score, p.created_at,
+               ua.fullname AS student_a, sa.score AS score_a, ub.fullname AS student_b, sb.score AS score_b
+        FROM collusion_pairs p
+        JOIN exam_submissions sa ON sa.id = p.submission_a
+        JOIN users ua ON ua.id = sa.student_id
+        JOIN exam_submissions sb ON sb.id = p.submission_b
+        JOIN users ub ON ub.id = sb.student_id
+        WHERE p.exam_id = %s AND ua.deleted_at IS NULL AND ub.deleted_at IS NULL
+        ORDER BY p.rank
+    """, (exam_id,))
+    return cur.fetchall()
+
+
+def _job_key(exam_id):
+    return f'collusion-job:{exam_id}'
+
+
+def _run_job(state, exam_id):
+    conn = None
+    try:
+        conn = get_db_connection()
+        submissions, pairs = analyse_exam(conn, exam_id)
+        job = {'status': 'finished', 'submissions': submissions, 'pairs': pairs, 'error': None}
+    except Exception as e:
+        print(f"Error analysing answers of exam {exam_id}: {e}")
+        job = {'status': 'failed', 'submissions': None, 'pairs': None, 'error': str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
+    job['finished_at'] = datetime.utcnow().isoformat()
+    state.set(_job_key(exam_id), json.dumps(job), ttl=JOB_TTL)
+
+
+def start_analysis(state, exam_id):
+    """Starts analysing an exam's answers in the background. Returns False if it is already running."""
+    job = get_job(state, exam_id)
+    if job and job['status'] == 'running':
+        return False
+    state.set(_job_key(exam_id), json.dumps({'status': 'running', 'submissions': None, 'pairs': None, 'error': None}),
+              ttl=JOB_TTL)
+    threading.Thread(target=_run_job, args=(state, exam_id), daemon=True).start()
+    return True
+
+
+def get_job(state, exam_id):
+    job = state.get(_job_key(exam_id))
+    return json.loads(job) if job else None
@@ -0,0 +1,93 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Text responses (pages, JSON, CSS, JS) are compressed on the fly when the
+# client accepts it and the body is big enough to be worth it. Brotli is
+# preferred when the brotli package is installed, as it packs the
+# template-heavy pages noticeably smaller than gzip.
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+}
+
+
+def accepted_encodings(accept_encoding):
+    """Returns the encodings an Accept-Encoding header allows, skipping q=0 ones."""
+    encodings = set()
+    for part in (accept_encoding or '').split(','):
+        encoding, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0
+        if encoding and quality > 0:
+            encodings.add(encoding.lower())
+    return encodings
+
+
+def choose_encoding(accept_encoding):
+    """Returns 'br', 'gzip' or None for a request's Accept-Encoding header."""
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings or '*' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        # Brotli quality runs 0-11; 5 is close to gzip's speed at level 6.
+        return brotli.compress(data, quality=min(11, max(0, level - 1)))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def should_compress(response, min_size):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if getattr(response, 'is_streamed', False) or getattr(response, 'direct_passthrough', False):
+        # Streams (the live monitor) and files sent from disk are left alone.
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return False
+    length = response.content_length
+    return length is None or length >= min_size
+
+
+def compress_response(response, accept_encoding, body, level):
+    """Replaces response's body with its compressed form, if that is smaller.
+
+    Works for Flask and Quart responses alike; body is the response's data.
+    """
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    compressed = compress(body, encoding, level)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(compressed))
+    return response
+
+
+def init_app(app):
+    """Compresses the Flask app's text responses of COMPRESS_MIN_SIZE bytes or more."""
+    from flask import request
+
+    @app.after_request
+    def compress_text_response(response):
+        if should_compress(response, app.config['COMPRESS_MIN_SIZE']):
+            response = compress_response(response, request.headers.get('Accept-Encoding'), response.get_data(),
+                                         app.config['COMPRESS_LEVEL'])
+        return response
@@ -1,17 +1,183 @@
+import contextvars
+import functools
 import os
+import threading
+import time
 import psycopg2
+import psycopg2.extensions
 from dotenv import load_dotenv
+from question_bank import rehash_question
 
 load_dotenv()
 
-def get_db_connection():
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+# Read-only reporting pages can be served by a streaming replica, set with
+# DATABASE_REPLICA_URL, to keep them off the primary during exams. Handlers
+# opt in with @read_replica; their get_db_connection() calls then return a
+# read-only replica connection, or a primary one when no replica is set, it
+# is unreachable (retried after REPLICA_RETRY_SECONDS) or it has fallen more
+# than REPLICA_MAX_LAG_SECONDS behind.
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get('REPLICA_CONNECT_TIMEOUT', 2))
+REPLICA_RETRY_SECONDS = 30
+
+# A replica that has replayed all it received is up to date, however long
+# ago the primary last wrote; otherwise its lag is the age of the last
+# transaction it replayed. A server that isn't in recovery has no lag.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END
+"""
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_replica_down_until = 0.0
+
+
+def _replica_connection():
+    """Returns a read-only connection to an up-to-date replica, or None."""
+    global _replica_down_until
+    url = os.environ.get('DATABASE_REPLICA_URL')
+    if not url or time.monotonic() < _replica_down_until:
+        return None
+    try:
+        conn = psycopg2.connect(url, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+    except psycopg2.OperationalError:
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        return None
+    cur = conn.cursor()
+    cur.execute(REPLICA_LAG_QUERY)
+    lag = float(cur.fetchone()[0])
+    cur.close()
+    if lag > REPLICA_MAX_LAG_SECONDS:
+        conn.close()
+        return None
+    conn.rollback()
+    conn.set_session(readonly=True)
     return conn
 
+
+def read_replica(view):
+    """Lets a read-only view's get_db_connection() calls use the replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+# Primary connections are kept open between requests: closing one rolls it
+# back and returns it to this process's pool of up to DB_POOL_SIZE idle
+# connections, so a request skips the connection setup and reuses the
+# statements already prepared on it (see prepared.py). Connections idle for
+# more than DB_POOL_MAX_IDLE seconds are closed instead. DB_POOL_SIZE=0
+# closes every connection.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 4))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+
+_idle = []
+_idle_lock = threading.Lock()
+_inherited = []
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    def close(self):
+        if not _release(self):
+            super().close()
+
+
+def _release(conn):
+    """Puts conn back in the idle pool. Returns False if it must be closed instead."""
+    if conn.closed:
+        return False
+    try:
+        conn.rollback()
+        if conn.autocommit:
+            conn.autocommit = False
+    except psycopg2.Error:
+        return False
+    with _idle_lock:
+        if len(_idle) >= DB_POOL_SIZE:
+            return False
+        _idle.append((time.monotonic(), conn))
+    return True
+
+
+def _pooled_connection():
+    while True:
+        with _idle_lock:
+            if not _idle:
+                break
+            released_at, conn = _idle.pop()
+        if not conn.closed and time.monotonic() - released_at < DB_POOL_MAX_IDLE:
+            return conn
+        psycopg2.extensions.connection.close(conn)
+    return psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=PooledConnection)
+
+
+def _forget_idle_connections():
+    # A forked worker must not use the parent's idle connections, nor close
+    # them, which would end the parent's sessions: they are kept unused.
+    global _idle_lock
+    _idle_lock = threading.Lock()
+    _inherited.extend(_idle)
+    _idle.clear()
+
+
+os.register_at_fork(after_in_child=_forget_idle_connections)
+
+
+def get_db_connection():
+    if _use_replica.get():
+        conn = _replica_connection()
+        if conn is not None:
+            return conn
+    return _pooled_connection()
+
 def init_db():
     conn = get_db_connection()
     cur = conn.cursor()
 
+    # Choice answers are stored as SMALLINT bitmasks: bit i is set when
+    # option i (0-based) is chosen, for the first 15 options. choice_mask
+    # reads the "0,2" form the exam page sends, choice_text turns a mask
+    # back into it, and options_mask reads the correct flags of a question's
+    # options.
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION choice_mask(answer TEXT) RETURNS SMALLINT
+    LANGUAGE SQL IMMUTABLE STRICT AS $$
+        SELECT bit_or((1 << btrim(x)::int)::smallint) FROM unnest(string_to_array(answer, ',')) x
+        WHERE CASE WHEN btrim(x) ~ '^[0-9]{1,2}$' THEN btrim(x)::int < 15 ELSE FALSE END
+    $$;
+    CREATE OR REPLACE FUNCTION choice_text(mask SMALLINT) RETURNS TEXT
+    LANGUAGE SQL IMMUTABLE STRICT AS $$
+        SELECT string_agg(i::text, ',' ORDER BY i) FROM generate_series(0, 14) i WHERE mask & (1 << i) <> 0
+    $$;
+    CREATE OR REPLACE FUNCTION options_mask(options JSONB) RETURNS SMALLINT
+    LANGUAGE SQL IMMUTABLE STRICT AS $$
+        SELECT CASE WHEN jsonb_typeof(options) = 'array' THEN (
+            SELECT COALESCE(bit_or((1 << (n - 1)::int)::smallint), 0) FROM jsonb_array_elements(options) WITH ORDINALITY o(opt, n)
+            WHERE n <= 15 AND jsonb_typeof(opt) = 'object' AND opt->>'correct' = 'true'
+        ) END
+    $$;
+    """)
+
+    # Question search: the question text weighs more than the option texts.
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION question_search_vector(question_text TEXT, options JSONB) RETURNS tsvector
+    LANGUAGE SQL IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('english', COALESCE(question_text, '')), 'A')
+            || setweight(to_tsvector('english', COALESCE((
+                SELECT string_agg(CASE jsonb_typeof(opt) WHEN 'object' THEN opt->>'text' WHEN 'string' THEN opt #>> '{}' END, ' ')
+                FROM jsonb_array_elements(CASE WHEN jsonb_typeof(options) = 'array' THEN options ELSE '[]' END) opt
+            ), '')), 'B')
+    $$;
+    """)
+
     # Users table
     cur.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -24,6 +190,7 @@ def init_db():
         class VARCHAR(50),
         status VARCHAR(10) DEFAULT 'approved',
         profile_image VARCHAR(255),
+        deleted_at TIMESTAMP, -- set on deletion; the reaper removes the row later
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
     """)
@@ -41,20 +208,41 @@ def init_db():
         class VARCHAR(50),
         randomize_questions BOOLEAN DEFAULT FALSE,
         elay_results BOOLEAN DEFAULT FALSE,
+        draw_spec JSONB, -- per topic/difficulty draw rules; NULL uses every question
+        archived_term VARCHAR(50), -- set once the exam's submissions are moved to the archive
+        deleted_at TIMESTAMP, -- set on deletion; the reaper removes the row later
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
     """)
 
-    # Questions table
+    # Questions table. Questions form a per-teacher bank deduplicated by
+    # content_hash; exam_id only records the exam a question was written for.
     cur.execute("""
     CREATE TABLE IF NOT EXISTS questions (
         id SERIAL PRIMARY KEY,
-        exam_id INTEGER REFERENCES exams(id) ON DELETE CASCADE,
+        exam_id INTEGER REFERENCES exams(id) ON DELETE SET NULL,
+        teacher_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
         question_text TEXT NOT NULL,
         question_image VARCHAR(255),
         question_type VARCHAR(20) NOT NULL CHECK (question_type IN ('single-choice', 'multiple-choice', 'short-answer')),
         options JSONB,
-        correct_answer TEXT
+        correct_answer TEXT,
+        correct_mask SMALLINT GENERATED ALWAYS AS (options_mask(options)) STORED, -- NULL for short answers
+        content_hash CHAR(64),
+        topic VARCHAR(100),
+        difficulty VARCHAR(20),
+        search_vector tsvector GENERATED ALWAYS AS (question_search_vector(question_text, options)) STORED
+    );
+    """)
+
+    # Exam Questions table linking bank questions to the exams that use them
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS exam_questions (
+        exam_id INTEGER REFERENCES exams(id) ON DELETE CASCADE,
+        question_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        weight NUMERIC(6, 2) DEFAULT 1 NOT NULL,
+        PRIMARY KEY (exam_id, question_id)
     );
     """)
 
@@ -67,7 +255,9 @@ def init_db():
         start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         end_time TIMESTAMP,
         score INTEGER,
-        status VARCHAR(20) DEFAULT 'in-progress' NOT NULL, -- e.g., in-progress, submitted
+        status VARCHAR(20) DEFAULT 'in-progress' NOT NULL, -- not-started (provisioned ahead), in-progress, submitted
+        seed BIGINT, -- reproduces the student's drawn paper
+        paper INTEGER[], -- question ids of the drawn paper, stored when it is first drawn
         UNIQUE(student_id, exam_id) -- A student can only take an exam once
     );
     """)
@@ -78,7 +268,60 @@ def init_db():
         id SERIAL PRIMARY KEY,
         submission_id INTEGER REFERENCES exam_submissions(id) ON DELETE CASCADE,
         question_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
-        answer_text TEXT
+        answer_text TEXT, -- short answers only
+        answer_mask SMALLINT, -- choice answers, see choice_mask
+        seq BIGINT, -- client sequence number of the last applied save
+        UNIQUE (submission_id, question_id)
+    );
+    """)
+
+    # Archive of closed terms, one list partition per term (created by
+    # `flask archive-term`). Each row is a whole submission with its answers
+    # packed into one JSONB object of question id -> answer text.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS exam_submissions_archive (
+        term VARCHAR(50) NOT NULL,
+        id INTEGER NOT NULL,
+        student_id INTEGER,
+        exam_id INTEGER,
+        start_time TIMESTAMP,
+        end_time TIMESTAMP,
+        score INTEGER,
+        status VARCHAR(20) NOT NULL,
+        seed BIGINT,
+        paper INTEGER[],
+        answers JSONB NOT NULL,
+        PRIMARY KEY (term, id)
+    ) PARTITION BY LIST (term);
+    """)
+
+    # Exam page timings reported by browsers, written in batches by
+    # telemetry.py. weight is how many events a sampled row stands for.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS client_metrics (
+        id BIGSERIAL PRIMARY KEY,
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        exam_id INTEGER, -- NULL for 'dropped' rows
+        kind VARCHAR(20) NOT NULL, -- navigation, save, save_failed, dropped
+        duration_ms REAL,
+        weight INTEGER DEFAULT 1 NOT NULL
+    );
+    """)
+
+    # Pairs of submissions with suspiciously alike answers, written by
+    # collusion.py. Each analysis replaces the exam's rows.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS collusion_pairs (
+        id SERIAL PRIMARY KEY,
+        exam_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        submission_a INTEGER NOT NULL,
+        submission_b INTEGER NOT NULL,
+        shared_wrong INTEGER NOT NULL, -- questions both got wrong with the same answer
+        differing INTEGER NOT NULL, -- questions both answered, differently
+        compared INTEGER NOT NULL, -- questions both answered
+        score REAL NOT NULL, -- shared_wrong / (differing + 1)
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
     """)
 
@@ -92,6 +335,87 @@ def init_db():
     );
     """)
 
+    # Migrations for databases created before the question bank
+    cur.execute("""
+    ALTER TABLE questions ADD COLUMN IF NOT EXISTS teacher_id INTEGER REFERENCES users(id) ON DELETE CASCADE;
+    ALTER TABLE questions ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+    ALTER TABLE questions DROP CONSTRAINT IF EXISTS questions_exam_id_fkey;
+    ALTER TABLE questions ADD CONSTRAINT questions_exam_id_fkey FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE SET NULL;
+    UPDATE questions q SET teacher_id = e.teacher_id FROM exams e WHERE q.exam_id = e.id AND q.teacher_id IS NULL;
+    INSERT INTO exam_questions (exam_id, question_id, position)
+    SELECT exam_id, id, ROW_NUMBER() OVER (PARTITION BY exam_id ORDER BY id)
+    FROM questions
+    WHERE exam_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM exam_questions)
+    ON CONFLICT DO NOTHING;
+    """)
+
+    # Migrations for randomized papers drawn from topic pools
+    cur.execute("""
+    ALTER TABLE questions ADD COLUMN IF NOT EXISTS topic VARCHAR(100);
+    ALTER TABLE questions ADD COLUMN IF NOT EXISTS difficulty VARCHAR(20);
+    ALTER TABLE exams ADD COLUMN IF NOT EXISTS draw_spec JSONB;
+    ALTER TABLE exam_submissions ADD COLUMN IF NOT EXISTS seed BIGINT;
+    """)
+
+    # Migrations for term archival
+    cur.execute("ALTER TABLE exams ADD COLUMN IF NOT EXISTS archived_term VARCHAR(50)")
+
+    # Migrations for idempotent answer sync: one row per submission and question
+    cur.execute("""
+    ALTER TABLE student_answers ADD COLUMN IF NOT EXISTS seq BIGINT;
+    DELETE FROM student_answers a USING student_answers b
+    WHERE a.submission_id = b.submission_id AND a.question_id = b.question_id AND a.id < b.id;
+    CREATE UNIQUE INDEX IF NOT EXISTS student_answers_submission_id_question_id_key ON student_answers (submission_id, question_id);
+    """)
+
+    # Migrations for bitmask-encoded choice answers. Adding the generated
+    # column computes every question's mask; choice answers are converted
+    # once and their text cleared, so re-running skips them.
+    cur.execute("""
+    ALTER TABLE questions ADD COLUMN IF NOT EXISTS correct_mask SMALLINT GENERATED ALWAYS AS (options_mask(options)) STORED;
+    ALTER TABLE student_answers ADD COLUMN IF NOT EXISTS answer_mask SMALLINT;
+    UPDATE student_answers sa SET answer_mask = choice_mask(sa.answer_text), answer_text = NULL
+    FROM questions q
+    WHERE q.id = sa.question_id AND q.question_type IN ('single-choice', 'multiple-choice') AND sa.answer_text IS NOT NULL;
+    """)
+
+    # Migrations for batched deletion
+    cur.execute("""
+    ALTER TABLE exams ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+    """)
+
+    # Migrations for question search
+    cur.execute("""
+    ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (question_search_vector(question_text, options)) STORED;
+    """)
+
+    # Migrations for stored papers
+    cur.execute("""
+    ALTER TABLE exam_submissions ADD COLUMN IF NOT EXISTS paper INTEGER[];
+    ALTER TABLE exam_submissions_archive ADD COLUMN IF NOT EXISTS paper INTEGER[];
+    """)
+
+    # Indexes
+    cur.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS questions_teacher_content_hash ON questions (teacher_id, content_hash);
+    CREATE INDEX IF NOT EXISTS exam_questions_question_id ON exam_questions (question_id);
+    CREATE INDEX IF NOT EXISTS exam_submissions_archive_id ON exam_submissions_archive (id);
+    CREATE INDEX IF NOT EXISTS exam_submissions_archive_student_id ON exam_submissions_archive (student_id);
+    CREATE INDEX IF NOT EXISTS exam_submissions_exam_id ON exam_submissions (exam_id);
+    CREATE INDEX IF NOT EXISTS student_answers_question_id ON student_answers (question_id);
+    CREATE INDEX IF NOT EXISTS questions_search_vector ON questions USING GIN (search_vector);
+    CREATE INDEX IF NOT EXISTS client_metrics_recorded_at ON client_metrics USING BRIN (recorded_at);
+    CREATE INDEX IF NOT EXISTS client_metrics_exam_id ON client_metrics (exam_id);
+    CREATE INDEX IF NOT EXISTS collusion_pairs_exam_id ON collusion_pairs (exam_id, rank);
+    """)
+
+    # Hash existing questions so they take part in deduplication
+    cur.execute("SELECT id FROM questions WHERE content_hash IS NULL")
+    for (question_id,) in cur.fetchall():
+        rehash_question(cur, question_id)
+
     conn.commit()
     cur.close()
     conn.close()
@@ -0,0 +1,78 @@
+import json
+import queue
+import threading
+
+# Events published while an exam is being sat, fanned out to the teachers
+# watching its live monitor. Each open monitor stream owns a bounded queue;
+# publishing never blocks, and a monitor too slow to keep up loses events
+# rather than holding up a student's request.
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 256
+
+
+class ExamEvents:
+    """Pub/sub of exam events, keyed by exam id, feeding the streams open in this process."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._broadcast = None
+
+    def subscribe(self, exam_id):
+        subscriber = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(exam_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, exam_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(exam_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[exam_id]
+
+    def use_shared_state(self, state):
+        """Routes events through the shared state's broadcast, so a monitor
+        sees students served by every worker and node."""
+        self._broadcast = state
+        state.subscribe('exam-events', lambda message: self._deliver(message['exam_id'], message['event']))
+
+    def publish(self, exam_id, event):
+        if self._broadcast is None:
+            self._deliver(exam_id, event)
+        else:
+            self._broadcast.publish('exam-events', {'exam_id': exam_id, 'event': event})
+
+    def _deliver(self, exam_id, event):
+        with self._lock:
+            subscribers = tuple(self._subscribers.get(exam_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def stream(self, exam_id, heartbeat=HEARTBEAT_SECONDS):
+        """Yields Server-Sent Events for exam_id until the client disconnects.
+
+        A comment line is sent every `heartbeat` seconds so proxies keep the
+        connection open and a closed client is noticed. Under a gevent worker
+        the blocking get only parks a greenlet, so a worker can hold many
+        open streams.
+        """
+        subscriber = self.subscribe(exam_id)
+        try:
+            yield ': connected\n\n'
+            while True:
+                try:
+                    event = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            self.unsubscribe(exam_id, subscriber)
+
+
+exam_events = ExamEvents()
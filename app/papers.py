@@ -0,0 +1,232 @@
+import json
+import random
+import threading
+import time
+
+import prepared
+
+# Question id pools per exam, keyed by (topic, difficulty). None in either
+# position matches any value, so a draw rule can ask for "any algebra
+# question" or "any hard question". Pools are kept for POOL_TTL seconds and
+# dropped as soon as the exam's questions change on any node.
+POOL_TTL = 300
+
+# An exam's paper payload is every question as the exam page shows it, with
+# its pool tags, stored in the shared state ahead of a sitting by
+# `flask prewarm-exams`. While it is there, each candidate's paper is filled
+# in without a query. It is dropped with the exam's pools.
+PAYLOAD_TTL = 6 * 3600
+
+_pools = {}
+_pools_lock = threading.Lock()
+_broadcast = None
+
+
+def build_pools(rows):
+    """Builds the pools from (question_id, topic, difficulty) rows in position order."""
+    pools = {}
+    for question_id, topic, difficulty in rows:
+        # A set, so untagged questions aren't added to the (None, None) pool four times.
+        for key in {(topic, difficulty), (topic, None), (None, difficulty), (None, None)}:
+            pools.setdefault(key, []).append(question_id)
+    return {key: tuple(ids) for key, ids in pools.items()}
+
+
+def cached_pools(exam_id):
+    """Returns the cached pools for an exam, or None if they need building."""
+    with _pools_lock:
+        cached = _pools.get(exam_id)
+        if cached and time.monotonic() - cached[0] < POOL_TTL:
+            return cached[1]
+    return None
+
+
+def store_pools(exam_id, pools):
+    with _pools_lock:
+        _pools[exam_id] = (time.monotonic(), pools)
+
+
+POOLS_QUERY = """
+    SELECT eq.question_id, q.topic, q.difficulty
+    FROM exam_questions eq
+    JOIN questions q ON q.id = eq.question_id
+    WHERE eq.exam_id = $1
+    ORDER BY eq.position
+"""
+prepared.register('exam_pools', 'int', POOLS_QUERY)
+
+
+def get_pools(cur, exam_id):
+    """Returns the precomputed question id pools for an exam."""
+    pools = cached_pools(exam_id)
+    if pools is None:
+        prepared.execute(cur, 'exam_pools', (exam_id,))
+        pools = build_pools(cur.fetchall())
+        store_pools(exam_id, pools)
+    return pools
+
+
+def _drop_pools(exam_id):
+    with _pools_lock:
+        if exam_id is None:
+            _pools.clear()
+        else:
+            _pools.pop(exam_id, None)
+
+
+def invalidate_pools(exam_id=None):
+    """Drops cached pools for one exam, or for every exam, on every node.
+
+    An exam's paper payload is dropped too; invalidating every exam leaves
+    payloads to expire, so pass the exam ids when questions change.
+    """
+    if _broadcast is None:
+        _drop_pools(exam_id)
+    else:
+        if exam_id is not None:
+            _broadcast.delete(_payload_key(exam_id))
+        _broadcast.publish('exam-pools', {'exam_id': exam_id})
+
+
+def use_shared_state(state):
+    """Routes pool invalidations through the shared state's broadcast."""
+    global _broadcast
+    _broadcast = state
+    state.subscribe('exam-pools', lambda message: _drop_pools(message['exam_id']))
+
+
+def new_seed():
+    return random.getrandbits(62)
+
+
+def paper_question_ids(cur, exam, seed):
+    """Returns the ordered question ids of the paper drawn with seed.
+
+    The same pools and seed always give the same paper, but the pools
+    change whenever the exam's questions do, so a student's paper is drawn
+    once and stored on their submission (see submission_paper). Each draw
+    rule costs O(count), whatever the size of the pool.
+    """
+    return draw_paper(get_pools(cur, exam['id']), exam, seed)
+
+
+def draw_paper(pools, exam, seed):
+    rng = random.Random(seed)
+
+    if exam['draw_spec']:
+        question_ids = []
+        seen = set()
+        for rule in exam['draw_spec']:
+            pool = pools.get((rule.get('topic'), rule.get('difficulty')), ())
+            for question_id in rng.sample(pool, min(int(rule['count']), len(pool))):
+                if question_id not in seen:
+                    seen.add(question_id)
+                    question_ids.append(question_id)
+    else:
+        question_ids = list(pools.get((None, None), ()))
+
+    if exam['randomize_questions']:
+        rng.shuffle(question_ids)
+    return question_ids
+
+
+def parse_draw_spec(text):
+    """Parses "topic, difficulty, count" lines into draw rules.
+
+    Topic or difficulty may be left empty or '*' to match any value.
+    Returns None for an empty spec, meaning the exam uses all its questions.
+    """
+    rules = []
+    for line in (text or '').splitlines():
+        if not line.strip():
+            continue
+        topic, difficulty, count = [part.strip() for part in line.split(',')]
+        if int(count) < 1:
+            raise ValueError(f'Draw count must be at least 1: {line}')
+        rules.append({
+            'topic': None if topic in ('', '*') else topic,
+            'difficulty': None if difficulty in ('', '*') else difficulty,
+            'count': int(count),
+        })
+    return rules or None
+
+
+def format_draw_spec(rules):
+    return '\n'.join(f"{r['topic'] or '*'}, {r['difficulty'] or '*'}, {r['count']}" for r in rules or [])
+
+
+def submission_seed(submission):
+    # Submissions made before seeds were stored fall back to their id.
+    return submission['seed'] if submission['seed'] is not None else submission['id']
+
+
+STORE_PAPER_QUERY = """
+    UPDATE exam_submissions SET paper = COALESCE(paper, $2::int[]) WHERE id = $1 RETURNING paper
+"""
+prepared.register('store_paper', 'int, int[]', STORE_PAPER_QUERY)
+
+
+def submission_paper(cur, exam, submission):
+    """Returns the question ids of a submission's paper, drawing and storing it the first time.
+
+    submission needs its id, seed and paper. If two requests draw the same
+    paper at once, both get back the one stored first. Runs in the
+    caller's transaction.
+    """
+    if submission['paper'] is not None:
+        return list(submission['paper'])
+    prepared.execute(cur, 'store_paper', (submission['id'], paper_question_ids(cur, exam, submission_seed(submission))))
+    return cur.fetchone()[0]
+
+
+PAPER_QUESTIONS_QUERY = """
+    SELECT q.id, q.question_text, q.question_image, q.question_type, q.options, eq.position, eq.weight
+    FROM exam_questions eq
+    JOIN questions q ON q.id = eq.question_id
+    WHERE eq.exam_id = $1 AND eq.question_id = ANY($2::int[])
+"""
+prepared.register('paper_questions', 'int, int[]', PAPER_QUESTIONS_QUERY)
+
+
+def fetch_paper_questions(cur, exam, question_ids):
+    """Fetches the questions of a drawn paper, in paper order, with their weights."""
+    questions = cached_paper_questions(exam, question_ids)
+    if questions is not None:
+        return questions
+    prepared.execute(cur, 'paper_questions', (exam['id'], question_ids))
+    by_id = {question['id']: question for question in cur.fetchall()}
+    return [by_id[question_id] for question_id in question_ids if question_id in by_id]
+
+
+def _payload_key(exam_id):
+    return f'paper-payload:{exam_id}'
+
+
+def cached_payload(exam_id):
+    payload = _broadcast.get(_payload_key(exam_id)) if _broadcast is not None else None
+    return json.loads(payload) if payload else None
+
+
+def cached_paper_questions(exam, question_ids):
+    """Fills in a paper from the exam's cached payload, or returns None if there is none."""
+    payload = cached_payload(exam['id'])
+    if payload is None:
+        return None
+    by_id = {question['id']: question for question in payload}
+    return [by_id[question_id] for question_id in question_ids if question_id in by_id]
+
+
+def store_payload(cur, exam_id):
+    """Builds an exam's paper payload and stores it in the shared state. Returns its size."""
+    cur.execute("""
+        SELECT q.id, q.question_text, q.question_image, q.question_type, q.options, q.topic, q.difficulty,
+               eq.position, eq.weight::float8 AS weight
+        FROM exam_questions eq
+        JOIN questions q ON q.id = eq.question_id
+        WHERE eq.exam_id = %s
+        ORDER BY eq.position
+    """, (exam_id,))
+    payload = [dict(row) for row in cur.fetchall()]
+    if _broadcast is not None:
+        _broadcast.set(_payload_key(exam_id), json.dumps(payload), ttl=PAYLOAD_TTL)
+    return len(payload)
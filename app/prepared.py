@@ -0,0 +1,79 @@
+import re
+import weakref
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+import database
+
+# The statements that run on every page load, answer save and submission
+# are registered here, prepared once per connection and then executed by
+# name, so Postgres parses and plans them once per pooled connection rather
+# than on every request. Statements are written with $1, $2... placeholders
+# and their parameter types. A new connection prepares them again on first
+# use, and a statement that was lost, or whose result columns changed with
+# the schema, is prepared again when that is noticed at the start of a
+# transaction. With DB_POOL_SIZE=0 every connection is new, so they run as
+# ordinary queries instead.
+STATEMENTS = {}
+
+_prepared = weakref.WeakKeyDictionary()
+# Connections whose statements were forgotten in the middle of a transaction
+# while the server still holds them; they are deallocated before the next
+# PREPARE, which would otherwise fail as a duplicate.
+_stale = weakref.WeakSet()
+_PLACEHOLDER = re.compile(r'\$(\d+)')
+
+
+def register(name, param_types, query):
+    """Registers a statement to run with execute(cur, name, params)."""
+    STATEMENTS[name] = (param_types, query)
+    return name
+
+
+def ad_hoc(name, params):
+    """Returns a registered statement as an ordinary query and its parameters."""
+    query = _PLACEHOLDER.sub(lambda m: f'%(p{m.group(1)})s', STATEMENTS[name][1].replace('%', '%%'))
+    return query, {f'p{i}': value for i, value in enumerate(params, 1)}
+
+
+def _prepare(cur, name):
+    if cur.connection in _stale:
+        cur.execute('DEALLOCATE ALL')
+        _stale.discard(cur.connection)
+    param_types, query = STATEMENTS[name]
+    cur.execute(f'PREPARE {name} ({param_types}) AS {query}')
+    _prepared.setdefault(cur.connection, set()).add(name)
+
+
+def _forget(cur):
+    _prepared.pop(cur.connection, None)
+
+
+def execute(cur, name, params=()):
+    """Runs a registered statement on cur, preparing it on cur's connection if needed."""
+    if database.DB_POOL_SIZE == 0:
+        cur.execute(*ad_hoc(name, params))
+        return
+    conn = cur.connection
+    at_start = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    if name not in _prepared.get(conn, ()):
+        _prepare(cur, name)
+    placeholders = ', '.join(['%s'] * len(params))
+    try:
+        cur.execute(f'EXECUTE {name} ({placeholders})' if params else f'EXECUTE {name}', params)
+    except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported) as error:
+        # The statement is gone (e.g. after DISCARD ALL), or its plan was
+        # made for columns that have since changed.
+        if isinstance(error, psycopg2.errors.FeatureNotSupported) and 'cached plan' not in str(error):
+            raise
+        _forget(cur)
+        if not at_start:
+            # Earlier work in this transaction is lost; the next one prepares afresh.
+            _stale.add(conn)
+            raise
+        conn.rollback()
+        cur.execute('DEALLOCATE ALL')
+        _prepare(cur, name)
+        cur.execute(f'EXECUTE {name} ({placeholders})' if params else f'EXECUTE {name}', params)
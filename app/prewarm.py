@@ -0,0 +1,45 @@
+import papers
+
+# Ahead of a scheduled sitting, every student in the exam's class gets a
+# 'not-started' submission with its paper seed, created in one statement,
+# and the exam's paper payload is put in the shared state (which only
+# outlives the command with SHARED_STATE_URL). When the exam opens, a
+# candidate's first request then only flips their row to 'in-progress'
+# (see answers.START_SUBMISSION_QUERY) instead of every candidate
+# inserting at once. Not-started rows are left out wherever
+# submissions are counted or listed.
+
+
+def provision_sittings(cur, exam_id):
+    """Creates a not-started submission for each student in the exam's class.
+
+    Students who already have a submission are skipped. Returns how many
+    were created.
+    """
+    cur.execute("""
+        INSERT INTO exam_submissions (student_id, exam_id, status, seed, start_time)
+        SELECT u.id, e.id, 'not-started', floor(random() * 4611686018427387904)::bigint, NULL
+        FROM exams e
+        JOIN users u ON u.role = 'student' AND u.class = e.class AND u.deleted_at IS NULL
+        WHERE e.id = %s
+        ON CONFLICT (student_id, exam_id) DO NOTHING
+    """, (exam_id,))
+    return cur.rowcount
+
+
+def prewarm_exams(cur, now, until, cache_papers=True):
+    """Provisions the sittings of the exams starting from now up to until.
+
+    Returns (exam id, sittings created, questions cached) for each exam;
+    questions cached is None when cache_papers is false.
+    """
+    cur.execute("""
+        SELECT id FROM exams
+        WHERE start_time >= %s AND start_time < %s AND archived_term IS NULL AND deleted_at IS NULL
+        ORDER BY start_time
+    """, (now, until))
+    warmed = []
+    for (exam_id,) in cur.fetchall():
+        warmed.append((exam_id, provision_sittings(cur, exam_id),
+                       papers.store_payload(cur, exam_id) if cache_papers else None))
+    return warmed
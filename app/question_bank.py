@@ -0,0 +1,205 @@
+import hashlib
+import json
+
+import psycopg2.extras
+
+# Every reader of an exam's questions goes through the exam_questions link
+# table, so the same canonical question row can be shared by many exams.
+EXAM_QUESTIONS_QUERY = """
+    SELECT q.*, eq.position, eq.weight
+    FROM exam_questions eq
+    JOIN questions q ON q.id = eq.question_id
+    WHERE eq.exam_id = %s
+    ORDER BY eq.position
+"""
+
+
+def content_hash(question_text, question_type, options, correct_answer, question_image=None):
+    """Returns a stable hash of a question's content, used to deduplicate the bank."""
+    if isinstance(options, str):
+        options = json.loads(options)
+    content = [question_text.strip(), question_type, options, str(correct_answer).strip(), question_image]
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def upsert_questions(cur, teacher_id, questions):
+    """Adds questions to a teacher's bank, reusing rows with identical content.
+
+    questions is a list of dicts with question_text, question_type, options
+    (JSON text or None), correct_answer and optionally question_image,
+    topic, difficulty and exam_id (the exam the question was first written
+    for). Returns the bank question ids in the same order as questions.
+    """
+    hashes = []
+    rows = {}
+    for question in questions:
+        digest = content_hash(question['question_text'], question['question_type'], question['options'],
+                              question['correct_answer'], question.get('question_image'))
+        hashes.append(digest)
+        rows.setdefault(digest, (
+            question.get('exam_id'), teacher_id, question['question_text'], question.get('question_image'),
+            question['question_type'], question['options'], question['correct_answer'], digest,
+            question.get('topic'), question.get('difficulty')
+        ))
+    if not rows:
+        return []
+
+    # The update makes RETURNING include rows that already existed; topic and
+    # difficulty are metadata, so a re-upload may fill them in.
+    returned = psycopg2.extras.execute_values(cur, """
+        INSERT INTO questions (exam_id, teacher_id, question_text, question_image, question_type, options, correct_answer, content_hash, topic, difficulty)
+        VALUES %s
+        ON CONFLICT (teacher_id, content_hash) DO UPDATE SET
+            content_hash = EXCLUDED.content_hash,
+            topic = COALESCE(EXCLUDED.topic, questions.topic),
+            difficulty = COALESCE(EXCLUDED.difficulty, questions.difficulty)
+        RETURNING id, content_hash
+    """, list(rows.values()), fetch=True)
+    ids = {digest: question_id for question_id, digest in returned}
+    return [ids[digest] for digest in hashes]
+
+
+def read_question_sheet(fileobj, filename, exam_id):
+    """Reads an uploaded CSV or Excel question file. Returns (questions, weights) for upsert_questions."""
+    import pandas as pd
+
+    if filename.lower().endswith('.csv'):
+        df = pd.read_csv(fileobj)
+    else:
+        df = pd.read_excel(fileobj)
+
+    questions = []
+    weights = []
+    for index, row in df.iterrows():
+        question_text = row['question_text']
+        question_type = row['question_type']
+        options = None
+        correct_answer = ''
+
+        if question_type in ['single-choice', 'multiple-choice']:
+            opts = []
+            for i in range(1, 5):
+                if f'option{i}' in row and pd.notna(row[f'option{i}']):
+                    opts.append(row[f'option{i}'])
+
+            # The file numbers options from 1; stored indices start at 0 like the forms'.
+            correct_numbers = [n.strip() for n in str(row['correct_answer']).split(',')]
+            options_data = [{'text': text, 'correct': str(i+1) in correct_numbers} for i, text in enumerate(opts)]
+            options = json.dumps(options_data)
+            correct_answer = json.dumps([str(i) for i, option in enumerate(options_data) if option['correct']])
+        else:
+            correct_answer = row['correct_answer']
+
+        questions.append({
+            'exam_id': exam_id,
+            'question_text': question_text,
+            'question_type': question_type,
+            'options': options,
+            'correct_answer': str(correct_answer),
+            'topic': str(row['topic']) if 'topic' in row and pd.notna(row['topic']) else None,
+            'difficulty': str(row['difficulty']).lower() if 'difficulty' in row and pd.notna(row['difficulty']) else None
+        })
+        weights.append(float(row['weight']) if 'weight' in row and pd.notna(row['weight']) else 1)
+    return questions, weights
+
+
+def link_questions(cur, exam_id, question_ids, weights=None):
+    """Appends bank questions to an exam, skipping ones it already has. Returns the number linked."""
+    if not question_ids:
+        return 0
+    weights = weights or [1] * len(question_ids)
+    cur.execute("""
+        INSERT INTO exam_questions (exam_id, question_id, position, weight)
+        SELECT %s, q.id, base.position + q.ord, q.weight
+        FROM unnest(%s::int[], %s::numeric[]) WITH ORDINALITY AS q(id, weight, ord),
+             (SELECT COALESCE(MAX(position), 0) AS position FROM exam_questions WHERE exam_id = %s) base
+        ON CONFLICT (exam_id, question_id) DO NOTHING
+    """, (exam_id, list(question_ids), list(weights), exam_id))
+    return cur.rowcount
+
+
+def assemble_from_exams(cur, exam_id, source_exam_ids, teacher_id):
+    """Links every question of the teacher's source exams into exam_id in one statement.
+
+    Returns the number of questions added.
+    """
+    cur.execute("""
+        INSERT INTO exam_questions (exam_id, question_id, position, weight)
+        SELECT %s, src.question_id,
+               base.position + ROW_NUMBER() OVER (ORDER BY src.exam_id, src.position),
+               src.weight
+        FROM (
+            SELECT DISTINCT ON (eq.question_id) eq.exam_id, eq.question_id, eq.position, eq.weight
+            FROM exam_questions eq
+            JOIN exams e ON e.id = eq.exam_id
+            WHERE eq.exam_id = ANY(%s) AND e.teacher_id = %s AND e.deleted_at IS NULL
+            ORDER BY eq.question_id, eq.exam_id
+        ) src,
+        (SELECT COALESCE(MAX(position), 0) AS position FROM exam_questions WHERE exam_id = %s) base
+        ON CONFLICT (exam_id, question_id) DO NOTHING
+    """, (exam_id, list(source_exam_ids), teacher_id, exam_id))
+    return cur.rowcount
+
+
+def unlink_question(cur, exam_id, question_id):
+    """Removes a question from an exam, and from the bank once no exam uses it."""
+    cur.execute("DELETE FROM exam_questions WHERE exam_id = %s AND question_id = %s", (exam_id, question_id))
+    cur.execute("""
+        DELETE FROM questions
+        WHERE id = %s AND NOT EXISTS (SELECT 1 FROM exam_questions WHERE question_id = %s)
+    """, (question_id, question_id))
+
+
+def rehash_question(cur, question_id):
+    """Recomputes a question's content hash after an edit.
+
+    If the edited content now matches another bank question, the hash is left
+    empty rather than merging the two rows, since both may already have answers.
+    """
+    cur.execute("""
+        SELECT teacher_id, question_text, question_type, options, correct_answer, question_image
+        FROM questions WHERE id = %s
+    """, (question_id,))
+    teacher_id, question_text, question_type, options, correct_answer, question_image = cur.fetchone()
+    digest = content_hash(question_text, question_type, options, correct_answer, question_image)
+    cur.execute("""
+        UPDATE questions SET content_hash = CASE
+            WHEN EXISTS (SELECT 1 FROM questions WHERE teacher_id = %s AND content_hash = %s AND id <> %s) THEN NULL
+            ELSE %s
+        END
+        WHERE id = %s
+    """, (teacher_id, digest, question_id, digest, question_id))
+
+
+QUESTION_TYPES = ('single-choice', 'multiple-choice', 'short-answer')
+SEARCH_PAGE_SIZE = 20
+
+
+def search_questions(cur, teacher_id, terms, exam_id=None, class_name=None, question_type=None,
+                     page=1, per_page=SEARCH_PAGE_SIZE):
+    """Searches a teacher's bank by question and option text, best matches first.
+
+    terms uses web search syntax ("quoted phrases", or, -excluded). Matches
+    come from the GIN index on questions.search_vector; exam_id, class_name
+    and question_type narrow them to questions used in that exam, in an exam
+    for that class, or of that type. Returns (rows, has_more) for the page.
+    """
+    cur.execute("""
+        SELECT q.id, q.question_text, q.question_type, q.topic, q.difficulty,
+               ts_rank(q.search_vector, query) AS rank
+        FROM questions q, websearch_to_tsquery('english', %(terms)s) query
+        WHERE q.teacher_id = %(teacher_id)s AND q.search_vector @@ query
+          AND (%(question_type)s IS NULL OR q.question_type = %(question_type)s)
+          AND (%(exam_id)s IS NULL OR EXISTS (
+              SELECT 1 FROM exam_questions eq WHERE eq.question_id = q.id AND eq.exam_id = %(exam_id)s))
+          AND (%(class_name)s IS NULL OR EXISTS (
+              SELECT 1 FROM exam_questions eq JOIN exams e ON e.id = eq.exam_id
+              WHERE eq.question_id = q.id AND e.class = %(class_name)s AND e.deleted_at IS NULL))
+        ORDER BY rank DESC, q.id DESC
+        LIMIT %(limit)s OFFSET %(offset)s
+    """, {
+        'terms': terms, 'teacher_id': teacher_id, 'question_type': question_type, 'exam_id': exam_id,
+        'class_name': class_name, 'limit': per_page + 1, 'offset': (page - 1) * per_page
+    })
+    rows = cur.fetchall()
+    return rows[:per_page], len(rows) > per_page
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import time
+
+
+def take_tokens(bucket, capacity, rate, cost, now):
+    """Refills a token bucket and removes cost tokens if enough are left.
+
+    bucket is the stored (tokens, updated) pair, or None for a full bucket.
+    Returns whether at least max(cost, 1) tokens were available and the
+    tokens left. A cost of 0 only checks, so its result needn't be stored:
+    the refill is worked out again from the stored bucket next time. A
+    bucket left full is the same as no bucket and needn't be kept around.
+    """
+    tokens, updated = bucket if bucket is not None else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    allowed = tokens >= max(cost, 1)
+    if allowed:
+        tokens -= cost
+    return allowed, tokens
+
+
+class MemoryBackend:
+    """Keeps token buckets in a dict. State is per process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost, now):
+        """Applies take_tokens to the bucket for key. Returns whether the take is allowed."""
+        with self._lock:
+            allowed, tokens = take_tokens(self._buckets.get(key), capacity, rate, cost, now)
+            if tokens >= capacity:
+                self._buckets.pop(key, None)
+            elif cost:
+                self._buckets[key] = (tokens, now)
+            return allowed
+
+
+class SQLiteBackend:
+    """Keeps token buckets in a local SQLite file shared by all workers on a host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _bucket(self, conn, key):
+        return conn.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+
+    def take(self, key, capacity, rate, cost, now):
+        conn = self._connection()
+        if not cost:
+            # A check reads without taking the write lock. It only deletes a
+            # bucket that has refilled, unless a take updated it meanwhile.
+            bucket = self._bucket(conn, key)
+            allowed, tokens = take_tokens(bucket, capacity, rate, cost, now)
+            if bucket is not None and tokens >= capacity:
+                conn.execute("DELETE FROM rate_limit_buckets WHERE key = ? AND updated = ?", (key, bucket[1]))
+            return allowed
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            allowed, tokens = take_tokens(self._bucket(conn, key), capacity, rate, cost, now)
+            if tokens >= capacity:
+                conn.execute("DELETE FROM rate_limit_buckets WHERE key = ?", (key,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                             (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+
+class RateLimiter:
+    """Token bucket limiter allowing `capacity` hits per `period` seconds for each key."""
+
+    def __init__(self, name, capacity, period, backend):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.backend = backend
+
+    def hit(self, key):
+        """Consumes one token for key. Returns False if the key is over its limit."""
+        return self.backend.take(f'{self.name}:{key}', self.capacity, self.rate, 1, time.time())
+
+    def blocked(self, key):
+        """Returns True if key has no tokens left, without consuming one."""
+        return not self.backend.take(f'{self.name}:{key}', self.capacity, self.rate, 0, time.time())
+
+
+def parse_limit(value):
+    """Parses a limit such as '20/60' into (capacity, period in seconds)."""
+    capacity, period = value.split('/')
+    return int(capacity), float(period)
+
+
+def create_backend(storage_path=None):
+    if storage_path:
+        return SQLiteBackend(storage_path)
+    return MemoryBackend()
@@ -0,0 +1,195 @@
+import json
+import threading
+import time
+
+import psycopg2
+import psycopg2.errors
+
+from database import get_db_connection
+
+# Deleting an exam or a user only sets its deleted_at, which hides it at
+# once. The reaper then removes the rows that depend on it a batch at a
+# time, each batch in its own short transaction ordered by id and followed
+# by a pause, so answer saves running at the same time only ever wait on a
+# few hundred row locks. The exam or user row itself goes last. A batch that
+# can't get its locks within LOCK_TIMEOUT is retried after the pause, up to
+# LOCK_RETRIES times; an exam or user that still can't be removed is logged
+# and skipped until the next run, so the ones after it are still removed.
+# Progress is kept in the shared state under PROGRESS_KEY.
+BATCH_SIZE = 500
+PAUSE = 0.05
+LOCK_TIMEOUT = '2s'
+LOCK_RETRIES = 20
+PROGRESS_KEY = 'reaper-progress'
+PROGRESS_TTL = 24 * 3600
+# Held for a whole run, so only one reaper works across the app nodes.
+ADVISORY_LOCK = 7215301
+
+# Dependent rows of a deleted exam and of a deleted user, in deletion order:
+# (table, key the batches are ordered by, condition on the table's rows
+# aliased t, with %(id)s for the exam or user id). The key needn't be
+# unique: exam_questions rows share a question_id with other exams' links,
+# so the condition is applied to the rows deleted, not only to the batch.
+EXAM_DEPENDENTS = [
+    ('student_answers', 'id', 't.submission_id IN (SELECT id FROM exam_submissions WHERE exam_id = %(id)s)'),
+    ('exam_submissions', 'id', 't.exam_id = %(id)s'),
+    ('exam_questions', 'question_id', 't.exam_id = %(id)s'),
+    ('exam_submissions_archive', 'id', 't.exam_id = %(id)s'),
+    ('client_metrics', 'id', 't.exam_id = %(id)s'),
+    ('collusion_pairs', 'id', 't.exam_id = %(id)s'),
+]
+USER_DEPENDENTS = [
+    ('student_answers', 'id', 't.submission_id IN (SELECT id FROM exam_submissions WHERE student_id = %(id)s)'),
+    ('exam_submissions', 'id', 't.student_id = %(id)s'),
+    ('student_answers', 'id', 't.question_id IN (SELECT id FROM questions WHERE teacher_id = %(id)s)'),
+    ('exam_questions', 'question_id', 't.question_id IN (SELECT id FROM questions WHERE teacher_id = %(id)s)'),
+    ('questions', 'id', 't.teacher_id = %(id)s'),
+    ('password_reset_tokens', 'id', 't.user_id = %(id)s'),
+]
+TARGETS = {'exams': EXAM_DEPENDENTS, 'users': USER_DEPENDENTS}
+
+
+def delete_in_batches(conn, table, key, condition, params, batch_size=BATCH_SIZE, pause=PAUSE, on_batch=None):
+    """Deletes the rows of table matching condition, batch_size keys at a time.
+
+    Walks the rows in key order, committing after each batch. Returns the
+    number of rows deleted. Raises LockNotAvailable once a batch has timed
+    out waiting for its locks LOCK_RETRIES times in a row.
+    """
+    cur = conn.cursor()
+    deleted, last_key, retries = 0, 0, 0
+    while True:
+        try:
+            cur.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            cur.execute(f"""
+                DELETE FROM {table} t WHERE {condition} AND t.{key} IN (
+                    SELECT t.{key} FROM {table} t
+                    WHERE {condition} AND t.{key} > %(last_key)s
+                    ORDER BY t.{key} LIMIT %(batch_size)s
+                )
+                RETURNING t.{key}
+            """, {**params, 'last_key': last_key, 'batch_size': batch_size})
+            keys = [row[0] for row in cur.fetchall()]
+            conn.commit()
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            retries += 1
+            if retries >= LOCK_RETRIES:
+                cur.close()
+                raise
+            time.sleep(pause)
+            continue
+        retries = 0
+        if not keys:
+            break
+        deleted += len(keys)
+        last_key = max(keys)
+        if on_batch:
+            on_batch(table, deleted)
+        time.sleep(pause)
+    cur.close()
+    return deleted
+
+
+def reap(conn, batch_size=BATCH_SIZE, pause=PAUSE, progress=None):
+    """Removes every soft-deleted exam and user with the rows that depend on them.
+
+    progress, if given, is called as progress(kind, id, table, deleted) after
+    each batch. An exam or user whose rows can't be deleted is logged and
+    left for the next run. Returns the number of (exams, users) removed, or
+    None if another reaper is already running.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK,))
+    if not cur.fetchone()[0]:
+        conn.rollback()
+        return None
+    conn.commit()
+    removed = {'exams': 0, 'users': 0}
+    try:
+        for kind in ('exams', 'users'):
+            skipped = []
+            while True:
+                cur.execute(f"""
+                    SELECT id FROM {kind} WHERE deleted_at IS NOT NULL AND id <> ALL(%s)
+                    ORDER BY deleted_at LIMIT 1
+                """, (skipped,))
+                row = cur.fetchone()
+                conn.commit()
+                if row is None:
+                    break
+                target_id = row[0]
+                try:
+                    for table, key, condition in TARGETS[kind]:
+                        delete_in_batches(
+                            conn, table, key, condition, {'id': target_id}, batch_size, pause,
+                            on_batch=progress and (lambda table, deleted: progress(kind, target_id, table, deleted))
+                        )
+                    cur.execute(f"DELETE FROM {kind} WHERE id = %s AND deleted_at IS NOT NULL", (target_id,))
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    print(f"Error removing deleted {kind[:-1]} {target_id}, skipped until the next run: {e}")
+                    skipped.append(target_id)
+                    continue
+                removed[kind] += 1
+                if progress:
+                    progress(kind, target_id, kind, 1)
+    finally:
+        conn.rollback()
+        cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK,))
+        conn.commit()
+        cur.close()
+    return removed['exams'], removed['users']
+
+
+def pending(conn):
+    """Whether any exam or user is waiting to be reaped."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT EXISTS (SELECT 1 FROM exams WHERE deleted_at IS NOT NULL)
+            OR EXISTS (SELECT 1 FROM users WHERE deleted_at IS NOT NULL)
+    """)
+    waiting = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    return waiting
+
+
+def get_progress(state):
+    progress = state.get(PROGRESS_KEY)
+    return json.loads(progress) if progress else None
+
+
+def _record(state, **fields):
+    state.set(PROGRESS_KEY, json.dumps({**(get_progress(state) or {}), **fields, 'updated_at': time.time()}),
+              ttl=PROGRESS_TTL)
+
+
+def _run(state, batch_size, pause):
+    conn = get_db_connection()
+    try:
+        _record(state, status='running', current=None)
+        exams = users = 0
+        # A deletion made while another reaper was finishing is picked up here.
+        while True:
+            result = reap(conn, batch_size, pause, progress=lambda kind, target_id, table, deleted: _record(
+                state, current={'kind': kind, 'id': target_id, 'table': table, 'deleted': deleted}))
+            if result is None:
+                return
+            exams, users = exams + result[0], users + result[1]
+            # Whatever is left after a run that removed nothing was skipped.
+            if result == (0, 0) or not pending(conn):
+                break
+        _record(state, status='idle', current=None, last_run={'exams': exams, 'users': users})
+    except Exception as e:
+        _record(state, status='failed', error=str(e))
+    finally:
+        conn.close()
+
+
+def start_reaper(state, batch_size=BATCH_SIZE, pause=PAUSE):
+    """Starts a background reaper on this node. It returns at once if one is already running."""
+    thread = threading.Thread(target=_run, args=(state, batch_size, pause), daemon=True)
+    thread.start()
+    return thread
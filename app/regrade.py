@@ -0,0 +1,110 @@
+import prepared
+import short_answers
+
+# Scores are recomputed for many submissions at once: each submission's
+# paper is the one stored on it (for older submissions, the questions they
+# answered, since drawing again would use the exam's current questions),
+# short answers are matched in Python against their cached key matchers,
+# and one UPDATE then marks every (submission, question) pair on those
+# papers and writes the scores that changed. The statements are shared with
+# async_app.py, so both apps grade the same way.
+PAPERS_QUERY = "SELECT id, paper FROM exam_submissions WHERE id = ANY($1::int[])"
+ANSWERED_QUERY = "SELECT submission_id, question_id FROM student_answers WHERE submission_id = ANY($1::int[])"
+SHORT_ANSWERS_QUERY = """
+    SELECT sa.submission_id, sa.question_id, sa.answer_text, q.correct_answer
+    FROM student_answers sa
+    JOIN questions q ON q.id = sa.question_id
+    WHERE sa.submission_id = ANY($1::int[]) AND q.question_type = 'short-answer'
+"""
+SCORE_QUERY = """
+    UPDATE exam_submissions s SET score = m.score
+    FROM (
+        SELECT ids.id, CASE WHEN marks.total > 0 THEN (marks.scored * 100 / marks.total)::int ELSE 0 END AS score
+        FROM unnest($1::int[]) AS ids(id)
+        LEFT JOIN (
+            SELECT p.submission_id,
+                   COALESCE(SUM(eq.weight) FILTER (WHERE sa.answer_mask = q.correct_mask OR c.question_id IS NOT NULL), 0) AS scored,
+                   SUM(eq.weight) AS total
+            FROM unnest($2::int[], $3::int[]) AS p(submission_id, question_id)
+            JOIN exam_submissions ps ON ps.id = p.submission_id
+            JOIN exam_questions eq ON eq.exam_id = ps.exam_id AND eq.question_id = p.question_id
+            JOIN questions q ON q.id = eq.question_id
+            LEFT JOIN student_answers sa ON sa.submission_id = p.submission_id AND sa.question_id = p.question_id
+            LEFT JOIN unnest($4::int[], $5::int[]) AS c(submission_id, question_id)
+                ON c.submission_id = p.submission_id AND c.question_id = p.question_id
+            GROUP BY p.submission_id
+        ) marks ON marks.submission_id = ids.id
+    ) m
+    WHERE s.id = m.id AND s.score IS DISTINCT FROM m.score
+"""
+
+prepared.register('submission_papers', 'int[]', PAPERS_QUERY)
+prepared.register('answered_questions', 'int[]', ANSWERED_QUERY)
+prepared.register('short_answers', 'int[]', SHORT_ANSWERS_QUERY)
+SCORE_STATEMENT = prepared.register('score_submissions', 'int[], int[], int[], int[], int[]', SCORE_QUERY)
+
+
+def unstored_papers(submissions):
+    """The ids of the (id, paper) rows with no stored paper."""
+    return [submission_id for submission_id, paper in submissions if paper is None]
+
+
+def score_params(submission_ids, submissions, answered, short_rows):
+    """Builds the parameters of SCORE_QUERY.
+
+    submissions are the PAPERS_QUERY rows, answered the ANSWERED_QUERY rows
+    of the unstored papers, and short_rows the SHORT_ANSWERS_QUERY rows.
+    """
+    paper_submission_ids, paper_question_ids = [], []
+    for submission_id, paper in submissions:
+        if paper is not None:
+            paper_submission_ids.extend([submission_id] * len(paper))
+            paper_question_ids.extend(paper)
+    for submission_id, question_id in answered:
+        paper_submission_ids.append(submission_id)
+        paper_question_ids.append(question_id)
+
+    on_paper = set(zip(paper_submission_ids, paper_question_ids))
+    correct = [(submission_id, question_id) for submission_id, question_id, answer_text, correct_answer in short_rows
+               if (submission_id, question_id) in on_paper and short_answers.is_correct(answer_text, correct_answer)]
+    return (
+        list(submission_ids), paper_submission_ids, paper_question_ids,
+        [submission_id for submission_id, _ in correct], [question_id for _, question_id in correct],
+    )
+
+
+def score_submissions(cur, submission_ids):
+    """Recomputes the scores of submission_ids. Returns how many changed.
+
+    Runs in the caller's transaction.
+    """
+    if not submission_ids:
+        return 0
+    submission_ids = list(submission_ids)
+    prepared.execute(cur, 'submission_papers', (submission_ids,))
+    submissions = cur.fetchall()
+    answered = []
+    unstored = unstored_papers(submissions)
+    if unstored:
+        prepared.execute(cur, 'answered_questions', (unstored,))
+        answered = cur.fetchall()
+    prepared.execute(cur, 'short_answers', (submission_ids,))
+    short_rows = cur.fetchall()
+    prepared.execute(cur, SCORE_STATEMENT, score_params(submission_ids, submissions, answered, short_rows))
+    return cur.rowcount
+
+
+def regrade_exams(cur, exam_ids):
+    """Recomputes the score of every submitted paper of exam_ids.
+
+    Returns (submissions regraded, scores changed).
+    """
+    cur.execute("SELECT id FROM exam_submissions WHERE exam_id = ANY(%s) AND status = 'submitted'", (list(exam_ids),))
+    submission_ids = [row[0] for row in cur.fetchall()]
+    return len(submission_ids), score_submissions(cur, submission_ids)
+
+
+def regrade_question(cur, question_id):
+    """Regrades every exam that uses question_id, after its answer key changed."""
+    cur.execute("SELECT exam_id FROM exam_questions WHERE question_id = %s", (question_id,))
+    return regrade_exams(cur, [row[0] for row in cur.fetchall()])
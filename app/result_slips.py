@@ -0,0 +1,190 @@
+import json
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+import psycopg2.extras
+
+from database import get_db_connection
+
+def fetch_class_results(class_name, teacher_id=None):
+    """Returns every submitted result for a class, grouped per student.
+
+    All submissions are gathered in a single query. When teacher_id is
+    given, only that teacher's exams are included.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    query = """
+        SELECT u.id AS student_id, u.fullname, u.email, u.class,
+               e.title, e.duration, s.score, s.end_time
+        FROM exam_submissions s
+        JOIN users u ON s.student_id = u.id
+        JOIN exams e ON s.exam_id = e.id
+        WHERE u.class = %s AND s.status = 'submitted' AND u.deleted_at IS NULL AND e.deleted_at IS NULL
+    """
+    params = [class_name]
+    if teacher_id is not None:
+        query += " AND e.teacher_id = %s"
+        params.append(teacher_id)
+    query += " ORDER BY u.fullname, u.id, e.created_at"
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    students = []
+    for student_id, student_rows in groupby(rows, key=lambda r: r['student_id']):
+        student_rows = list(student_rows)
+        first = student_rows[0]
+        students.append({
+            'id': student_id,
+            'fullname': first['fullname'],
+            'email': first['email'],
+            'class': first['class'],
+            'results': [
+                {
+                    'title': r['title'],
+                    'score': r['score'],
+                    'end_time': r['end_time'].strftime('%Y-%m-%d') if r['end_time'] else '',
+                }
+                for r in student_rows
+            ],
+        })
+    return students
+
+
+def _latin1(text):
+    return str(text).encode('latin-1', 'replace').decode('latin-1')
+
+
+def render_slip(student):
+    """Renders one student's result slip and returns (filename, pdf bytes).
+
+    Runs inside a worker process, so it only receives plain data.
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(190, 10, txt='UCH Staff Secondary School - Result Slip', ln=1, align='C')
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(190, 8, txt=_latin1(f"Name: {student['fullname']}"), ln=1)
+    pdf.cell(190, 8, txt=_latin1(f"Class: {student['class']}"), ln=1)
+    pdf.ln(4)
+
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(110, 8, txt='Exam', border=1)
+    pdf.cell(40, 8, txt='Date', border=1)
+    pdf.cell(40, 8, txt='Score', border=1, ln=1)
+    pdf.set_font('Arial', '', 12)
+    scores = []
+    for result in student['results']:
+        score = result['score'] if result['score'] is not None else 0
+        scores.append(score)
+        pdf.cell(110, 8, txt=_latin1(result['title'])[:50], border=1)
+        pdf.cell(40, 8, txt=result['end_time'], border=1)
+        pdf.cell(40, 8, txt=f"{score}%", border=1, ln=1)
+
+    average = sum(scores) / len(scores) if scores else 0
+    pdf.ln(4)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(190, 8, txt=f"Average: {average:.1f}%", ln=1)
+
+    filename = f"{student['id']}_{_latin1(student['fullname']).replace(' ', '_')}.pdf"
+    return filename, pdf.output(dest='S').encode('latin-1')
+
+
+def write_slips_zip(students, path, progress=None, max_workers=None):
+    """Renders slips in worker processes and streams them into a zip file.
+
+    At most a few slips per worker are in flight at any time, so memory use
+    does not grow with the size of the class.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    window = max_workers * 4
+    done = 0
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as executor, \
+            zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        pending = deque()
+        for student in students:
+            pending.append(executor.submit(render_slip, student))
+            if len(pending) >= window:
+                filename, data = pending.popleft().result()
+                archive.writestr(filename, data)
+                done += 1
+                if progress:
+                    progress(done)
+        while pending:
+            filename, data = pending.popleft().result()
+            archive.writestr(filename, data)
+            done += 1
+            if progress:
+                progress(done)
+    return done
+
+
+JOB_TTL = 24 * 60 * 60
+
+
+def _job_key(job_id):
+    return f'slips-job:{job_id}'
+
+
+def _update_job(state, job_id, **fields):
+    # Only the thread running the job writes its record, so read-modify-write is safe.
+    job = json.loads(state.get(_job_key(job_id)))
+    job.update(fields)
+    state.set(_job_key(job_id), json.dumps(job), ttl=JOB_TTL)
+
+
+def _run_job(state, storage, job_id, class_name, teacher_id):
+    path = os.path.join(tempfile.gettempdir(), f'result_slips_{job_id}.zip')
+    try:
+        students = fetch_class_results(class_name, teacher_id)
+        _update_job(state, job_id, status='running', total=len(students))
+        write_slips_zip(students, path, progress=lambda done: _update_job(state, job_id, done=done))
+        with open(path, 'rb') as archive:
+            storage.save(f'slips/result_slips_{job_id}.zip', archive)
+        _update_job(state, job_id, status='finished')
+    except Exception as e:
+        print(f"Error generating result slips: {e}")
+        _update_job(state, job_id, status='failed', error=str(e))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def start_slips_job(state, storage, class_name, owner_id, teacher_id):
+    """Starts a background job building result slips for a class and returns its id.
+
+    The job runs on this node, but its record lives in the shared state and
+    its zip in the upload storage, so any node can report on it and serve it.
+    """
+    job_id = uuid.uuid4().hex
+    state.set(_job_key(job_id), json.dumps({
+        'id': job_id,
+        'class': class_name,
+        'owner_id': owner_id,
+        'status': 'queued',
+        'done': 0,
+        'total': None,
+        'file': f'slips/result_slips_{job_id}.zip',
+        'error': None,
+    }), ttl=JOB_TTL)
+    thread = threading.Thread(target=_run_job, args=(state, storage, job_id, class_name, teacher_id), daemon=True)
+    thread.start()
+    return job_id
+
+
+def get_job(state, job_id):
+    job = state.get(_job_key(job_id))
+    return json.loads(job) if job else None
@@ -0,0 +1,191 @@
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session whose data lives on the server; the cookie only carries its id."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # The user the stored session belonged to; see store_writes.
+        self.stored_user_id = self.get('_user_id')
+
+
+class SQLiteSessionStore:
+    """Stores session data in a local SQLite file, indexed by user for invalidation."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                sid TEXT PRIMARY KEY,
+                user_id TEXT,
+                data TEXT NOT NULL,
+                expires REAL NOT NULL
+            )
+        """)
+        self._connection().execute("CREATE INDEX IF NOT EXISTS sessions_user_id ON sessions (user_id)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, user_id, data, expires):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (sid, user_id, data, expires) VALUES (?, ?, ?, ?)",
+            (sid, user_id, data, expires)
+        )
+
+    def delete(self, sid):
+        self._connection().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def delete_user(self, user_id):
+        self._connection().execute("DELETE FROM sessions WHERE user_id = ?", (str(user_id),))
+
+    def purge_expired(self):
+        self._connection().execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+
+class SharedStateSessionStore:
+    """Stores session data in the shared state, so every app node sees the same sessions."""
+
+    def __init__(self, state):
+        self.state = state
+
+    def load(self, sid):
+        return self.state.get(f'session:{sid}')
+
+    def save(self, sid, user_id, data, expires):
+        ttl = expires - time.time()
+        self.state.set(f'session:{sid}', data, ttl=ttl)
+        if user_id is not None:
+            self.state.add_to_set(f'user-sessions:{user_id}', sid, ttl=ttl)
+
+    def delete(self, sid):
+        self.state.delete(f'session:{sid}')
+
+    def delete_user(self, user_id):
+        for sid in self.state.set_members(f'user-sessions:{user_id}'):
+            self.delete(sid)
+        self.state.delete(f'user-sessions:{user_id}')
+
+    def purge_expired(self):
+        # Entries expire on their own.
+        pass
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a store and puts a signed session id in the cookie.
+
+    Data is only written back when the session was modified, so the sliding
+    expiry refresh in before_request controls how often a request pays for a
+    write and a Set-Cookie header.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def session_id(self, app, request):
+        """Returns the session id signed into request's cookie, or None."""
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return None
+        try:
+            return self._signer(app).unsign(cookie).decode() or None
+        except BadSignature:
+            return None
+
+    def make_session(self, sid, data):
+        """Returns the session stored under sid as data, or a new one when nothing was stored."""
+        if data is not None:
+            return ServerSession(self.serializer.loads(data), sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def store_writes(self, app, session):
+        """Returns the store calls that save session, as (function, args) pairs.
+
+        A session that changes hands, at login, logout or a switch of
+        account, is saved under a new id and its old one deleted, so an id
+        planted in a browser before the login (session fixation) is useless
+        afterwards.
+        """
+        if not session:
+            if session.modified and not session.new:
+                return [(self.store.delete, (session.sid,))]
+            return []
+
+        if not self.should_set_cookie(app, session):
+            return []
+
+        writes = []
+        user_id = session.get('_user_id')
+        if not session.new and user_id != session.stored_user_id:
+            writes.append((self.store.delete, (session.sid,)))
+            session.sid = secrets.token_urlsafe(32)
+        expires = self.get_expiration_time(app, session)
+        stored_until = expires.timestamp() if expires else time.time() + app.permanent_session_lifetime.total_seconds()
+        writes.append((self.store.save, (session.sid, user_id, self.serializer.dumps(dict(session)), stored_until)))
+        return writes
+
+    def update_cookie(self, app, session, response):
+        """Sets the cookie for session after store_writes' calls have run, or deletes it for an emptied session."""
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            response.delete_cookie(name, domain=domain, path=path)
+            return
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def open_session(self, app, request):
+        sid = self.session_id(app, request)
+        return self.make_session(sid, self.store.load(sid) if sid else None)
+
+    def save_session(self, app, session, response):
+        writes = self.store_writes(app, session)
+        for function, args in writes:
+            function(*args)
+        if writes:
+            self.update_cookie(app, session, response)
+
+    def invalidate_user(self, user_id):
+        """Ends every session belonging to user_id."""
+        self.store.delete_user(user_id)
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+
+from ratelimit import MemoryBackend, take_tokens
+
+# State that every app node must agree on: cached values, rate limit
+# buckets, job records and broadcast messages. MemoryState keeps it in this
+# process, which is enough for a single node and for tests. RedisState keeps
+# it in Redis so several nodes behind a load balancer share it; for local
+# testing, a fakeredis TcpFakeServer can stand in for Redis.
+
+
+class MemoryState(MemoryBackend):
+    """Shared state kept in this process. Broadcasts are delivered synchronously."""
+
+    def __init__(self):
+        super().__init__()
+        self._values = {}
+        self._sets = {}
+        self._lock = threading.RLock()
+        self._handlers = {}
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._values.get(key, (None, None))
+            if expires is not None and expires <= time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+            self._sets.pop(key, None)
+
+    def add_to_set(self, key, member, ttl=None):
+        with self._lock:
+            members = self.set_members(key)
+            members.add(member)
+            self._sets[key] = (members, time.time() + ttl if ttl else None)
+
+    def set_members(self, key):
+        with self._lock:
+            members, expires = self._sets.get(key, ((), None))
+            if expires is not None and expires <= time.time():
+                del self._sets[key]
+                return set()
+            return set(members)
+
+    def publish(self, channel, message):
+        for handler in list(self._handlers.get(channel, ())):
+            handler(message)
+
+    def subscribe(self, channel, handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+
+class RedisState:
+    """Shared state kept in Redis. Broadcasts reach every subscribed process."""
+
+    def __init__(self, client):
+        self.client = client
+        self._listeners = []
+
+    def take(self, key, capacity, rate, cost, now):
+        """Token bucket take with the same semantics as ratelimit.MemoryBackend."""
+        import redis
+
+        key = f'ratelimit:{key}'
+        if not cost:
+            # A check only reads; a refilled bucket expires on its own.
+            return take_tokens(self._bucket(self.client, key), capacity, rate, cost, now)[0]
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    allowed, tokens = take_tokens(self._bucket(pipe, key), capacity, rate, cost, now)
+                    pipe.multi()
+                    if tokens >= capacity:
+                        pipe.delete(key)
+                    else:
+                        pipe.hset(key, mapping={'tokens': tokens, 'updated': now})
+                        # An untouched bucket refills completely by then.
+                        pipe.expire(key, int((capacity - tokens) / rate) + 1)
+                    pipe.execute()
+                    return allowed
+                except redis.WatchError:
+                    continue
+
+    @staticmethod
+    def _bucket(client, key):
+        bucket = client.hgetall(key)
+        return (float(bucket['tokens']), float(bucket['updated'])) if bucket else None
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=max(1, int(ttl)) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def add_to_set(self, key, member, ttl=None):
+        with self.client.pipeline() as pipe:
+            pipe.sadd(key, member)
+            if ttl:
+                pipe.expire(key, max(1, int(ttl)))
+            pipe.execute()
+
+    def set_members(self, key):
+        return self.client.smembers(key)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, json.dumps(message))
+
+    def subscribe(self, channel, handler):
+        # One connection and listener thread per channel; a node only subscribes to a few.
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: lambda message: handler(json.loads(message['data']))})
+        self._listeners.append(pubsub.run_in_thread(sleep_time=0.01, daemon=True))
+
+
+def create_state(url=None):
+    """Returns the shared state for a SHARED_STATE_URL; empty means in-process."""
+    if not url or url == 'memory://':
+        return MemoryState()
+    import redis
+    return RedisState(redis.Redis.from_url(url, decode_responses=True))
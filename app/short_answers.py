@@ -0,0 +1,109 @@
+import functools
+import re
+import unicodedata
+
+# Short-answer keys list the accepted answers separated by "|". Each one is:
+#   Paris             text, compared ignoring case, spacing and punctuation
+#                     at the end; signs and symbols inside count, so "x-1"
+#                     doesn't accept "x+1" and "C" doesn't accept "C++"
+#   photosynthesis ~2 text, accepted within 2 typing mistakes (edits)
+#   3.14 +- 0.01      a number, accepted within the tolerance (also ±);
+#                     a bare number must match exactly, so "3" accepts "3.0";
+#                     commas are only read as thousands separators ("1,000")
+#   /colou?r/         a regular expression the whole answer must match,
+#                     ignoring case
+# Keys are compiled once into a matcher and cached by their text, so an
+# edited key simply compiles a new one.
+CACHE_SIZE = 4096
+
+_ALTERNATIVE = re.compile(r'\s*(/(?:\\.|[^/\\])*/|[^|]*?)\s*(?:\||$)')
+_NUMBER = re.compile(r'^[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?$', re.IGNORECASE)
+_TOLERANCE = re.compile(r'^(?P<value>\S+)\s*(?:\+-|±)\s*(?P<tolerance>\S+)$')
+_FUZZY = re.compile(r'^(?P<text>.*\S)\s*~(?P<edits>\d+)$')
+_THOUSANDS = re.compile(r'^[-+]?\d{1,3}(?:,\d{3})+(?:\.\d*)?$')
+_TRAILING_PUNCTUATION = re.compile(r'[\s.,;:!?]+$')
+# Spacing around a symbol doesn't matter ("x = 5" is "x=5"); between words
+# it is folded to one space.
+_SYMBOL_SPACE = re.compile(r'\s*([^\w\s])\s*')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = _TRAILING_PUNCTUATION.sub('', text.strip())
+    return _SPACE.sub(' ', _SYMBOL_SPACE.sub(r'\1', text))
+
+
+def parse_number(text):
+    """Returns text as a float, allowing well-formed thousands separators, or None."""
+    text = text.strip()
+    if ',' in text:
+        if not _THOUSANDS.match(text):
+            return None
+        text = text.replace(',', '')
+    return float(text) if _NUMBER.match(text) else None
+
+
+def within_edits(a, b, limit):
+    """Whether the edit distance between a and b is at most limit."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def _compile_alternative(alternative):
+    if len(alternative) > 1 and alternative.startswith('/') and alternative.endswith('/'):
+        pattern = re.compile(alternative[1:-1], re.IGNORECASE)
+        return lambda answer, normalized, number: pattern.fullmatch(answer.strip()) is not None
+
+    tolerance = _TOLERANCE.match(alternative)
+    if tolerance and parse_number(tolerance['value']) is not None and parse_number(tolerance['tolerance']) is not None:
+        value, limit = parse_number(tolerance['value']), abs(parse_number(tolerance['tolerance']))
+        return lambda answer, normalized, number: number is not None and abs(number - value) <= limit
+
+    value = parse_number(alternative)
+    if value is not None:
+        return lambda answer, normalized, number: number == value
+
+    fuzzy = _FUZZY.match(alternative)
+    if fuzzy:
+        text, edits = normalize(fuzzy['text']), int(fuzzy['edits'])
+        return lambda answer, normalized, number: within_edits(normalized, text, edits)
+
+    text = normalize(alternative)
+    if not text:
+        # Nothing left after normalizing, such as "?": compare as written.
+        return lambda answer, normalized, number: answer.strip() == alternative
+    return lambda answer, normalized, number: normalized == text
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def compile_key(key):
+    """Compiles a short-answer key into a function of the student's answer.
+
+    Raises re.error for an invalid regular expression.
+    """
+    checks = [_compile_alternative(alternative) for alternative in _ALTERNATIVE.findall(key or '') if alternative]
+
+    def matches(answer):
+        if not answer:
+            return False
+        normalized, number = normalize(answer), parse_number(answer)
+        return any(check(answer, normalized, number) for check in checks)
+    return matches
+
+
+def is_correct(answer, key):
+    try:
+        return compile_key(key)(answer)
+    except re.error:
+        return False
+
@@ -0,0 +1,36 @@
+function toggleOptions() {
+    const type = document.getElementById('question_type').value;
+    const optionsContainer = document.getElementById('options-container');
+    const shortAnswerContainer = document.getElementById('short-answer-container');
+
+    if (type === 'short-answer') {
+        optionsContainer.style.display = 'none';
+        shortAnswerContainer.style.display = 'block';
+    } else {
+        optionsContainer.style.display = 'block';
+        shortAnswerContainer.style.display = 'none';
+    }
+}
+
+function addOption() {
+    const wrapper = document.getElementById('options-wrapper');
+    const optionCount = wrapper.children.length;
+    const questionType = document.getElementById('question_type').value;
+    const inputType = questionType === 'single-choice' ? 'radio' : 'checkbox';
+
+    const newOption = document.createElement('div');
+    newOption.className = 'form-group option-item';
+    newOption.innerHTML = `
+        <input type="text" name="option_${optionCount}" placeholder="Option text" required>
+        <label>
+            <input type="${inputType}" name="correct_option" value="${optionCount}"> Correct
+        </label>
+        <button type="button" class="btn-danger" onclick="this.parentElement.remove()">Remove</button>
+    `;
+    wrapper.appendChild(newOption);
+}
+
+// Initial call
+toggleOptions();
+addOption(); // Add one option by default
+addOption();
@@ -0,0 +1,20 @@
+// Add loading state to button on form submission
+document.querySelector('form').addEventListener('submit', function(e) {
+    const btn = this.querySelector('.btn');
+    btn.classList.add('loading');
+    btn.innerHTML = 'Logging in...';
+});
+
+// Add focus effects to form inputs
+const inputs = document.querySelectorAll('input[type="email"], input[type="password"]');
+inputs.forEach(input => {
+    input.addEventListener('focus', function() {
+        this.parentElement.classList.add('focused');
+    });
+
+    input.addEventListener('blur', function() {
+        if (this.value === '') {
+            this.parentElement.classList.remove('focused');
+        }
+    });
+});
@@ -0,0 +1,122 @@
+// Sends files chosen in inputs marked data-chunked-upload to the upload
+// sessions URL in data-upload-url, a chunk at a time. A failed chunk is retried from the bytes the server has,
+// and the session id is remembered in localStorage, so choosing the same file
+// again after a reload carries on where the upload stopped. Without fetch
+// the forms still post the file in one request.
+const CRC_TABLE = new Uint32Array(256).map((_, n) => {
+    let c = n;
+    for (let k = 0; k < 8; k++) c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+    return c;
+});
+
+function crc32(bytes) {
+    let crc = 0xFFFFFFFF;
+    for (let i = 0; i < bytes.length; i++) crc = CRC_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    return ((crc ^ 0xFFFFFFFF) >>> 0).toString(16);
+}
+
+async function sha256(file) {
+    // crypto.subtle is only available over HTTPS; the server then checks the chunks alone.
+    if (!window.crypto || !crypto.subtle) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+async function openSession(file, url, purpose, examId) {
+    const key = `upload:${purpose}:${examId || ''}:${file.name}:${file.size}:${file.lastModified}`;
+    const saved = localStorage.getItem(key);
+    if (saved) {
+        const response = await fetch(saved);
+        if (response.ok) {
+            const session = await response.json();
+            if (session.status === 'uploading') return [key, session];
+        }
+    }
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ purpose: purpose, exam_id: examId, filename: file.name, size: file.size, sha256: await sha256(file) })
+    });
+    const session = await response.json();
+    if (!response.ok) throw new Error(session.message);
+    localStorage.setItem(key, session.url);
+    return [key, session];
+}
+
+async function uploadInChunks(file, url, purpose, examId, onProgress) {
+    let [key, session] = await openSession(file, url, purpose, examId);
+    let failures = 0;
+    while (session.status === 'uploading') {
+        onProgress(session.received / session.size);
+        const chunk = new Uint8Array(await file.slice(session.received, session.received + session.chunk_size).arrayBuffer());
+        try {
+            const response = await fetch(session.url, {
+                method: 'PUT',
+                headers: { 'Upload-Offset': session.received, 'X-Chunk-CRC32': crc32(chunk), 'Content-Type': 'application/octet-stream' },
+                body: chunk
+            });
+            const reply = await response.json();
+            if (!response.ok && response.status !== 409) throw new Error(reply.message);
+            // 409: the chunk was refused; carry on from the bytes the server reports.
+            failures = response.status === 409 ? failures + 1 : 0;
+            if (failures > 8) throw new Error(reply.message);
+            session = reply;
+        } catch (error) {
+            // Wait, then ask the server how much arrived before resending.
+            if (++failures > 8) throw error;
+            await sleep(Math.min(30000, 1000 * 2 ** failures));
+            const response = await fetch(session.url).catch(() => null);
+            if (response && response.ok) session = await response.json();
+        }
+    }
+    onProgress(1);
+    while (session.status === 'processing') {
+        await sleep(1000);
+        session = await (await fetch(session.url)).json();
+    }
+    localStorage.removeItem(key);
+    if (session.status === 'failed') throw new Error(session.error);
+    return session;
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    if (!window.fetch) return;
+    document.querySelectorAll('input[type="file"][data-chunked-upload]').forEach(input => {
+        const form = input.form;
+        const status = document.createElement('span');
+        status.className = 'upload-status';
+        input.after(status);
+        form.addEventListener('submit', async function(e) {
+            const file = input.files[0];
+            if (!file || input.disabled) return;
+            e.preventDefault();
+            const buttons = form.querySelectorAll('button[type="submit"]');
+            buttons.forEach(button => button.disabled = true);
+            try {
+                const examId = input.dataset.examId ? parseInt(input.dataset.examId, 10) : null;
+                const session = await uploadInChunks(file, input.dataset.uploadUrl, input.dataset.chunkedUpload, examId, fraction => {
+                    status.textContent = fraction < 1 ? `Uploading ${Math.floor(fraction * 100)}%` : 'Processing...';
+                });
+                if (input.dataset.chunkedUpload === 'questions') {
+                    status.textContent = `${session.result.questions} question(s) uploaded.`;
+                    window.location.reload();
+                } else {
+                    // The form goes on without the file, naming the finished upload instead.
+                    const field = document.createElement('input');
+                    field.type = 'hidden';
+                    field.name = input.name + '_upload';
+                    field.value = session.id;
+                    form.appendChild(field);
+                    input.disabled = true;
+                    // requestSubmit lets the editors copy their text into the form first.
+                    form.requestSubmit ? form.requestSubmit() : form.submit();
+                }
+            } catch (error) {
+                status.textContent = `Upload failed: ${error.message}`;
+                buttons.forEach(button => button.disabled = false);
+            }
+        });
+    });
+});
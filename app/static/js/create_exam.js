@@ -0,0 +1,52 @@
+// Add form validation and enhancements
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.querySelector('form');
+    const startTime = document.getElementById('start_time');
+    const endTime = document.getElementById('end_time');
+
+    // Validate end time is after start time
+    if (startTime && endTime) {
+        startTime.addEventListener('change', validateTimes);
+        endTime.addEventListener('change', validateTimes);
+    }
+
+    function validateTimes() {
+        if (startTime.value && endTime.value) {
+            const start = new Date(startTime.value);
+            const end = new Date(endTime.value);
+
+            if (end <= start) {
+                endTime.setCustomValidity('End time must be after start time');
+                endTime.style.borderColor = 'var(--error)';
+            } else {
+                endTime.setCustomValidity('');
+                endTime.style.borderColor = '';
+            }
+        }
+    }
+
+    // Add loading state to form submission
+    form.addEventListener('submit', function(e) {
+        const btn = this.querySelector('.btn');
+        btn.classList.add('loading');
+        btn.innerHTML = 'Creating Exam...';
+
+        // Re-enable after 3 seconds if still on page (for demo)
+        setTimeout(() => {
+            btn.classList.remove('loading');
+            btn.innerHTML = 'Create Exam';
+        }, 3000);
+    });
+
+    // Add focus effects
+    const inputs = document.querySelectorAll('input, textarea');
+    inputs.forEach(input => {
+        input.addEventListener('focus', function() {
+            this.parentElement.classList.add('focused');
+        });
+
+        input.addEventListener('blur', function() {
+            this.parentElement.classList.remove('focused');
+        });
+    });
+});
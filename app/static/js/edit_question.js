@@ -0,0 +1,50 @@
+ClassicEditor
+    .create( document.querySelector( '#question_text' ) )
+    .catch( error => {
+        console.error( error );
+    } );
+
+// Add visual feedback for correct options
+document.addEventListener('DOMContentLoaded', function() {
+    const optionItems = document.querySelectorAll('.option-item');
+
+    optionItems.forEach(item => {
+        const radio = item.querySelector('input[type="radio"]');
+        const checkbox = item.querySelector('input[type="checkbox"]');
+
+        if (radio && radio.checked) {
+            item.classList.add('correct-option');
+        }
+
+        if (checkbox && checkbox.checked) {
+            item.classList.add('correct-option');
+        }
+
+        // Update styling when selection changes
+        if (radio) {
+            radio.addEventListener('change', function() {
+                optionItems.forEach(i => i.classList.remove('correct-option'));
+                if (this.checked) {
+                    item.classList.add('correct-option');
+                }
+            });
+        }
+
+        if (checkbox) {
+            checkbox.addEventListener('change', function() {
+                if (this.checked) {
+                    item.classList.add('correct-option');
+                } else {
+                    item.classList.remove('correct-option');
+                }
+            });
+        }
+    });
+
+    // Add loading state to form submission
+    document.querySelector('form').addEventListener('submit', function(e) {
+        const btn = this.querySelector('.btn');
+        btn.classList.add('loading');
+        btn.innerHTML = 'Updating Question...';
+    });
+});
@@ -0,0 +1,35 @@
+// Add real-time role badge preview
+document.addEventListener('DOMContentLoaded', function() {
+    const roleSelect = document.getElementById('role');
+    const rolePreview = document.querySelector('.role-preview .role-badge');
+
+    if (roleSelect && rolePreview) {
+        roleSelect.addEventListener('change', function() {
+            const newRole = this.value;
+            const roleText = newRole.charAt(0).toUpperCase() + newRole.slice(1);
+
+            // Update badge class and text
+            rolePreview.className = 'role-badge role-' + newRole;
+            rolePreview.textContent = roleText;
+        });
+    }
+
+    // Add loading state to form submission
+    document.querySelector('form').addEventListener('submit', function(e) {
+        const btn = this.querySelector('.btn');
+        btn.classList.add('loading');
+        btn.innerHTML = 'Updating User...';
+    });
+
+    // Add focus effects
+    const inputs = document.querySelectorAll('input, select');
+    inputs.forEach(input => {
+        input.addEventListener('focus', function() {
+            this.parentElement.classList.add('focused');
+        });
+
+        input.addEventListener('blur', function() {
+            this.parentElement.classList.remove('focused');
+        });
+    });
+});
@@ -0,0 +1,47 @@
+// Add loading state to form submission
+document.querySelector('form').addEventListener('submit', function(e) {
+    const btn = this.querySelector('.btn');
+    const email = this.querySelector('#email');
+
+    // Basic email validation
+    if (!email.value.match(/^[^\s@]+@[^\s@]+\.[^\s@]+$/)) {
+        e.preventDefault();
+        email.style.borderColor = 'var(--error)';
+        email.parentElement.classList.add('shake');
+        setTimeout(() => {
+            email.parentElement.classList.remove('shake');
+        }, 500);
+        return;
+    }
+
+    btn.classList.add('loading');
+    btn.innerHTML = 'Sending Reset Link...';
+});
+
+// Add focus effects
+const emailInput = document.getElementById('email');
+if (emailInput) {
+    emailInput.addEventListener('focus', function() {
+        this.parentElement.classList.add('focused');
+    });
+
+    emailInput.addEventListener('blur', function() {
+        if (this.value === '') {
+            this.parentElement.classList.remove('focused');
+        }
+
+        // Validate email on blur
+        if (this.value && !this.value.match(/^[^\s@]+@[^\s@]+\.[^\s@]+$/)) {
+            this.style.borderColor = 'var(--error)';
+        } else {
+            this.style.borderColor = '';
+        }
+    });
+}
+
+// Remove error styling when user starts typing
+emailInput.addEventListener('input', function() {
+    if (this.style.borderColor === 'var(--error)') {
+        this.style.borderColor = '';
+    }
+});
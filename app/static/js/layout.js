@@ -0,0 +1,21 @@
+// --- THEME TOGGLE LOGIC ---
+const themeToggle = document.getElementById('theme-toggle');
+
+// Set the toggle to the correct state on page load
+if (localStorage.getItem('theme') === 'dark') {
+    themeToggle.checked = true;
+    document.body.classList.add('dark-mode');
+} else {
+    document.body.classList.remove('dark-mode');
+}
+
+// Listen for toggle clicks
+themeToggle.addEventListener('change', function() {
+    if (this.checked) {
+        document.body.classList.add('dark-mode');
+        localStorage.setItem('theme', 'dark');
+    } else {
+        document.body.classList.remove('dark-mode');
+        localStorage.setItem('theme', 'light');
+    }
+});
@@ -0,0 +1,100 @@
+// Add confirmation for delete actions
+document.addEventListener('DOMContentLoaded', function() {
+    const deleteLinks = document.querySelectorAll('.actions a:last-child');
+
+    deleteLinks.forEach(link => {
+        link.addEventListener('click', function(e) {
+            if (!confirm('Are you sure you want to delete this question? This action cannot be undone.')) {
+                e.preventDefault();
+            }
+        });
+    });
+
+    // Add file input validation
+    const fileInput = document.querySelector('input[type="file"]');
+    if (fileInput) {
+        fileInput.addEventListener('change', function() {
+            const file = this.files[0];
+            if (file) {
+                const validTypes = ['.csv', '.xlsx'];
+                const fileName = file.name.toLowerCase();
+                const isValid = validTypes.some(type => fileName.endsWith(type));
+
+                if (!isValid) {
+                    alert('Please select a valid file type (.csv or .xlsx)');
+                    this.value = '';
+                }
+            }
+        });
+    }
+});
+
+// Question bank search: results come a page at a time from the search
+// endpoint, and the ticked questions are added to this exam.
+document.addEventListener('DOMContentLoaded', function() {
+    const searchForm = document.getElementById('bank-search');
+    const results = document.getElementById('bank-results');
+    const status = document.getElementById('bank-search-status');
+    if (!searchForm || !results) return;
+
+    const tbody = results.querySelector('tbody');
+    const previous = results.querySelector('[data-page="-1"]');
+    const next = results.querySelector('[data-page="1"]');
+    let page = 1;
+
+    function cell(text) {
+        const td = document.createElement('td');
+        td.textContent = text || '';
+        return td;
+    }
+
+    function search() {
+        const params = new URLSearchParams(new FormData(searchForm));
+        params.set('page', page);
+        status.textContent = 'Searching...';
+        fetch(searchForm.dataset.url + '?' + params.toString(), { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    status.textContent = data.message;
+                    results.hidden = true;
+                    return;
+                }
+                tbody.innerHTML = '';
+                data.questions.forEach(question => {
+                    const row = document.createElement('tr');
+                    const pick = document.createElement('td');
+                    const checkbox = document.createElement('input');
+                    checkbox.type = 'checkbox';
+                    checkbox.name = 'question_id';
+                    checkbox.value = question.id;
+                    pick.appendChild(checkbox);
+                    row.appendChild(pick);
+                    row.appendChild(cell(question.question_text));
+                    row.appendChild(cell(question.question_type));
+                    row.appendChild(cell(question.topic ? question.topic + (question.difficulty ? ' (' + question.difficulty + ')' : '') : ''));
+                    tbody.appendChild(row);
+                });
+                status.textContent = data.questions.length ? 'Page ' + data.page : 'No questions found.';
+                previous.disabled = data.page <= 1;
+                next.disabled = !data.has_more;
+                results.hidden = data.questions.length === 0;
+            })
+            .catch(() => {
+                status.textContent = 'Search failed. Please try again.';
+            });
+    }
+
+    searchForm.addEventListener('submit', function(e) {
+        e.preventDefault();
+        page = 1;
+        search();
+    });
+
+    [previous, next].forEach(button => {
+        button.addEventListener('click', function() {
+            page += parseInt(this.dataset.page, 10);
+            search();
+        });
+    });
+});
@@ -0,0 +1,48 @@
+// Add enhanced confirmation for actions
+document.addEventListener('DOMContentLoaded', function() {
+    const deleteLinks = document.querySelectorAll('.actions a:nth-child(2)');
+    const resetLinks = document.querySelectorAll('.actions a:nth-child(3)');
+
+    deleteLinks.forEach(link => {
+        link.addEventListener('click', function(e) {
+            if (!confirm('Are you sure you want to delete this user? This action cannot be undone and will remove all associated data.')) {
+                e.preventDefault();
+            }
+        });
+    });
+
+    resetLinks.forEach(link => {
+        link.addEventListener('click', function(e) {
+            if (!confirm('This will send a password reset email to the user. Continue?')) {
+                e.preventDefault();
+            }
+        });
+    });
+
+    // Add file input validation
+    const fileInput = document.querySelector('input[type="file"]');
+    if (fileInput) {
+        fileInput.addEventListener('change', function() {
+            const file = this.files[0];
+            if (file) {
+                const fileName = file.name.toLowerCase();
+                if (!fileName.endsWith('.xlsx')) {
+                    alert('Please select a valid Excel file (.xlsx)');
+                    this.value = '';
+                }
+            }
+        });
+    }
+
+    // Add loading states
+    const forms = document.querySelectorAll('form');
+    forms.forEach(form => {
+        form.addEventListener('submit', function() {
+            const btn = this.querySelector('.btn');
+            if (btn) {
+                btn.classList.add('loading');
+                btn.innerHTML = 'Processing...';
+            }
+        });
+    });
+});
@@ -0,0 +1,62 @@
+// Add loading state to form submission
+document.querySelector('form').addEventListener('submit', function(e) {
+    const btn = this.querySelector('.btn');
+    btn.classList.add('loading');
+    btn.innerHTML = 'Updating Profile...';
+});
+
+// Add file preview functionality
+const fileInput = document.getElementById('profile_image');
+const profileAvatar = document.querySelector('.profile-avatar');
+
+if (fileInput) {
+    fileInput.addEventListener('change', function() {
+        const file = this.files[0];
+        if (file) {
+            // Validate file type
+            const validTypes = ['image/jpeg', 'image/png', 'image/gif'];
+            if (!validTypes.includes(file.type)) {
+                alert('Please select a valid image file (JPG, PNG, or GIF)');
+                this.value = '';
+                return;
+            }
+
+            // Validate file size (5MB)
+            if (file.size > 5 * 1024 * 1024) {
+                alert('File size must be less than 5MB');
+                this.value = '';
+                return;
+            }
+
+            // Preview image
+            const reader = new FileReader();
+            reader.onload = function(e) {
+                profileAvatar.innerHTML = `<img src="${e.target.result}" alt="Profile Preview">`;
+            };
+            reader.readAsDataURL(file);
+        }
+    });
+}
+
+// Add focus effects
+const inputs = document.querySelectorAll('input[type="text"], input[type="email"]');
+inputs.forEach(input => {
+    input.addEventListener('focus', function() {
+        this.parentElement.classList.add('focused');
+    });
+
+    input.addEventListener('blur', function() {
+        this.parentElement.classList.remove('focused');
+    });
+});
+
+// Add real-time avatar update based on name changes
+const nameInput = document.getElementById('fullname');
+if (nameInput) {
+    nameInput.addEventListener('input', function() {
+        if (!fileInput.files[0] && !document.querySelector('.profile-avatar img')) {
+            const initial = this.value.charAt(0).toUpperCase();
+            profileAvatar.textContent = initial;
+        }
+    });
+}
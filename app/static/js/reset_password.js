@@ -0,0 +1,134 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const passwordInput = document.getElementById('password');
+    const confirmInput = document.getElementById('confirm_password');
+    const strengthBar = document.getElementById('strengthBar');
+    const strengthText = document.getElementById('strengthText');
+    const passwordMatch = document.getElementById('passwordMatch');
+    const submitBtn = document.getElementById('submitBtn');
+    const resetForm = document.getElementById('resetForm');
+
+    // Password strength requirements
+    const requirements = {
+        length: document.getElementById('req-length'),
+        uppercase: document.getElementById('req-uppercase'),
+        lowercase: document.getElementById('req-lowercase'),
+        number: document.getElementById('req-number'),
+        special: document.getElementById('req-special')
+    };
+
+    function checkPasswordStrength(password) {
+        let strength = 0;
+        let metRequirements = 0;
+
+        // Length requirement
+        if (password.length >= 8) {
+            strength += 20;
+            metRequirements++;
+            requirements.length.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.length.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Uppercase requirement
+        if (/[A-Z]/.test(password)) {
+            strength += 20;
+            metRequirements++;
+            requirements.uppercase.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.uppercase.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Lowercase requirement
+        if (/[a-z]/.test(password)) {
+            strength += 20;
+            metRequirements++;
+            requirements.lowercase.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.lowercase.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Number requirement
+        if (/[0-9]/.test(password)) {
+            strength += 20;
+            metRequirements++;
+            requirements.number.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.number.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Special character requirement
+        if (/[^A-Za-z0-9]/.test(password)) {
+            strength += 20;
+            metRequirements++;
+            requirements.special.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.special.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Update strength bar and text
+        strengthBar.className = 'strength-bar';
+        if (password.length === 0) {
+            strengthText.textContent = 'Password strength';
+            strengthText.className = 'strength-text';
+        } else if (strength <= 40) {
+            strengthBar.classList.add('strength-weak');
+            strengthText.textContent = 'Weak password';
+            strengthText.className = 'strength-text strength-weak-text';
+        } else if (strength <= 80) {
+            strengthBar.classList.add('strength-medium');
+            strengthText.textContent = 'Medium strength';
+            strengthText.className = 'strength-text strength-medium-text';
+        } else {
+            strengthBar.classList.add('strength-strong');
+            strengthText.textContent = 'Strong password';
+            strengthText.className = 'strength-text strength-strong-text';
+        }
+
+        return metRequirements === 5;
+    }
+
+    function checkPasswordMatch() {
+        const password = passwordInput.value;
+        const confirm = confirmInput.value;
+
+        if (confirm.length === 0) {
+            passwordMatch.className = 'password-match';
+            passwordMatch.querySelector('.match-text').textContent = 'Passwords must match';
+        } else if (password === confirm) {
+            passwordMatch.className = 'password-match match-valid';
+            passwordMatch.querySelector('.match-text').textContent = 'Passwords match';
+        } else {
+            passwordMatch.className = 'password-match match-invalid';
+            passwordMatch.querySelector('.match-text').textContent = 'Passwords do not match';
+        }
+
+        return password === confirm;
+    }
+
+    function validateForm() {
+        const isStrong = checkPasswordStrength(passwordInput.value);
+        const isMatching = checkPasswordMatch();
+        submitBtn.disabled = !(isStrong && isMatching);
+    }
+
+    // Event listeners
+    passwordInput.addEventListener('input', validateForm);
+    confirmInput.addEventListener('input', validateForm);
+
+    // Form submission
+    resetForm.addEventListener('submit', function(e) {
+        if (!validateForm()) {
+            e.preventDefault();
+            resetForm.classList.add('shake');
+            setTimeout(() => resetForm.classList.remove('shake'), 500);
+            return;
+        }
+
+        const btn = this.querySelector('.btn');
+        btn.classList.add('loading');
+        btn.innerHTML = 'Resetting Password...';
+    });
+
+    // Initial validation
+    validateForm();
+});
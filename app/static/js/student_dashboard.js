@@ -0,0 +1,34 @@
+// Add confirmation for starting exams
+document.addEventListener('DOMContentLoaded', function() {
+    const startButtons = document.querySelectorAll('.btn');
+
+    startButtons.forEach(btn => {
+        if (btn.textContent.includes('Start Exam')) {
+            btn.addEventListener('click', function(e) {
+                const row = this.closest('tr');
+                const examTitle = row.cells[0].textContent;
+                const duration = row.cells[2].textContent;
+
+                if (!confirm(`Are you ready to start "${examTitle}"? You will have ${duration} to complete it. Once started, the timer cannot be paused.`)) {
+                    e.preventDefault();
+                }
+            });
+        }
+    });
+
+    // Add visual feedback for score ranges
+    const scoreCells = document.querySelectorAll('td:nth-child(3)');
+    scoreCells.forEach(cell => {
+        const scoreText = cell.textContent.trim();
+        if (scoreText.includes('%')) {
+            const score = parseInt(scoreText);
+            if (score >= 80) {
+                cell.classList.add('score-excellent');
+            } else if (score >= 60) {
+                cell.classList.add('score-good');
+            } else if (score < 60 && score > 0) {
+                cell.classList.add('score-poor');
+            }
+        }
+    });
+});
@@ -0,0 +1,66 @@
+// Add loading state to form submission
+document.getElementById('loginForm').addEventListener('submit', function(e) {
+    const btn = this.querySelector('.btn');
+    const email = document.getElementById('email');
+    const password = document.getElementById('password');
+
+    // Basic validation
+    if (!email.value || !password.value) {
+        e.preventDefault();
+        if (!email.value) {
+            email.classList.add('error');
+            email.parentElement.classList.add('shake');
+        }
+        if (!password.value) {
+            password.classList.add('error');
+            password.parentElement.classList.add('shake');
+        }
+        setTimeout(() => {
+            email.parentElement.classList.remove('shake');
+            password.parentElement.classList.remove('shake');
+        }, 500);
+        return;
+    }
+
+    btn.classList.add('loading');
+    btn.innerHTML = 'Logging in...';
+});
+
+// Add focus effects and remove error styling
+const inputs = document.querySelectorAll('input[type="email"], input[type="password"]');
+inputs.forEach(input => {
+    input.addEventListener('focus', function() {
+        this.parentElement.classList.add('focused');
+        this.classList.remove('error');
+    });
+
+    input.addEventListener('blur', function() {
+        if (this.value === '') {
+            this.parentElement.classList.remove('focused');
+        }
+    });
+
+    // Remove error styling when user starts typing
+    input.addEventListener('input', function() {
+        if (this.classList.contains('error')) {
+            this.classList.remove('error');
+        }
+    });
+});
+
+// Add Google login loading state
+const googleBtn = document.querySelector('.btn-google');
+if (googleBtn) {
+    googleBtn.addEventListener('click', function() {
+        this.classList.add('loading');
+        this.innerHTML = 'Redirecting to Google...';
+    });
+}
+
+// Auto-focus on email field
+document.addEventListener('DOMContentLoaded', function() {
+    const emailField = document.getElementById('email');
+    if (emailField) {
+        emailField.focus();
+    }
+});
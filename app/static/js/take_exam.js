@@ -0,0 +1,279 @@
+const questions = document.querySelectorAll('.question');
+const navButtons = document.querySelectorAll('.nav-button');
+let currentQuestion = 0;
+let timeLeft = remainingSeconds;
+let tabSwitchCount = 0;
+let answeredQuestions = new Set();
+
+// Answers are queued in localStorage and synced in batches, so a
+// network blip never loses a save. Only the latest answer per question
+// is kept; seq only ever grows, which lets the server ignore replays.
+const queueKey = `cbt-answer-queue-${submissionId}`;
+let answerQueue = JSON.parse(localStorage.getItem(queueKey) || '{"lastSeq": 0, "pending": {}}');
+let syncInFlight = false;
+let syncTimer = null;
+let syncRetryDelay = 1000;
+
+function persistQueue() {
+    localStorage.setItem(queueKey, JSON.stringify(answerQueue));
+}
+
+function pendingAnswers() {
+    return Object.entries(answerQueue.pending).map(([questionId, entry]) => ({
+        question_id: Number(questionId),
+        answer_text: entry.answer_text,
+        seq: entry.seq
+    }));
+}
+
+function queueAnswer(questionId, answerText) {
+    answerQueue.lastSeq = Math.max(Date.now(), answerQueue.lastSeq + 1);
+    answerQueue.pending[questionId] = { answer_text: answerText, seq: answerQueue.lastSeq };
+    persistQueue();
+    scheduleSync(300);
+}
+
+function scheduleSync(delay) {
+    clearTimeout(syncTimer);
+    syncTimer = setTimeout(syncAnswers, delay);
+}
+
+async function syncAnswers() {
+    const batch = pendingAnswers();
+    if (syncInFlight || batch.length === 0) return true;
+    syncInFlight = true;
+    const startedAt = performance.now();
+    try {
+        const response = await fetch(`/student/exam/sync_answers`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ submission_id: submissionId, answers: batch }),
+            keepalive: true
+        });
+        if (!response.ok) throw new Error(`Sync failed with status ${response.status}`);
+        recordTiming('save', performance.now() - startedAt);
+        // Drop what was acknowledged, unless it changed again meanwhile.
+        batch.forEach(answer => {
+            const entry = answerQueue.pending[answer.question_id];
+            if (entry && entry.seq <= answer.seq) delete answerQueue.pending[answer.question_id];
+        });
+        persistQueue();
+        syncRetryDelay = 1000;
+        if (pendingAnswers().length > 0) scheduleSync(0);
+        return true;
+    } catch (error) {
+        recordTiming('save_failed', performance.now() - startedAt);
+        scheduleSync(syncRetryDelay);
+        syncRetryDelay = Math.min(syncRetryDelay * 2, 30000);
+        return false;
+    } finally {
+        syncInFlight = false;
+    }
+}
+
+// Sync as soon as the connection comes back, in one request.
+window.addEventListener('online', () => scheduleSync(0));
+
+// Page load and answer sync timings go to the server in small beacons,
+// sent every 30 seconds, once 20 are waiting, and when the page is left.
+const telemetryEvents = [];
+
+function sendTelemetry() {
+    if (telemetryEvents.length === 0 || !navigator.sendBeacon) return;
+    const events = telemetryEvents.splice(0, telemetryEvents.length);
+    navigator.sendBeacon(telemetryUrl, JSON.stringify({ exam_id: examId, events: events }));
+}
+
+function recordTiming(type, ms) {
+    telemetryEvents.push({ type: type, ms: Math.round(ms) });
+    if (telemetryEvents.length >= 20) sendTelemetry();
+}
+
+window.addEventListener('load', () => {
+    // loadEventEnd is only set once the load handlers have returned.
+    setTimeout(() => {
+        const navigation = performance.getEntriesByType('navigation')[0];
+        if (navigation && navigation.loadEventEnd > 0) recordTiming('navigation', navigation.loadEventEnd - navigation.startTime);
+    }, 0);
+});
+setInterval(sendTelemetry, 30000);
+window.addEventListener('pagehide', sendTelemetry);
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') sendTelemetry();
+});
+
+function showQuestion(index) {
+    if (index < 0 || index >= questions.length) return;
+
+    questions[currentQuestion].classList.remove('active');
+    navButtons[currentQuestion].classList.remove('current');
+
+    currentQuestion = index;
+
+    questions[currentQuestion].classList.add('active');
+    navButtons[currentQuestion].classList.add('current');
+
+    document.getElementById('prev-btn').disabled = currentQuestion === 0;
+    document.getElementById('next-btn').disabled = currentQuestion === questions.length - 1;
+
+    updateProgress();
+}
+
+function updateProgress() {
+    const progress = ((answeredQuestions.size / questions.length) * 100).toFixed(1);
+    document.getElementById('progressFill').style.width = `${progress}%`;
+}
+
+async function saveAnswer(questionId, answerValue, questionType) {
+    let answer = answerValue;
+
+    // Update UI for selected options
+    if (questionType === 'single-choice') {
+        const labels = document.querySelectorAll(`input[name="answer_${questionId}"]`);
+        labels.forEach(label => {
+            label.closest('label').classList.remove('selected');
+        });
+        event.target.closest('label').classList.add('selected');
+    } else if (questionType === 'multiple-choice') {
+        const checked = document.querySelectorAll(`input[name="answer_${questionId}"]:checked`);
+        answer = Array.from(checked).map(c => c.value).join(',');
+
+        // Update label styles for checked options
+        const labels = document.querySelectorAll(`input[name="answer_${questionId}"]`);
+        labels.forEach(label => {
+            if (label.checked) {
+                label.closest('label').classList.add('selected');
+            } else {
+                label.closest('label').classList.remove('selected');
+            }
+        });
+    }
+
+    // Mark as answered
+    answeredQuestions.add(questionId);
+    navButtons[currentQuestion].classList.add('answered');
+    updateProgress();
+
+    // Queue for the server
+    queueAnswer(questionId, answer);
+}
+
+function restoreAnswer(questionId, answerText) {
+    const inputs = document.querySelectorAll(`[name="answer_${questionId}"]`);
+    const values = String(answerText).split(',');
+    inputs.forEach(input => {
+        if (input.tagName === 'TEXTAREA') {
+            input.value = answerText;
+        } else {
+            input.checked = values.includes(input.value);
+            input.closest('label').classList.toggle('selected', input.checked);
+        }
+    });
+    if (inputs.length > 0) {
+        answeredQuestions.add(Number(questionId));
+        const index = Array.from(questions).indexOf(inputs[0].closest('.question'));
+        if (index >= 0) navButtons[index].classList.add('answered');
+    }
+}
+
+// Answers the server already has, then any newer ones still queued here.
+function restoreAnswers() {
+    Object.entries(savedAnswers).forEach(([questionId, answerText]) => restoreAnswer(questionId, answerText));
+    Object.entries(answerQueue.pending).forEach(([questionId, entry]) => restoreAnswer(questionId, entry.answer_text));
+    updateProgress();
+}
+
+async function submitExam() {
+    if (confirm('Are you sure you want to submit the exam? You cannot return to the exam after submission.')) {
+        forceSubmitExam();
+    }
+}
+
+async function forceSubmitExam() {
+    // Anything still queued travels with the submission.
+    clearTimeout(syncTimer);
+    let response = null;
+    try {
+        response = await fetch(`/student/exam/submit`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ submission_id: submissionId, answers: pendingAnswers() })
+        });
+    } catch (error) {
+        response = null;
+    }
+    if (response && response.ok) {
+        localStorage.removeItem(queueKey);
+        window.location.href = dashboardUrl;
+    } else {
+        showWarning('Submission failed', 'Your answers are saved on this device. Please check your connection and submit again.');
+    }
+}
+
+function updateTimer() {
+    const minutes = Math.floor(timeLeft / 60);
+    let seconds = timeLeft % 60;
+    seconds = seconds < 10 ? '0' + seconds : seconds;
+
+    const timer = document.getElementById('timer');
+    timer.textContent = `Time Left: ${minutes}:${seconds}`;
+
+    // Update timer styling based on remaining time
+    if (timeLeft <= 300) { // 5 minutes
+        timer.classList.add('critical');
+        timer.classList.remove('warning');
+    } else if (timeLeft <= 600) { // 10 minutes
+        timer.classList.add('warning');
+        timer.classList.remove('critical');
+    } else {
+        timer.classList.remove('warning', 'critical');
+    }
+
+    if (timeLeft > 0) {
+        timeLeft--;
+    } else {
+        clearInterval(timerInterval);
+        showWarning('Time is up!', 'Your exam will be submitted automatically.');
+        setTimeout(submitExam, 3000);
+    }
+}
+
+function showWarning(title, message) {
+    document.getElementById('warningTitle').textContent = title;
+    document.getElementById('warningMessage').textContent = message;
+    document.getElementById('warningModal').classList.add('active');
+}
+
+function closeWarning() {
+    document.getElementById('warningModal').classList.remove('active');
+}
+
+// Tab switching detection
+document.addEventListener('visibilitychange', function () {
+    if (document.hidden) {
+        tabSwitchCount++;
+        if (tabSwitchCount === 1) {
+            showWarning('Warning 1', 'You have switched tabs. The exam will be submitted after two more attempts.');
+        } else if (tabSwitchCount === 2) {
+            showWarning('Final Warning', 'This is your final warning. If you switch tabs again, the exam will be submitted automatically.');
+        } else if (tabSwitchCount >= 3) {
+            showWarning('Exam Submitted', 'You have switched tabs three times. The exam has been submitted.');
+            setTimeout(forceSubmitExam, 2000);
+        }
+    }
+});
+
+// Prevent context menu and keyboard shortcuts
+document.addEventListener('contextmenu', e => e.preventDefault());
+document.addEventListener('keydown', e => {
+    if (e.ctrlKey || e.metaKey) {
+        e.preventDefault();
+    }
+});
+
+// Initialize
+showQuestion(0);
+restoreAnswers();
+syncAnswers();
+const timerInterval = setInterval(updateTimer, 1000);
+updateTimer(); // Initial call
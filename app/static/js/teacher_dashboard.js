@@ -0,0 +1,47 @@
+// Add enhanced confirmation for delete actions
+document.addEventListener('DOMContentLoaded', function() {
+    const deleteLinks = document.querySelectorAll('.delete-link');
+
+    deleteLinks.forEach(link => {
+        link.addEventListener('click', function(e) {
+            const row = this.closest('tr');
+            const examTitle = row.cells[0].textContent;
+
+            if (!confirm(`Are you sure you want to delete "${examTitle}"? This will permanently remove the exam and all associated data.`)) {
+                e.preventDefault();
+            }
+        });
+    });
+
+    // Add visual feedback for exam status
+    const statusCells = document.querySelectorAll('td:nth-child(4)');
+    statusCells.forEach(cell => {
+        if (cell.textContent.includes('Active')) {
+            cell.style.fontWeight = '600';
+        }
+    });
+
+    // Add loading state for action buttons
+    const actionButtons = document.querySelectorAll('.action-btn');
+    actionButtons.forEach(btn => {
+        btn.addEventListener('click', function() {
+            if (!this.href.includes('javascript')) {
+                this.classList.add('loading');
+                const originalText = this.innerHTML;
+                this.innerHTML = 'Loading...';
+
+                // Reset after 3 seconds if still on page
+                setTimeout(() => {
+                    this.classList.remove('loading');
+                    this.innerHTML = originalText;
+                }, 3000);
+            }
+        });
+    });
+
+    // Add activity item animations
+    const activityItems = document.querySelectorAll('.activity-item');
+    activityItems.forEach((item, index) => {
+        item.style.animationDelay = `${index * 0.1}s`;
+    });
+});
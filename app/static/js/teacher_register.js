@@ -0,0 +1,132 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const passwordInput = document.getElementById('password');
+    const strengthBar = document.getElementById('strengthBar');
+    const strengthText = document.getElementById('strengthText');
+    const submitBtn = document.getElementById('submitBtn');
+    const registerForm = document.getElementById('registerForm');
+
+    // Password strength requirements
+    const requirements = {
+        length: document.getElementById('req-length'),
+        uppercase: document.getElementById('req-uppercase'),
+        lowercase: document.getElementById('req-lowercase'),
+        number: document.getElementById('req-number')
+    };
+
+    function checkPasswordStrength(password) {
+        let strength = 0;
+        let metRequirements = 0;
+
+        // Length requirement
+        if (password.length >= 8) {
+            strength += 25;
+            metRequirements++;
+            requirements.length.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.length.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Uppercase requirement
+        if (/[A-Z]/.test(password)) {
+            strength += 25;
+            metRequirements++;
+            requirements.uppercase.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.uppercase.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Lowercase requirement
+        if (/[a-z]/.test(password)) {
+            strength += 25;
+            metRequirements++;
+            requirements.lowercase.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.lowercase.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Number requirement
+        if (/[0-9]/.test(password)) {
+            strength += 25;
+            metRequirements++;
+            requirements.number.classList.replace('requirement-unmet', 'requirement-met');
+        } else {
+            requirements.number.classList.replace('requirement-met', 'requirement-unmet');
+        }
+
+        // Update strength bar and text
+        strengthBar.className = 'strength-bar';
+        if (password.length === 0) {
+            strengthText.textContent = 'Password strength';
+            strengthText.className = 'strength-text';
+        } else if (strength <= 50) {
+            strengthBar.classList.add('strength-weak');
+            strengthText.textContent = 'Weak password';
+            strengthText.className = 'strength-text strength-weak-text';
+        } else if (strength <= 75) {
+            strengthBar.classList.add('strength-medium');
+            strengthText.textContent = 'Medium strength';
+            strengthText.className = 'strength-text strength-medium-text';
+        } else {
+            strengthBar.classList.add('strength-strong');
+            strengthText.textContent = 'Strong password';
+            strengthText.className = 'strength-text strength-strong-text';
+        }
+
+        return metRequirements === 4;
+    }
+
+    function validateForm() {
+        const fullname = document.getElementById('fullname').value;
+        const email = document.getElementById('email').value;
+        const password = document.getElementById('password').value;
+        const gender = document.getElementById('gender').value;
+
+        const isStrong = checkPasswordStrength(password);
+        const isFormComplete = fullname && email && password && gender;
+
+        submitBtn.disabled = !(isStrong && isFormComplete);
+    }
+
+    // Event listeners
+    const formInputs = document.querySelectorAll('#registerForm input, #registerForm select');
+    formInputs.forEach(input => {
+        input.addEventListener('input', validateForm);
+        input.addEventListener('change', validateForm);
+    });
+
+    // Form submission
+    registerForm.addEventListener('submit', function(e) {
+        // Additional teacher-specific validation
+        const email = document.getElementById('email').value;
+        if (!email.match(/^[^\s@]+@[^\s@]+\.[^\s@]+$/)) {
+            e.preventDefault();
+            alert('Please enter a valid email address.');
+            return;
+        }
+
+        const btn = this.querySelector('.btn');
+        btn.classList.add('loading');
+        btn.innerHTML = 'Creating Account...';
+    });
+
+    // Add focus effects
+    formInputs.forEach(input => {
+        input.addEventListener('focus', function() {
+            this.parentElement.classList.add('focused');
+            this.classList.remove('error');
+        });
+
+        input.addEventListener('blur', function() {
+            if (this.value === '') {
+                this.parentElement.classList.remove('focused');
+            }
+        });
+    });
+
+    // Auto-focus on first field
+    document.getElementById('fullname').focus();
+
+
+    // Initial validation
+    validateForm();
+});
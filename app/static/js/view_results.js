@@ -0,0 +1,67 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Add smooth scrolling for better navigation
+    const questionItems = document.querySelectorAll('.question-item');
+
+    questionItems.forEach((item, index) => {
+        // Add click to expand/collapse functionality
+        item.addEventListener('click', function() {
+            this.classList.toggle('expanded');
+        });
+
+        // Add question numbers for easy reference
+        const questionNumber = item.querySelector('.question-number');
+        if (questionNumber) {
+            questionNumber.textContent = `Question ${index + 1}`;
+        }
+    });
+
+    // Add performance analysis
+    const correctCount = document.querySelectorAll('.question-item.correct').length;
+    const totalCount = questionItems.length;
+    const accuracy = (correctCount / totalCount * 100).toFixed(1);
+
+    // Update performance message based on accuracy
+    const scoreMessage = document.querySelector('.score-message');
+    if (accuracy >= 80) {
+        scoreMessage.innerHTML = 'Excellent Work! 🎉 <br><small>You have mastered this material!</small>';
+    } else if (accuracy >= 60) {
+        scoreMessage.innerHTML = 'Good Job! 👍 <br><small>You are making good progress!</small>';
+    } else {
+        scoreMessage.innerHTML = 'Keep Practicing! 📚 <br><small>Review the material and try again!</small>';
+    }
+
+    // Add keyboard navigation
+    document.addEventListener('keydown', function(e) {
+        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+            e.preventDefault();
+            const currentFocus = document.querySelector('.question-item:focus-within');
+            const allItems = document.querySelectorAll('.question-item');
+
+            if (currentFocus) {
+                const currentIndex = Array.from(allItems).indexOf(currentFocus);
+                let nextIndex;
+
+                if (e.key === 'ArrowDown') {
+                    nextIndex = (currentIndex + 1) % allItems.length;
+                } else {
+                    nextIndex = (currentIndex - 1 + allItems.length) % allItems.length;
+                }
+
+                allItems[nextIndex].scrollIntoView({ behavior: 'smooth', block: 'nearest' });
+                allItems[nextIndex].focus();
+            }
+        }
+    });
+
+    // Add print functionality enhancement
+    const printBtn = document.querySelector('button[onclick="window.print()"]');
+    if (printBtn) {
+        printBtn.addEventListener('click', function() {
+            // Add print-specific styling
+            document.body.classList.add('printing');
+            setTimeout(() => {
+                document.body.classList.remove('printing');
+            }, 1000);
+        });
+    }
+});
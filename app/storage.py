@@ -0,0 +1,74 @@
+import os
+import shutil
+
+# Where uploaded files (question images, profile pictures, result slip zips)
+# are kept. LocalStorage writes under UPLOAD_FOLDER and only suits a single
+# node; S3Storage lets every node read what any node wrote. Any
+# S3-compatible service works, including a local moto_server stand-in.
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f'Invalid file name: {name}')
+        return path
+
+    def save(self, name, fileobj):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            shutil.copyfileobj(fileobj, out)
+
+    def open(self, name):
+        """Returns a binary file object for name, or None if it doesn't exist."""
+        try:
+            return open(self._path(name), 'rb')
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    def __init__(self, bucket, prefix='', client=None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        # boto3 honours AWS_ENDPOINT_URL, which points it at a local stand-in.
+        self.client = client or boto3.client('s3')
+
+    def _key(self, name):
+        return f'{self.prefix}/{name}' if self.prefix else name
+
+    def save(self, name, fileobj):
+        self.client.upload_fileobj(fileobj, self.bucket, self._key(name))
+
+    def open(self, name):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body']
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+
+def create_storage(url, upload_folder):
+    """Returns the storage for UPLOAD_STORAGE_URL, such as s3://bucket/prefix.
+
+    An empty url keeps files in upload_folder on local disk.
+    """
+    if url and url.startswith('s3://'):
+        bucket, _, prefix = url[len('s3://'):].partition('/')
+        return S3Storage(bucket, prefix)
+    return LocalStorage(upload_folder)
@@ -0,0 +1,148 @@
+import atexit
+import os
+import random
+import threading
+
+import psycopg2.extras
+
+from database import get_db_connection
+
+# The exam page reports how long it took to load, how long each answer sync
+# took and which syncs failed, a few events per navigator.sendBeacon. A
+# beacon is only appended to this worker's buffer; a background thread
+# writes the buffer to client_metrics in one INSERT every FLUSH_INTERVAL
+# seconds, or as soon as FLUSH_SIZE events are waiting. Under load, once
+# SAMPLE_ABOVE events are waiting, one event in SAMPLE_EVERY is kept with
+# that many as its weight, so counts and rates read from the table stay
+# right; at MAX_BUFFERED, events are dropped and the number dropped is
+# written as a 'dropped' row.
+KINDS = ('navigation', 'save', 'save_failed')
+FLUSH_INTERVAL = 5
+FLUSH_SIZE = 500
+SAMPLE_ABOVE = 2000
+SAMPLE_EVERY = 10
+MAX_BUFFERED = 20000
+MAX_EVENTS_PER_BEACON = 50
+MAX_DURATION_MS = 10 * 60 * 1000
+
+
+def parse_events(events):
+    """Returns the (kind, duration_ms) pairs of a beacon's events, skipping malformed ones."""
+    parsed = []
+    if not isinstance(events, list):
+        return parsed
+    for event in events[:MAX_EVENTS_PER_BEACON]:
+        if not isinstance(event, dict) or event.get('type') not in KINDS:
+            continue
+        duration = event.get('ms')
+        if isinstance(duration, bool) or not isinstance(duration, (int, float)) or not 0 <= duration <= MAX_DURATION_MS:
+            continue
+        parsed.append((event['type'], float(duration)))
+    return parsed
+
+
+class TelemetryBuffer:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE, sample_above=SAMPLE_ABOVE,
+                 sample_every=SAMPLE_EVERY, max_buffered=MAX_BUFFERED):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.sample_above = sample_above
+        self.sample_every = sample_every
+        self.max_buffered = max_buffered
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._events = []
+        self._dropped = 0
+        self._thread = None
+
+    def add(self, exam_id, events):
+        """Buffers a beacon's (kind, duration_ms) events for an exam. Returns how many were kept."""
+        kept = 0
+        with self._lock:
+            for kind, duration in events:
+                waiting = len(self._events)
+                weight = 1
+                if waiting >= self.max_buffered:
+                    self._dropped += 1
+                    continue
+                if waiting >= self.sample_above:
+                    if random.randrange(self.sample_every):
+                        continue
+                    weight = self.sample_every
+                self._events.append((exam_id, kind, duration, weight))
+                kept += 1
+            full = len(self._events) >= self.flush_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+        return kept
+
+    def flush(self):
+        """Writes the buffered events to client_metrics. Returns how many rows were written."""
+        with self._lock:
+            events, self._events = self._events, []
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            events.append((None, 'dropped', None, dropped))
+        if not events:
+            return 0
+        conn = None
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO client_metrics (exam_id, kind, duration_ms, weight) VALUES %s
+            """, events, page_size=1000)
+            conn.commit()
+            cur.close()
+        except psycopg2.Error:
+            # Lost, but counted: the next flush records them as dropped.
+            with self._lock:
+                self._dropped += sum(event[3] for event in events)
+            return 0
+        finally:
+            if conn is not None:
+                conn.close()
+        return len(events)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def exam_summary(cur, since):
+    """Per-exam page load and answer sync figures reported since a time, slowest syncs first.
+
+    cur must be a DictCursor. Percentiles are over the stored (possibly
+    sampled) events; counts and the failure rate use their weights.
+    """
+    cur.execute("""
+        SELECT m.exam_id, e.title, e.class,
+               COALESCE(SUM(m.weight) FILTER (WHERE m.kind = 'navigation'), 0) AS page_loads,
+               percentile_cont(0.95) WITHIN GROUP (ORDER BY m.duration_ms) FILTER (WHERE m.kind = 'navigation') AS p95_load_ms,
+               COALESCE(SUM(m.weight) FILTER (WHERE m.kind IN ('save', 'save_failed')), 0) AS saves,
+               percentile_cont(0.95) WITHIN GROUP (ORDER BY m.duration_ms) FILTER (WHERE m.kind = 'save') AS p95_save_ms,
+               COALESCE(SUM(m.weight) FILTER (WHERE m.kind = 'save_failed'), 0)::float8
+                   / NULLIF(SUM(m.weight) FILTER (WHERE m.kind IN ('save', 'save_failed')), 0) AS failure_rate
+        FROM client_metrics m
+        JOIN exams e ON e.id = m.exam_id
+        WHERE m.recorded_at >= %s AND e.deleted_at IS NULL
+        GROUP BY m.exam_id, e.title, e.class
+        ORDER BY p95_save_ms DESC NULLS LAST
+    """, (since,))
+    exams = cur.fetchall()
+    cur.execute("SELECT COALESCE(SUM(weight), 0) FROM client_metrics WHERE kind = 'dropped' AND recorded_at >= %s", (since,))
+    return exams, cur.fetchone()[0]
+
+
+buffer = TelemetryBuffer()
+atexit.register(buffer.flush)
+# A forked worker starts with an empty buffer and its own flush thread.
+os.register_at_fork(after_in_child=buffer._reset)
@@ -0,0 +1,146 @@
+"""Benchmark bitmask-encoded choice answers against the old text encoding.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_answer_encoding.py --students 500
+
+Seeds one exam of choice questions sat by every student, keeps a copy of
+the answers in the old text encoding, and compares:
+- bytes per stored answer, "0,2" text versus an integer mask;
+- scoring every submission the old way (fetch the answers, split the text
+  and json.loads the key in Python) versus the SQL compare calculate_score
+  now runs.
+The test data is removed afterwards.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import database  # noqa: E402
+
+TEXT_SCORE_QUERY = """
+    SELECT sa.answer_text, q.correct_answer, eq.weight
+    FROM text_answers sa
+    JOIN questions q ON sa.question_id = q.id
+    JOIN exam_questions eq ON eq.question_id = q.id AND eq.exam_id = %s
+    WHERE sa.submission_id = %s
+"""
+
+MASK_SCORE_QUERY = """
+    SELECT COALESCE(SUM(eq.weight) FILTER (WHERE sa.answer_mask = q.correct_mask), 0), COALESCE(SUM(eq.weight), 0)
+    FROM exam_questions eq
+    JOIN questions q ON eq.question_id = q.id
+    LEFT JOIN student_answers sa ON sa.submission_id = %s AND sa.question_id = eq.question_id
+    WHERE eq.exam_id = %s
+"""
+
+
+def seed_data(cur, students, questions):
+    cur.execute("INSERT INTO users (fullname, email, password_hash, role) VALUES ('Bench Teacher', 'bench-teacher@example.com', 'x', 'teacher') RETURNING id")
+    teacher_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO exams (title, duration, teacher_id, class) VALUES ('Bench encoding', 60, %s, 'BENCH') RETURNING id", (teacher_id,))
+    exam_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO questions (teacher_id, question_text, question_type, options, correct_answer)
+        SELECT %s, 'Bench question ' || n, 'multiple-choice',
+               '[{"text": "a", "correct": true}, {"text": "b", "correct": false},
+                 {"text": "c", "correct": true}, {"text": "d", "correct": false}]', '["0", "2"]'
+        FROM generate_series(1, %s) n
+    """, (teacher_id, questions))
+    cur.execute("""
+        INSERT INTO exam_questions (exam_id, question_id, position)
+        SELECT %s, id, ROW_NUMBER() OVER (ORDER BY id) FROM questions WHERE teacher_id = %s
+    """, (exam_id, teacher_id))
+    cur.execute("""
+        INSERT INTO users (fullname, email, password_hash, role, class)
+        SELECT 'Candidate ' || n, 'bench-' || n || '@example.com', 'x', 'student', 'BENCH'
+        FROM generate_series(1, %s) n
+    """, (students,))
+    cur.execute("""
+        INSERT INTO exam_submissions (student_id, exam_id, status, seed)
+        SELECT id, %s, 'submitted', 0 FROM users WHERE email LIKE 'bench-%%@example.com' AND role = 'student'
+        RETURNING id
+    """, (exam_id,))
+    submission_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        INSERT INTO student_answers (submission_id, question_id, answer_mask)
+        SELECT s.id, eq.question_id, (ARRAY[5, 1, 4, 6])[1 + (s.id + eq.question_id) %% 4]
+        FROM exam_submissions s JOIN exam_questions eq ON eq.exam_id = s.exam_id
+        WHERE s.exam_id = %s
+    """, (exam_id,))
+    # The same answers in the old encoding, for comparison.
+    cur.execute("""
+        CREATE TEMP TABLE text_answers AS
+        SELECT submission_id, question_id, choice_text(answer_mask) AS answer_text
+        FROM student_answers WHERE submission_id = ANY(%s)
+    """, (submission_ids,))
+    cur.execute("CREATE INDEX ON text_answers (submission_id)")
+    cur.execute("ANALYZE text_answers")
+    return teacher_id, exam_id, submission_ids
+
+
+def score_text(cur, exam_id, submission_ids):
+    scores = []
+    for submission_id in submission_ids:
+        cur.execute(TEXT_SCORE_QUERY, (exam_id, submission_id))
+        score = total = 0
+        for answer_text, correct_answer, weight in cur.fetchall():
+            total += float(weight)
+            if set(answer_text.split(',')) == set(json.loads(correct_answer)):
+                score += float(weight)
+        scores.append(score / total * 100)
+    return scores
+
+
+def score_mask(cur, exam_id, submission_ids):
+    scores = []
+    for submission_id in submission_ids:
+        cur.execute(MASK_SCORE_QUERY, (submission_id, exam_id))
+        score, total = cur.fetchone()
+        scores.append(float(score) / float(total) * 100)
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=60)
+    args = parser.parse_args()
+
+    database.init_db()
+    conn = database.get_db_connection()
+    cur = conn.cursor()
+    teacher_id, exam_id, submission_ids = seed_data(cur, args.students, args.questions)
+    conn.commit()
+
+    try:
+        cur.execute("SELECT AVG(pg_column_size(answer_text)) FROM text_answers")
+        text_bytes = cur.fetchone()[0]
+        cur.execute("SELECT AVG(pg_column_size(answer_mask)) FROM student_answers WHERE submission_id = ANY(%s)", (submission_ids,))
+        mask_bytes = cur.fetchone()[0]
+        print(f'{len(submission_ids) * args.questions} answers: {text_bytes:.1f} bytes as text, {mask_bytes:.1f} bytes as a mask')
+
+        start = time.perf_counter()
+        text_scores = score_text(cur, exam_id, submission_ids)
+        text_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        mask_scores = score_mask(cur, exam_id, submission_ids)
+        mask_elapsed = time.perf_counter() - start
+        assert [round(s, 6) for s in text_scores] == [round(s, 6) for s in mask_scores]
+        print(f'text scoring: {text_elapsed:.2f} s ({text_elapsed / len(submission_ids) * 1000:.2f} ms per submission)')
+        print(f'mask scoring: {mask_elapsed:.2f} s ({mask_elapsed / len(submission_ids) * 1000:.2f} ms per submission)')
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+        cur.execute("DELETE FROM questions WHERE teacher_id = %s", (teacher_id,))
+        cur.execute("DELETE FROM users WHERE email LIKE 'bench-%%@example.com'")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Benchmark hot-query latency before and after archiving closed terms.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_archive.py --terms 4
+
+Seeds --terms terms of exams, each sat by every student, times the queries
+behind view_results, calculate_score, the analytics pages and the dashboards
+for the current term, archives every term but the last, and times them
+again. The test data is removed afterwards.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+import psycopg2.extras  # noqa: E402
+
+import archive  # noqa: E402
+import database  # noqa: E402
+
+HOT_QUERIES = {
+    'view_results answers': ("""
+        SELECT q.*, sa.answer_text
+        FROM questions q
+        JOIN student_answers sa ON q.id = sa.question_id
+        WHERE sa.submission_id = %(submission_id)s
+    """),
+    'calculate_score answers': ("""
+        SELECT sa.answer_text, q.question_type, q.correct_answer, eq.weight
+        FROM student_answers sa
+        JOIN questions q ON sa.question_id = q.id
+        JOIN exam_questions eq ON eq.question_id = q.id AND eq.exam_id = %(exam_id)s
+        WHERE sa.submission_id = %(submission_id)s
+    """),
+    'teacher_analytics scores': ("""
+        SELECT u.fullname, s.score
+        FROM exam_submissions s
+        JOIN users u ON s.student_id = u.id
+        JOIN exams e ON s.exam_id = e.id
+        WHERE e.teacher_id = %(teacher_id)s AND s.status = 'submitted'
+    """),
+    'teacher_analytics completion': ("""
+        SELECT COUNT(DISTINCT student_id) FROM exam_submissions
+        WHERE exam_id IN (SELECT id FROM exams WHERE teacher_id = %(teacher_id)s)
+    """),
+    'teacher_dashboard counts': ("""
+        SELECT e.id, COUNT(s.id) AS submission_count
+        FROM exams e
+        LEFT JOIN exam_submissions s ON e.id = s.exam_id
+        WHERE e.teacher_id = %(teacher_id)s
+        GROUP BY e.id
+    """),
+    'student_dashboard completed': ("""
+        SELECT e.id, e.title, s.id AS submission_id, s.score FROM exams e
+        JOIN exam_submissions s ON e.id = s.exam_id
+        WHERE s.student_id = %(student_id)s AND s.status = 'submitted'
+        UNION ALL
+        SELECT e.id, e.title, a.id, a.score FROM exams e
+        JOIN exam_submissions_archive a ON e.id = a.exam_id
+        WHERE a.student_id = %(student_id)s AND a.status = 'submitted'
+    """),
+}
+
+
+def term_start(term):
+    return datetime(2020, 1, 1) + timedelta(days=120 * term)
+
+
+def seed_data(cur, terms, exams, students, questions):
+    cur.execute("INSERT INTO users (fullname, email, password_hash, role) VALUES ('Bench Teacher', 'bench-teacher@example.com', 'x', 'teacher') RETURNING id")
+    teacher_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO users (fullname, email, password_hash, role, class)
+        SELECT 'Candidate ' || n, 'bench-' || n || '@example.com', 'x', 'student', 'BENCH'
+        FROM generate_series(1, %s) n
+    """, (students,))
+    cur.execute("""
+        INSERT INTO questions (teacher_id, question_text, question_type, options, correct_answer)
+        SELECT %s, 'Bench question ' || n, 'single-choice',
+               '[{"text": "a", "correct": true}, {"text": "b", "correct": false}]', '["0"]'
+        FROM generate_series(1, %s) n
+    """, (teacher_id, questions))
+    for term in range(terms):
+        cur.execute("""
+            INSERT INTO exams (title, duration, teacher_id, class, created_at, end_time)
+            SELECT 'Bench ' || %s || '-' || n, 60, %s, 'BENCH', %s + n * INTERVAL '1 day', %s + n * INTERVAL '1 day'
+            FROM generate_series(1, %s) n
+        """, (term, teacher_id, term_start(term), term_start(term), exams))
+    cur.execute("""
+        INSERT INTO exam_questions (exam_id, question_id, position)
+        SELECT e.id, q.id, ROW_NUMBER() OVER (PARTITION BY e.id ORDER BY q.id)
+        FROM exams e, questions q
+        WHERE e.teacher_id = %s AND q.teacher_id = %s
+    """, (teacher_id, teacher_id))
+    cur.execute("""
+        INSERT INTO exam_submissions (student_id, exam_id, start_time, end_time, score, status, seed)
+        SELECT u.id, e.id, e.created_at, e.created_at, (random() * 100)::int, 'submitted', 0
+        FROM users u, exams e
+        WHERE u.class = 'BENCH' AND u.role = 'student' AND e.teacher_id = %s
+    """, (teacher_id,))
+    cur.execute("""
+        INSERT INTO student_answers (submission_id, question_id, answer_text)
+        SELECT s.id, eq.question_id, (random() < 0.5)::int::text
+        FROM exam_submissions s
+        JOIN exams e ON e.id = s.exam_id
+        JOIN exam_questions eq ON eq.exam_id = e.id
+        WHERE e.teacher_id = %s
+    """, (teacher_id,))
+    return teacher_id
+
+
+def current_term_samples(cur, teacher_id, terms, count):
+    cur.execute("""
+        SELECT s.id AS submission_id, s.exam_id, s.student_id
+        FROM exam_submissions s JOIN exams e ON e.id = s.exam_id
+        WHERE e.teacher_id = %s AND e.created_at >= %s
+    """, (teacher_id, term_start(terms - 1)))
+    rows = cur.fetchall()
+    return [dict(row, teacher_id=teacher_id) for row in random.sample(rows, min(count, len(rows)))]
+
+
+def time_queries(cur, samples):
+    results = {}
+    for name, query in HOT_QUERIES.items():
+        timings = []
+        for params in samples:
+            start = time.perf_counter()
+            cur.execute(query, params)
+            cur.fetchall()
+            timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def table_size(cur, table):
+    # pg_partition_tree lists nothing for a plain table, so count it directly.
+    cur.execute("""
+        SELECT pg_size_pretty(COALESCE(SUM(pg_total_relation_size(relid)), pg_total_relation_size(%s::regclass)))
+        FROM pg_partition_tree(%s)
+    """, (table, table))
+    return cur.fetchone()[0]
+
+
+def print_sizes(cur, label):
+    # Plain VACUUM leaves the freed pages to be reused by new terms, so the
+    # hot tables keep their size on disk; the row counts are what shrink.
+    sizes = []
+    for table in ('student_answers', 'exam_submissions', 'exam_submissions_archive'):
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        sizes.append(f'{table} {cur.fetchone()[0]} rows / {table_size(cur, table)}')
+    print(f'{label}: ' + ', '.join(sizes))
+
+
+def cleanup(cur, teacher_id, terms):
+    cur.execute("DELETE FROM exams WHERE teacher_id = %s", (teacher_id,))
+    cur.execute("DELETE FROM questions WHERE teacher_id = %s", (teacher_id,))
+    cur.execute("DELETE FROM users WHERE email LIKE 'bench-%%@example.com'")
+    for term in range(terms):
+        cur.execute(f"DROP TABLE IF EXISTS {archive.partition_name(f'bench-{term}')}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--terms', type=int, default=4)
+    parser.add_argument('--exams', type=int, default=25, help='exams per term')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=40)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    database.init_db()
+    conn = database.get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+    start = time.perf_counter()
+    cur.execute('BEGIN')
+    teacher_id = seed_data(cur, args.terms, args.exams, args.students, args.questions)
+    cur.execute('COMMIT')
+    cur.execute('VACUUM ANALYZE')
+    print(f'Seeded {args.terms} terms x {args.exams} exams x {args.students} students x {args.questions} answers '
+          f'in {time.perf_counter() - start:.1f} s')
+
+    try:
+        samples = current_term_samples(cur, teacher_id, args.terms, args.runs)
+        print_sizes(cur, 'before')
+        before = time_queries(cur, samples)
+
+        start = time.perf_counter()
+        cur.execute('BEGIN')
+        for term in range(args.terms - 1):
+            archive.archive_term(cur, f'bench-{term}', term_start(term), term_start(term + 1))
+        cur.execute('COMMIT')
+        print(f'Archived {args.terms - 1} terms in {time.perf_counter() - start:.1f} s')
+        cur.execute('VACUUM ANALYZE')
+
+        print_sizes(cur, 'after')
+        after = time_queries(cur, samples)
+        print(f"{'query':<30}{'before':>10}{'after':>10}")
+        for name in HOT_QUERIES:
+            print(f'{name:<30}{before[name] * 1000:>8.2f}ms{after[name] * 1000:>8.2f}ms')
+    finally:
+        cleanup(cur, teacher_id, args.terms)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
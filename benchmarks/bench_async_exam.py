@@ -0,0 +1,184 @@
+"""Benchmark the exam-taking endpoints under sync Flask and the async app.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_async_exam.py --candidates 1000
+
+Creates an exam and --candidates students, then serves app.py with
+gunicorn (gthread workers) and async_app.py with uvicorn in turn. In each
+mode every candidate starts the exam, saves --answers answers and submits,
+all at the same time. Requests/sec and latency percentiles are reported for
+each mode. The test data is removed afterwards.
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+from flask import Flask  # noqa: E402
+from flask_login.utils import _create_identifier  # noqa: E402
+
+import database  # noqa: E402
+import question_bank  # noqa: E402
+
+SECRET_KEY = 'bench-secret-key'
+USER_AGENT = 'cbt-bench'
+
+
+def seed_data(candidates, questions):
+    conn = database.get_db_connection()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO users (fullname, email, password_hash, role) VALUES ('Bench Teacher', 'bench-teacher@example.com', 'x', 'teacher') RETURNING id")
+    teacher_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO exams (title, duration, teacher_id, class) VALUES ('Bench', 60, %s, 'BENCH') RETURNING id", (teacher_id,))
+    exam_id = cur.fetchone()[0]
+    ids = question_bank.upsert_questions(cur, teacher_id, [{
+        'exam_id': exam_id, 'question_text': f'Bench question {i}', 'question_type': 'single-choice',
+        'options': '[{"text": "a", "correct": true}, {"text": "b", "correct": false}]', 'correct_answer': '["0"]',
+    } for i in range(questions)])
+    question_bank.link_questions(cur, exam_id, ids)
+    cur.execute("""
+        INSERT INTO users (fullname, email, password_hash, role, class)
+        SELECT 'Candidate ' || n, 'bench-' || n || '@example.com', 'x', 'student', 'BENCH'
+        FROM generate_series(1, %s) n
+        RETURNING id
+    """, (candidates,))
+    student_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    conn.close()
+    return teacher_id, exam_id, student_ids
+
+
+def cleanup(teacher_id, exam_id):
+    conn = database.get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+    cur.execute("DELETE FROM questions WHERE teacher_id = %s", (teacher_id,))
+    cur.execute("DELETE FROM users WHERE email LIKE 'bench-%%@example.com'")
+    conn.commit()
+    conn.close()
+
+
+def reset_submissions(exam_id):
+    conn = database.get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM exam_submissions WHERE exam_id = %s", (exam_id,))
+    conn.commit()
+    conn.close()
+
+
+def session_cookies(student_ids):
+    """Signs a Flask-Login session cookie for each student, as a login would."""
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookies = {}
+    with app.test_request_context(headers={'User-Agent': USER_AGENT}, environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+        identifier = _create_identifier()
+        for student_id in student_ids:
+            cookies[student_id] = serializer.dumps({
+                '_user_id': str(student_id), '_fresh': True, '_id': identifier, '_permanent': True
+            })
+    return cookies
+
+
+def start_server(mode, port, workers, threads):
+    if mode == 'sync':
+        command = ['gunicorn', '--worker-class', 'gthread', '--workers', str(workers), '--threads', str(threads),
+                   '--bind', f'127.0.0.1:{port}', '--backlog', '4096', '--log-level', 'warning', 'app:app']
+    else:
+        command = ['uvicorn', 'async_app:app', '--workers', str(workers), '--host', '127.0.0.1',
+                   '--port', str(port), '--backlog', '4096', '--log-level', 'warning', '--no-access-log']
+    env = dict(os.environ, SECRET_KEY=SECRET_KEY)
+    server = subprocess.Popen(command, cwd=APP_DIR, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f'{mode} server did not start on port {port}')
+
+
+async def candidate(http, base_url, exam_id, cookie, answers, latencies):
+    headers = {'Cookie': f'session={cookie}', 'User-Agent': USER_AGENT}
+
+    async def request(method, path, **kwargs):
+        start = time.perf_counter()
+        async with http.request(method, base_url + path, headers=headers, allow_redirects=False, **kwargs) as response:
+            body = await response.text()
+            if response.status != 200:
+                raise RuntimeError(f'{method} {path} returned {response.status}')
+        latencies.append(time.perf_counter() - start)
+        return body
+
+    page = await request('GET', f'/student/exam/start/{exam_id}')
+    submission_id = int(re.search(r'const submissionId = (\d+)', page).group(1))
+    question_ids = list(dict.fromkeys(int(q) for q in re.findall(r'name="answer_(\d+)"', page)))
+    for question_id in question_ids[:answers]:
+        await request('POST', '/student/exam/save_answer',
+                      json={'submission_id': submission_id, 'question_id': question_id, 'answer_text': '0'})
+    await request('POST', '/student/exam/submit', json={'submission_id': submission_id})
+
+
+async def run_load(base_url, exam_id, cookies, answers):
+    latencies = []
+    connector = aiohttp.TCPConnector(limit=len(cookies))
+    timeout = aiohttp.ClientTimeout(total=600)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(candidate(http, base_url, exam_id, cookie, answers, latencies) for cookie in cookies.values()))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def report(mode, elapsed, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f'{mode:<6} {len(latencies)} requests in {elapsed:.1f} s: {len(latencies) / elapsed:.0f} req/s   '
+          f'latency p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms, mean {statistics.mean(latencies) * 1000:.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--answers', type=int, default=10, help='answers saved per candidate')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='threads per sync worker')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--modes', default='sync,async')
+    args = parser.parse_args()
+
+    database.init_db()
+    teacher_id, exam_id, student_ids = seed_data(args.candidates, args.questions)
+    cookies = session_cookies(student_ids)
+    try:
+        for mode in args.modes.split(','):
+            reset_submissions(exam_id)
+            server = start_server(mode, args.port, args.workers, args.threads)
+            try:
+                elapsed, latencies = asyncio.run(run_load(f'http://127.0.0.1:{args.port}', exam_id, cookies, args.answers))
+            finally:
+                server.terminate()
+                server.wait()
+            report(mode, elapsed, latencies)
+    finally:
+        cleanup(teacher_id, exam_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Measure the server's share of a chunked upload.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_chunked_upload.py --mb 5 --link-kbps 512
+
+Sends a --mb image through the Flask test client in one multipart request
+and as a chunked upload session, and reports the server time of each and
+of the slowest chunk request. --link-kbps estimates how long a worker is
+held on a link of that speed: for the whole file in one request, against
+one chunk at a time. The test user and files are removed afterwards.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import app  # noqa: E402
+import database  # noqa: E402
+
+
+def login(client, cur):
+    cur.execute("INSERT INTO users (fullname, email, password_hash, role) VALUES ('Bench Teacher', 'bench-upload@example.com', 'x', 'teacher') RETURNING id")
+    teacher_id = cur.fetchone()[0]
+    with client.session_transaction() as session:
+        session['_user_id'] = str(teacher_id)
+    return teacher_id
+
+
+def one_request(client, exam_id, data):
+    start = time.perf_counter()
+    client.post(f'/teacher/exam/{exam_id}/add_question', data={
+        'question_text': 'Bench', 'question_type': 'short-answer', 'correct_answer': 'x',
+        'question_image': (io.BytesIO(data), 'bench_one.png')}, content_type='multipart/form-data')
+    return time.perf_counter() - start
+
+
+def chunked(client, data):
+    chunk_size = app.app.config['UPLOAD_CHUNK_SIZE']
+    start = time.perf_counter()
+    upload = client.post('/upload-sessions', json={'purpose': 'image', 'filename': 'bench_chunked.png', 'size': len(data)}).get_json()
+    slowest = 0
+    for offset in range(0, len(data), chunk_size):
+        chunk = data[offset:offset + chunk_size]
+        chunk_start = time.perf_counter()
+        client.put(upload['url'], data=chunk, content_type='application/octet-stream',
+                   headers={'Upload-Offset': str(offset), 'X-Chunk-CRC32': format(zlib.crc32(chunk), 'x')})
+        slowest = max(slowest, time.perf_counter() - chunk_start)
+    while client.get(upload['url']).get_json()['status'] == 'processing':
+        time.sleep(0.01)
+    return time.perf_counter() - start, slowest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=int, default=5)
+    parser.add_argument('--link-kbps', type=int, default=512)
+    args = parser.parse_args()
+
+    database.init_db()
+    size = args.mb * 1024 * 1024
+    app.app.config['MAX_IMAGE_FILE_SIZE'] = size
+    data = os.urandom(size)
+    conn = database.get_db_connection()
+    cur = conn.cursor()
+    client = app.app.test_client()
+    teacher_id = login(client, cur)
+    cur.execute("INSERT INTO exams (title, duration, teacher_id) VALUES ('Bench', 30, %s) RETURNING id", (teacher_id,))
+    exam_id = cur.fetchone()[0]
+    conn.commit()
+    try:
+        whole = one_request(client, exam_id, data)
+        total, slowest = chunked(client, data)
+        chunk_size = app.app.config['UPLOAD_CHUNK_SIZE']
+        link = args.link_kbps * 1024 / 8
+        print(f'{args.mb} MB file, {chunk_size // 1024} KB chunks ({-(-size // chunk_size)} requests)')
+        print(f'one request:     {whole * 1000:8.1f} ms server time, worker held ~{size / link:6.0f}s at {args.link_kbps} kbit/s')
+        print(f'chunked, total:  {total * 1000:8.1f} ms server time')
+        print(f'slowest chunk:   {slowest * 1000:8.1f} ms server time, worker held ~{chunk_size / link:6.0f}s at a time')
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM exam_questions WHERE exam_id = %s", (exam_id,))
+        cur.execute("DELETE FROM questions WHERE teacher_id = %s", (teacher_id,))
+        cur.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+        cur.execute("DELETE FROM users WHERE id = %s", (teacher_id,))
+        conn.commit()
+        conn.close()
+        for name in ('bench_one.png', 'bench_chunked.png'):
+            app.uploads.delete(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Measure the answer similarity comparison on a large sitting.
+
+Run from the repository root:
+
+    python benchmarks/bench_collusion.py --candidates 2000 --questions 60
+
+Generates --candidates answer sheets for a choice-question paper, with a
+few copied pairs planted, and times encoding them and comparing every pair
+through collusion.score_pairs, whose memory stays bounded by --block-mb.
+Then compares a plain Python loop over a sample of pairs, extrapolated to
+all of them, which is what comparing pair by pair costs.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import collusion  # noqa: E402
+
+COPIED_PAIRS = 5
+
+
+def answer_rows(candidates, questions, seed=1):
+    """Answer rows as fetch_answers returns them. The first COPIED_PAIRS pairs copied most answers."""
+    rng = random.Random(seed)
+    keys = [1 << rng.randrange(4) for _ in range(questions)]
+    sheets = [[keys[q] if rng.random() < 0.6 else 1 << rng.randrange(4) for q in range(questions)]
+              for _ in range(candidates)]
+    for pair in range(COPIED_PAIRS):
+        copier, source = sheets[2 * pair], sheets[2 * pair + 1]
+        for q in range(questions):
+            if rng.random() < 0.8:
+                copier[q] = source[q]
+    rows = [(candidate, q, answer, None, 'single-choice', keys[q], None)
+            for candidate, sheet in enumerate(sheets) for q, answer in enumerate(sheet) if rng.random() < 0.95]
+    return rows, sheets, keys
+
+
+def pairwise(sheets, keys, pairs):
+    """Shared wrong answers of sampled pairs, one pair at a time."""
+    start = time.perf_counter()
+    for a, b in pairs:
+        sum(1 for x, y, key in zip(sheets[a], sheets[b], keys) if x == y and x != key)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--candidates', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=60)
+    parser.add_argument('--block-mb', type=int, default=collusion.BLOCK_BYTES // (1024 * 1024))
+    parser.add_argument('--sample', type=int, default=20000)
+    args = parser.parse_args()
+
+    rows, sheets, keys = answer_rows(args.candidates, args.questions)
+    total_pairs = args.candidates * (args.candidates - 1) // 2
+
+    start = time.perf_counter()
+    matrices = collusion.encode_answers(list(range(args.candidates)), rows)
+    encoded = time.perf_counter() - start
+    start = time.perf_counter()
+    pairs = collusion.score_pairs(*matrices, block_bytes=args.block_mb * 1024 * 1024)
+    compared = time.perf_counter() - start
+
+    rng = random.Random(2)
+    sample = [tuple(rng.sample(range(args.candidates), 2)) for _ in range(min(args.sample, total_pairs))]
+    loop = pairwise(sheets, keys, sample) / len(sample) * total_pairs
+
+    planted = {(2 * pair, 2 * pair + 1) for pair in range(COPIED_PAIRS)}
+    found = sum(1 for pair in pairs[:COPIED_PAIRS] if pair[:2] in planted)
+    print(f'{args.candidates} candidates, {args.questions} questions, {total_pairs} pairs')
+    print(f'encode answers:         {encoded:6.2f}s ({len(rows)} answers)')
+    print(f'blocked bitset compare: {compared:6.2f}s ({args.block_mb} MB blocks)')
+    print(f'pair by pair (est.):    {loop:6.2f}s ({loop / compared:.0f}x slower)')
+    print(f'planted pairs ranked in the top {COPIED_PAIRS}: {found} of {COPIED_PAIRS}')
+
+
+if __name__ == '__main__':
+    main()
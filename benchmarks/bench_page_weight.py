@@ -0,0 +1,77 @@
+"""Measure the bytes a candidate downloads to start an exam.
+
+Run from the repository root:
+
+    python benchmarks/bench_page_weight.py --questions 40
+
+The database is not needed: take_exam.html is rendered for a synthetic
+exam and compared three ways:
+- inline: the bundles pasted back into the page, uncompressed, as every
+  page view used to send them;
+- first visit: the compressed page plus each compressed bundle;
+- later pages: the compressed page only, with the bundles cached.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/unused')
+
+from app import app  # noqa: E402
+import compression  # noqa: E402
+
+ASSET = re.compile(r'<link rel="stylesheet" href="/static/([^"?]+)\?v=\w+">|<script src="/static/([^"?]+)\?v=\w+"></script>')
+
+
+def make_questions(count):
+    options = json.dumps([{'text': f'Option {i}', 'correct': i == 0} for i in range(4)])
+    return [{
+        'id': i + 1,
+        'question_text': f'<p>Question {i + 1}: which of the following statements about the topic is correct?</p>',
+        'question_image': None,
+        'question_type': 'short-answer' if i % 5 == 4 else 'single-choice',
+        'options': options,
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=40)
+    args = parser.parse_args()
+
+    exam = {'id': 1, 'title': 'Bench Exam', 'duration': 60}
+    with app.test_request_context('/student/exam/start/1'):
+        from flask import render_template
+        html = render_template('take_exam.html', exam=exam, questions=make_questions(args.questions), submission_id=1,
+                               remaining=3600, saved_answers={})
+
+    bundles = {}
+
+    def inline(match):
+        name = match.group(1) or match.group(2)
+        with open(os.path.join(app.static_folder, name), 'rb') as f:
+            bundles[name] = f.read()
+        tag = 'style' if match.group(1) else 'script'
+        return f'<{tag}>{bundles[name].decode()}</{tag}>'
+
+    inlined = ASSET.sub(inline, html).encode()
+    page = html.encode()
+
+    def gz(data):
+        return len(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+
+    first_visit = gz(page) + sum(gz(data) for data in bundles.values())
+    print(f'take_exam.html, {args.questions} questions, {len(bundles)} bundles')
+    print(f'inline, uncompressed:  {len(inlined) / 1024:7.1f} KB every page view')
+    print(f'first visit:           {first_visit / 1024:7.1f} KB ({len(inlined) / first_visit:.1f}x smaller)')
+    print(f'later pages:           {gz(page) / 1024:7.1f} KB ({len(inlined) / gz(page):.1f}x smaller)')
+    if compression.brotli is None:
+        print('(gzip only; install brotli to compress with it too)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark drawing per-student papers from a large question bank.
+
+Run from the repository root:
+
+    python benchmarks/bench_paper_draw.py --bank 5000 --students 500
+
+Pools are built once from a synthetic 5,000-question exam, then every
+student's paper is drawn from their own seed, as start_exam does.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import papers  # noqa: E402
+
+TOPICS = ['Algebra', 'Geometry', 'Statistics', 'Mechanics', 'Biology', 'Chemistry', 'Grammar', 'Literature']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+
+class BankCursor:
+    """Stands in for the pool query, returning (question_id, topic, difficulty) rows."""
+
+    def __init__(self, bank):
+        self.rows = [(i + 1, TOPICS[i % len(TOPICS)], DIFFICULTIES[i % len(DIFFICULTIES)]) for i in range(bank)]
+
+    def execute(self, query, params):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bank', type=int, default=5000)
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--per-rule', type=int, default=5)
+    args = parser.parse_args()
+
+    exam = {
+        'id': 1,
+        'randomize_questions': True,
+        'draw_spec': [{'topic': t, 'difficulty': d, 'count': args.per_rule} for t in TOPICS for d in DIFFICULTIES],
+    }
+    cur = BankCursor(args.bank)
+
+    start = time.perf_counter()
+    papers.get_pools(cur, exam['id'])
+    build = time.perf_counter() - start
+
+    seeds = [papers.new_seed() for _ in range(args.students)]
+    start = time.perf_counter()
+    sizes = [len(papers.paper_question_ids(cur, exam, seed)) for seed in seeds]
+    draw = time.perf_counter() - start
+
+    assert papers.paper_question_ids(cur, exam, seeds[0]) == papers.paper_question_ids(cur, exam, seeds[0])
+    print(f'bank size:        {args.bank} questions')
+    print(f'pool build:       {build * 1000:.1f} ms (once per exam per worker)')
+    print(f'paper size:       {sizes[0]} questions')
+    print(f'{args.students} draws:       {draw * 1000:.1f} ms total, {draw / args.students * 1e6:.0f} us per student')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Measure the parse and plan time saved by the prepared hot statements.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_prepared.py --runs 2000
+
+Seeds one exam with submitted answers, then runs each statement registered
+in prepared.py --runs times on one connection: as an ordinary query, parsed
+and planned on every run as before, and executed by name. The planning time
+Postgres reports for each ordinary query is printed alongside. The test
+data is removed afterwards.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import app  # noqa: E402,F401  (registers load_user and save_answer)
+import database  # noqa: E402
+import prepared  # noqa: E402
+import regrade  # noqa: E402,F401
+
+OPTIONS = '[{"text": "a", "correct": true}, {"text": "b", "correct": false}]'
+
+
+def seed_data(cur, students, questions):
+    cur.execute("INSERT INTO users (fullname, email, password_hash, role) VALUES ('Bench Teacher', 'bench-teacher@example.com', 'x', 'teacher') RETURNING id")
+    teacher_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO exams (title, duration, teacher_id, class) VALUES ('Bench prepared', 60, %s, 'BENCH') RETURNING id", (teacher_id,))
+    exam_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO questions (teacher_id, question_text, question_type, options, correct_answer)
+        SELECT %s, 'Bench question ' || n, 'single-choice', %s, '["0"]'
+        FROM generate_series(1, %s) n
+    """, (teacher_id, OPTIONS, questions))
+    cur.execute("""
+        INSERT INTO exam_questions (exam_id, question_id, position)
+        SELECT %s, id, ROW_NUMBER() OVER (ORDER BY id) FROM questions WHERE teacher_id = %s
+    """, (exam_id, teacher_id))
+    cur.execute("""
+        INSERT INTO users (fullname, email, password_hash, role, class)
+        SELECT 'Candidate ' || n, 'bench-' || n || '@example.com', 'x', 'student', 'BENCH'
+        FROM generate_series(1, %s) n
+    """, (students,))
+    cur.execute("""
+        INSERT INTO exam_submissions (student_id, exam_id, status, seed)
+        SELECT id, %s, 'submitted', id FROM users WHERE email LIKE 'bench-%%@example.com' AND role = 'student'
+    """, (exam_id,))
+    cur.execute("""
+        INSERT INTO student_answers (submission_id, question_id, answer_mask)
+        SELECT s.id, eq.question_id, (1 << ((s.id + eq.question_id) %% 2))::smallint
+        FROM exam_submissions s JOIN exam_questions eq ON eq.exam_id = s.exam_id
+        WHERE s.exam_id = %s
+    """, (exam_id,))
+    cur.execute("SELECT question_id FROM exam_questions WHERE exam_id = %s ORDER BY position", (exam_id,))
+    question_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT id, student_id FROM exam_submissions WHERE exam_id = %s ORDER BY id LIMIT 1", (exam_id,))
+    submission_id, student_id = cur.fetchone()
+    return teacher_id, exam_id, question_ids, submission_id, student_id
+
+
+def planning_ms(cur, name, params):
+    query, query_params = prepared.ad_hoc(name, params)
+    cur.execute('EXPLAIN (SUMMARY) ' + query, query_params)
+    for (line,) in cur.fetchall():
+        if line.startswith('Planning Time:'):
+            return float(line.split()[2])
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=40)
+    args = parser.parse_args()
+
+    database.init_db()
+    conn = database.get_db_connection()
+    cur = conn.cursor()
+    teacher_id, exam_id, question_ids, submission_id, student_id = seed_data(cur, args.students, args.questions)
+    conn.commit()
+
+    cases = {
+        'load_user': (student_id,),
+        'save_answer': (submission_id, question_ids[0], '0'),
+        'paper_questions': (exam_id, question_ids),
+        'score_submissions': ([submission_id], [submission_id] * len(question_ids), question_ids, [], []),
+    }
+    try:
+        print(f'{args.runs} runs per statement, one connection')
+        print(f"{'statement':<18} {'planning':>9} {'ad hoc':>9} {'prepared':>9} {'saved':>9}")
+        for name, params in cases.items():
+            plan = planning_ms(cur, name, params)
+            conn.rollback()
+
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                cur.execute(*prepared.ad_hoc(name, params))
+                conn.commit()
+            plain = (time.perf_counter() - start) / args.runs * 1000
+
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                prepared.execute(cur, name, params)
+                conn.commit()
+            by_name = (time.perf_counter() - start) / args.runs * 1000
+            print(f'{name:<18} {plan:>7.3f}ms {plain:>7.3f}ms {by_name:>7.3f}ms {plain - by_name:>7.3f}ms')
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+        cur.execute("DELETE FROM questions WHERE teacher_id = %s", (teacher_id,))
+        cur.execute("DELETE FROM users WHERE email LIKE 'bench-%%@example.com'")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Measure question bank search on a large bank.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_question_search.py --questions 300000
+
+Seeds one teacher's bank with --questions generated questions, then times
+a few searches through question_bank.search_questions (the GIN-indexed
+search_vector) against a plain ILIKE scan over question_text and options
+for the same words, which is what searching without the index costs. The
+test data is removed afterwards.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import psycopg2.extras  # noqa: E402
+
+import database  # noqa: E402
+import question_bank  # noqa: E402
+
+SUBJECTS = ['photosynthesis', 'triangle', 'democracy', 'volcano', 'electron', 'grammar', 'equation', 'river',
+            'nutrition', 'algebra', 'harvest', 'parliament', 'magnet', 'poetry', 'fraction', 'climate']
+SYLLABLES = ['ka', 'lo', 'mi', 'ru', 'te', 'sa', 'no', 'vi', 'pe', 'do', 'ga', 'fu', 'zo', 'be', 'hi', 'wa']
+# A common subject word, a rare made-up term, both together and an exclusion.
+SEARCHES = ['photosynthesis', 'kalomi', 'volcano kalomi', 'magnet -rutesa']
+
+
+def seed_data(cur, questions):
+    cur.execute("INSERT INTO users (fullname, email, password_hash, role) VALUES ('Bench Teacher', 'bench-search@example.com', 'x', 'teacher') RETURNING id")
+    teacher_id = cur.fetchone()[0]
+    # Each question names one of 16 subjects and two of 4096 made-up terms,
+    # and one option names a third term.
+    cur.execute("""
+        CREATE TEMPORARY TABLE bench_terms AS
+        SELECT row_number() OVER () - 1 AS n, a || b || c AS term
+        FROM unnest(%(syllables)s::text[]) a, unnest(%(syllables)s::text[]) b, unnest(%(syllables)s::text[]) c
+    """, {'syllables': SYLLABLES})
+    cur.execute("""
+        INSERT INTO questions (teacher_id, question_text, question_type, options, correct_answer, content_hash)
+        SELECT %(teacher_id)s,
+               'Question ' || g.i || ' on ' || (%(subjects)s::text[])[1 + g.i %% 16] || ': explain the '
+                   || t1.term || ' ' || t2.term || ' as taught this term',
+               'single-choice',
+               jsonb_build_array(jsonb_build_object('text', 'The ' || t3.term, 'correct', true),
+                                 jsonb_build_object('text', 'None of these', 'correct', false)),
+               '0', md5(g.i::text)
+        FROM generate_series(1, %(questions)s) g(i)
+        JOIN bench_terms t1 ON t1.n = (g.i::bigint * 7919) %% 4096
+        JOIN bench_terms t2 ON t2.n = (g.i::bigint * 104729) %% 4096
+        JOIN bench_terms t3 ON t3.n = (g.i::bigint * 1299709) %% 4096
+    """, {'teacher_id': teacher_id, 'subjects': SUBJECTS, 'questions': questions})
+    return teacher_id
+
+
+def ilike(cur, teacher_id, terms, per_page):
+    words = [word.strip('"') for word in terms.split() if not word.startswith('-')]
+    cur.execute("""
+        SELECT id, question_text, question_type, topic, difficulty FROM questions
+        WHERE teacher_id = %s AND """ + ' AND '.join(["(question_text ILIKE %s OR options::text ILIKE %s)"] * len(words)) + """
+        ORDER BY id DESC LIMIT %s
+    """, [teacher_id] + [f'%{word}%' for word in words for _ in range(2)] + [per_page + 1])
+    return cur.fetchall()
+
+
+def timed(runs, fn):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return (time.perf_counter() - start) / runs * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=300000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    database.init_db()
+    conn = database.get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    start = time.perf_counter()
+    teacher_id = seed_data(cur, args.questions)
+    conn.commit()
+    cur.execute("ANALYZE questions")
+    conn.commit()
+    print(f'Seeded {args.questions} questions in {time.perf_counter() - start:.1f}s')
+
+    try:
+        print(f"{'search':<20} {'matches':>8} {'ILIKE':>9} {'page 1':>9} {'page 10':>9}")
+        for terms in SEARCHES:
+            scan_ms, _ = timed(args.runs, lambda: ilike(cur, teacher_id, terms, question_bank.SEARCH_PAGE_SIZE))
+            first_ms, _ = timed(args.runs, lambda: question_bank.search_questions(cur, teacher_id, terms))
+            deep_ms, _ = timed(args.runs, lambda: question_bank.search_questions(cur, teacher_id, terms, page=10))
+            cur.execute("SELECT count(*) FROM questions WHERE teacher_id = %s AND search_vector @@ websearch_to_tsquery('english', %s)",
+                        (teacher_id, terms))
+            matches = cur.fetchone()[0]
+            conn.rollback()
+            print(f'{terms:<20} {matches:>8} {scan_ms:>7.2f}ms {first_ms:>7.2f}ms {deep_ms:>7.2f}ms')
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM questions WHERE teacher_id = %s", (teacher_id,))
+        cur.execute("DELETE FROM users WHERE id = %s", (teacher_id,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark regrading a 1,000-student exam after its answer key changes.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_regrade.py --students 1000
+
+Seeds one submitted exam, flips the key of one question, and compares
+scoring each submission on its own connection (what calling
+calculate_score per submission did) with regrade.regrade_exams, which
+scores them all in one statement. The test data is removed afterwards.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import psycopg2.extras  # noqa: E402
+
+import database  # noqa: E402
+import regrade  # noqa: E402
+
+OPTIONS = '[{"text": "a", "correct": %s}, {"text": "b", "correct": %s}]'
+
+
+def seed_data(cur, students, questions):
+    cur.execute("INSERT INTO users (fullname, email, password_hash, role) VALUES ('Bench Teacher', 'bench-teacher@example.com', 'x', 'teacher') RETURNING id")
+    teacher_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO exams (title, duration, teacher_id, class) VALUES ('Bench regrade', 60, %s, 'BENCH') RETURNING id", (teacher_id,))
+    exam_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO questions (teacher_id, question_text, question_type, options, correct_answer)
+        SELECT %s, 'Bench question ' || n, 'single-choice', %s, '["0"]'
+        FROM generate_series(1, %s) n
+    """, (teacher_id, OPTIONS % ('true', 'false'), questions))
+    cur.execute("""
+        INSERT INTO exam_questions (exam_id, question_id, position)
+        SELECT %s, id, ROW_NUMBER() OVER (ORDER BY id) FROM questions WHERE teacher_id = %s
+    """, (exam_id, teacher_id))
+    cur.execute("""
+        INSERT INTO users (fullname, email, password_hash, role, class)
+        SELECT 'Candidate ' || n, 'bench-' || n || '@example.com', 'x', 'student', 'BENCH'
+        FROM generate_series(1, %s) n
+    """, (students,))
+    cur.execute("""
+        INSERT INTO exam_submissions (student_id, exam_id, status, seed)
+        SELECT id, %s, 'submitted', id FROM users WHERE email LIKE 'bench-%%@example.com' AND role = 'student'
+    """, (exam_id,))
+    cur.execute("""
+        INSERT INTO student_answers (submission_id, question_id, answer_mask)
+        SELECT s.id, eq.question_id, (1 << ((s.id + eq.question_id) %% 2))::smallint
+        FROM exam_submissions s JOIN exam_questions eq ON eq.exam_id = s.exam_id
+        WHERE s.exam_id = %s
+    """, (exam_id,))
+    cur.execute("SELECT MIN(question_id) FROM exam_questions WHERE exam_id = %s", (exam_id,))
+    return teacher_id, exam_id, cur.fetchone()[0]
+
+
+def flip_key(conn, question_id, correct_first):
+    with conn.cursor() as cur:
+        cur.execute("UPDATE questions SET options = %s WHERE id = %s",
+                    (OPTIONS % (('true', 'false') if correct_first else ('false', 'true')), question_id))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=60)
+    args = parser.parse_args()
+
+    database.init_db()
+    conn = database.get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    teacher_id, exam_id, question_id = seed_data(cur, args.students, args.questions)
+    regrade.regrade_exams(cur, [exam_id])
+    conn.commit()
+    cur.execute("SELECT id FROM exam_submissions WHERE exam_id = %s", (exam_id,))
+    submission_ids = [row[0] for row in cur.fetchall()]
+
+    try:
+        flip_key(conn, question_id, correct_first=False)
+        start = time.perf_counter()
+        changed = 0
+        for submission_id in submission_ids:
+            per_conn = database.get_db_connection()
+            per_cur = per_conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            changed += regrade.score_submissions(per_cur, [submission_id])
+            per_conn.commit()
+            per_conn.close()
+        elapsed = time.perf_counter() - start
+        print(f'one submission at a time: {elapsed:.2f} s, {changed} scores changed')
+
+        flip_key(conn, question_id, correct_first=True)
+        start = time.perf_counter()
+        regraded, changed = regrade.regrade_exams(cur, [exam_id])
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        print(f'set-based regrade: {elapsed:.2f} s, {regraded} submissions, {changed} scores changed')
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+        cur.execute("DELETE FROM questions WHERE teacher_id = %s", (teacher_id,))
+        cur.execute("DELETE FROM users WHERE email LIKE 'bench-%%@example.com'")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
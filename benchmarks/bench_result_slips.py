@@ -0,0 +1,59 @@
+"""Benchmark result slip generation for a class of 1,000 students.
+
+Run from the repository root:
+
+    python benchmarks/bench_result_slips.py --students 1000 --exams 10
+
+The database is not needed: synthetic students are passed straight into
+the same render/zip pipeline used by the background job.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from result_slips import write_slips_zip  # noqa: E402
+
+
+def make_students(count, exams):
+    for i in range(count):
+        yield {
+            'id': i + 1,
+            'fullname': f'Student {i + 1}',
+            'email': f'student{i + 1}@example.com',
+            'class': 'SS 2',
+            'results': [
+                {'title': f'Exam {j + 1}', 'score': (i * 7 + j * 13) % 101, 'end_time': '2026-07-20'}
+                for j in range(exams)
+            ],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--exams', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'slips.zip')
+        start = time.perf_counter()
+        done = write_slips_zip(make_students(args.students, args.exams), path, max_workers=args.workers)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'students:      {done}')
+    print(f'workers:       {args.workers or os.cpu_count()}')
+    print(f'elapsed:       {elapsed:.2f}s ({done / elapsed:.0f} slips/s)')
+    print(f'zip size:      {size / 1024:.0f} KiB')
+    print(f'parent max RSS: {peak_rss_mb:.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
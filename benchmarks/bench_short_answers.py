@@ -0,0 +1,60 @@
+"""Benchmark short-answer matching on the grade-on-submit path.
+
+Run from the repository root:
+
+    python benchmarks/bench_short_answers.py --answers 100000
+
+The database is not needed: synthetic answers are matched against a mix of
+keys using every kind of accepted answer, first with a cold matcher cache
+and then with the matchers already compiled.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import short_answers  # noqa: E402
+
+KEYS = [
+    'Paris',
+    'Abuja | Lagos',
+    'photosynthesis ~2',
+    '3.14 +- 0.01',
+    '1,000',
+    '/colou?r/',
+    'mitochondria ~1 | powerhouse of the cell',
+]
+ANSWERS = ['paris', 'PARIS.', 'abuja', 'fotosynthesis', '3.141', '1000', 'color', 'colour',
+           'the mitochondrion', 'Powerhouse of the cell!', 'london', '42', '']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--answers', type=int, default=100000)
+    parser.add_argument('--questions', type=int, default=500, help='distinct keys, as in a term of exams')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Distinct keys, as different questions would have.
+    keys = [f'{rng.choice(KEYS)} | variant {i}' for i in range(args.questions)]
+    rows = [(rng.choice(ANSWERS), rng.choice(keys)) for _ in range(args.answers)]
+
+    short_answers.compile_key.cache_clear()
+    start = time.perf_counter()
+    correct = sum(short_answers.is_correct(answer, key) for answer, key in rows)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sum(short_answers.is_correct(answer, key) for answer, key in rows)
+    warm = time.perf_counter() - start
+
+    print(f'{args.answers} answers against {args.questions} keys, {correct} correct')
+    print(f'cold cache: {cold:.3f} s ({cold / args.answers * 1e6:.1f} us per answer)')
+    print(f'warm cache: {warm:.3f} s ({warm / args.answers * 1e6:.1f} us per answer)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark worker startup: time to import the app and RSS after boot.
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py --runs 10
+
+Each run imports the app in a fresh interpreter, the same way a gunicorn
+worker boots. --eager additionally imports the upload, export and OAuth
+dependencies to show what every worker used to pay at startup.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+BOOT = """
+import resource, time
+start = time.perf_counter()
+import app
+{eager}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+EAGER_IMPORTS = """
+import pandas, fpdf, xlsxwriter, requests, cachecontrol
+import google.oauth2.id_token, google.auth.transport.requests, google_auth_oauthlib.flow
+"""
+
+
+def boot(eager):
+    code = BOOT.format(eager=EAGER_IMPORTS if eager else '')
+    env = dict(os.environ, DATABASE_URL=os.environ.get('DATABASE_URL', 'postgresql://localhost/unused'))
+    out = subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    elapsed, rss_kb = out.split()
+    return float(elapsed), int(rss_kb) / 1024
+
+
+def report(label, samples):
+    times = [t for t, _ in samples]
+    rss = [r for _, r in samples]
+    print(f'{label:<8} import: median {statistics.median(times) * 1000:.0f} ms, '
+          f'min {min(times) * 1000:.0f} ms   RSS after boot: {statistics.median(rss):.0f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--eager', action='store_true', help='also measure with heavy imports loaded')
+    args = parser.parse_args()
+
+    report('lazy', [boot(False) for _ in range(args.runs)])
+    if args.eager:
+        report('eager', [boot(True) for _ in range(args.runs)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Measure the cost of taking exam page telemetry beacons.
+
+Run from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://localhost/cbt_bench python benchmarks/bench_telemetry.py --beacons 5000
+
+Writes --beacons beacons of 5 events each in their own INSERT and commit,
+as an endpoint writing each beacon as it arrives would, and through the
+telemetry buffer, written in one batch. Then times the /telemetry endpoint
+itself through the Flask test client. The rows written are removed
+afterwards.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import psycopg2.extras  # noqa: E402
+
+import app  # noqa: E402
+import database  # noqa: E402
+import telemetry  # noqa: E402
+
+EVENTS = [{'type': 'save', 'ms': 120}, {'type': 'save', 'ms': 95}, {'type': 'save', 'ms': 340},
+          {'type': 'save_failed', 'ms': 5000}, {'type': 'navigation', 'ms': 1800}]
+BENCH_EXAM_ID = -1
+
+
+def per_beacon(beacons):
+    """Each beacon written as it arrives, one transaction per beacon."""
+    start = time.perf_counter()
+    for _ in range(beacons):
+        conn = database.get_db_connection()
+        cur = conn.cursor()
+        psycopg2.extras.execute_values(cur, "INSERT INTO client_metrics (exam_id, kind, duration_ms, weight) VALUES %s",
+                                       [(BENCH_EXAM_ID, kind, duration, 1) for kind, duration in telemetry.parse_events(EVENTS)])
+        conn.commit()
+        cur.close()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def buffered(beacons):
+    """The same beacons added to the buffer, then written in one flush."""
+    events = telemetry.parse_events(EVENTS)
+    start = time.perf_counter()
+    for _ in range(beacons):
+        telemetry.buffer.add(BENCH_EXAM_ID, events)
+    telemetry.buffer.flush()
+    return time.perf_counter() - start
+
+
+def endpoint(beacons):
+    """Beacons posted to /telemetry, which only parses and buffers them."""
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    body = json.dumps({'exam_id': BENCH_EXAM_ID, 'events': EVENTS})
+    start = time.perf_counter()
+    for _ in range(beacons):
+        client.post('/telemetry', data=body, content_type='text/plain;charset=UTF-8')
+    taken = time.perf_counter() - start
+    telemetry.buffer.flush()
+    return taken
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--beacons', type=int, default=5000)
+    args = parser.parse_args()
+
+    database.init_db()
+    # Keep the background flush and sampling out of the measurement.
+    telemetry.buffer.flush_interval = 3600
+    telemetry.buffer.flush_size = telemetry.buffer.sample_above = telemetry.buffer.max_buffered = 10 ** 9
+    try:
+        direct = per_beacon(args.beacons)
+        batched = buffered(args.beacons)
+        posted = endpoint(args.beacons)
+        print(f'{args.beacons} beacons of {len(EVENTS)} events')
+        print(f'insert per beacon:  {direct / args.beacons * 1000:7.3f} ms/beacon ({args.beacons} transactions)')
+        print(f'buffered, 1 flush:  {batched / args.beacons * 1000:7.3f} ms/beacon ({direct / batched:.0f}x less)')
+        print(f'/telemetry request: {posted / args.beacons * 1000:7.3f} ms/beacon (no database work)')
+    finally:
+        conn = database.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM client_metrics WHERE exam_id = %s", (BENCH_EXAM_ID,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import psycopg2
+import pytest
+
+# The app's modules are imported flat, as app.py itself imports them.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+
+@pytest.fixture
+def database_url():
+    """A scratch PostgreSQL database for the tests that need one, from TEST_DATABASE_URL."""
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    return url
+
+
+@pytest.fixture
+def db(database_url):
+    conn = psycopg2.connect(database_url)
+    yield conn
+    conn.close()
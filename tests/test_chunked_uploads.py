@@ -0,0 +1,128 @@
+import hashlib
+import os
+import time
+import zlib
+
+import pytest
+
+import chunked_uploads
+import shared_state
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def state():
+    return shared_state.MemoryState()
+
+
+@pytest.fixture
+def upload(state, tmp_path):
+    return chunked_uploads.create_session(state, str(tmp_path), 1, 'questions', 'q.csv', len(DATA),
+                                          sha256=hashlib.sha256(DATA).hexdigest())
+
+
+def write(folder, upload, offset, data, crc32=None):
+    return chunked_uploads.write_chunk(str(folder), upload, offset, data,
+                                       zlib.crc32(data) if crc32 is None else crc32)
+
+
+def wait_until_processed(state, upload_id):
+    for _ in range(200):
+        upload = chunked_uploads.get_session(state, upload_id)
+        if upload['status'] != 'processing':
+            return upload
+        time.sleep(0.01)
+    raise AssertionError('upload still processing')
+
+
+def test_chunks_continue_from_the_bytes_received(state, tmp_path, upload):
+    assert chunked_uploads.received(str(tmp_path), upload['id']) == 0
+    assert write(tmp_path, upload, 0, DATA[:4000]) == 4000
+    assert write(tmp_path, upload, 4000, DATA[4000:8000]) == 8000
+    assert chunked_uploads.received(str(tmp_path), upload['id']) == 8000
+    assert write(tmp_path, upload, 8000, DATA[8000:]) == len(DATA)
+    assert chunked_uploads.get_session(state, upload['id'])['status'] == 'uploading'
+
+
+@pytest.mark.parametrize('offset', [0, 1000, 5000])
+def test_chunk_at_wrong_offset_is_refused(tmp_path, upload, offset):
+    write(tmp_path, upload, 0, DATA[:2000])
+    with pytest.raises(ValueError, match='does not start'):
+        write(tmp_path, upload, offset, DATA[offset:offset + 1000])
+    assert chunked_uploads.received(str(tmp_path), upload['id']) == 2000
+
+
+def test_resending_a_lost_chunk_after_a_refusal(tmp_path, upload):
+    write(tmp_path, upload, 0, DATA[:3000])
+    with pytest.raises(ValueError):
+        write(tmp_path, upload, 0, DATA[:3000])
+    offset = chunked_uploads.received(str(tmp_path), upload['id'])
+    assert write(tmp_path, upload, offset, DATA[offset:]) == len(DATA)
+    with open(os.path.join(str(tmp_path), upload['id'] + '.part'), 'rb') as part:
+        assert part.read() == DATA
+
+
+def test_damaged_chunk_is_refused(tmp_path, upload):
+    with pytest.raises(ValueError, match='damaged'):
+        write(tmp_path, upload, 0, DATA[:1000], crc32=zlib.crc32(DATA[:1000]) ^ 1)
+    assert chunked_uploads.received(str(tmp_path), upload['id']) == 0
+
+
+@pytest.mark.parametrize('data', [b'', DATA + b'x'])
+def test_empty_or_overlong_chunk_is_refused(tmp_path, upload, data):
+    with pytest.raises(ValueError, match='past the end'):
+        write(tmp_path, upload, 0, data)
+
+
+def test_expired_upload_is_refused(tmp_path, upload):
+    os.remove(os.path.join(str(tmp_path), upload['id'] + '.part'))
+    with pytest.raises(ValueError, match='expired'):
+        write(tmp_path, upload, 0, DATA)
+
+
+@pytest.mark.parametrize('purpose, filename, size, sha256', [
+    ('video', 'a.mp4', 10, None),
+    ('questions', 'a.exe', 10, None),
+    ('questions', 'a.csv', 0, None),
+    ('questions', 'a.csv', True, None),
+    ('questions', 'a.csv', chunked_uploads.MAX_SIZES['questions'] + 1, None),
+    ('image', 'a.png', 10, 'not-a-checksum'),
+])
+def test_create_session_refuses_bad_files(state, tmp_path, purpose, filename, size, sha256):
+    with pytest.raises(ValueError):
+        chunked_uploads.create_session(state, str(tmp_path), 1, purpose, filename, size, sha256=sha256)
+
+
+def test_finish_runs_handler_once(state, tmp_path, upload):
+    write(tmp_path, upload, 0, DATA)
+    seen = []
+
+    def handler(path, upload):
+        with open(path, 'rb') as f:
+            seen.append(f.read())
+        return {'questions': 3}
+
+    assert chunked_uploads.finish(state, str(tmp_path), upload, handler)
+    assert not chunked_uploads.finish(state, str(tmp_path), dict(upload), handler)
+    finished = wait_until_processed(state, upload['id'])
+    assert finished['status'] == 'done' and finished['result'] == {'questions': 3}
+    assert seen == [DATA]
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_finish_rejects_a_file_that_fails_its_checksum(state, tmp_path, upload):
+    write(tmp_path, upload, 0, DATA[::-1])
+    assert chunked_uploads.finish(state, str(tmp_path), upload, lambda path, upload: None)
+    finished = wait_until_processed(state, upload['id'])
+    assert finished['status'] == 'failed' and 'damaged' in finished['error']
+
+
+def test_purge_abandoned(tmp_path, upload):
+    old = os.path.join(str(tmp_path), upload['id'] + '.part')
+    os.utime(old, (0, 0))
+    (tmp_path / 'fresh.part').write_bytes(b'x')
+    (tmp_path / 'keep.txt').write_bytes(b'x')
+    os.utime(str(tmp_path / 'keep.txt'), (0, 0))
+    assert chunked_uploads.purge_abandoned(str(tmp_path), 60) == 1
+    assert sorted(os.listdir(str(tmp_path))) == ['fresh.part', 'keep.txt']
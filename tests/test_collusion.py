@@ -0,0 +1,71 @@
+import numpy as np
+
+import collusion
+
+CORRECT = 1
+
+
+def choice_rows(submission_id, masks):
+    """Answer rows for choice questions 1, 2, ... with the given answer masks (None for unanswered)."""
+    return [(submission_id, question_id, mask, None, 'single-choice', CORRECT, None)
+            for question_id, mask in enumerate(masks, 1) if mask is not None]
+
+
+def analyse(submission_ids, rows, **kwargs):
+    return collusion.score_pairs(*collusion.encode_answers(submission_ids, rows), **kwargs)
+
+
+def test_pack_rows_pads_to_whole_words():
+    packed = collusion.pack_rows(np.array([[True] + [False] * 64 + [True]]))
+    assert packed.dtype == np.uint64 and packed.shape == (1, 2)
+    assert collusion._count_bits(packed).tolist() == [2]
+
+
+def test_flags_pair_sharing_wrong_answers():
+    rows = (choice_rows(10, [2, 2, 4, 1, 1])
+            + choice_rows(11, [2, 2, 4, 1, 1])
+            + choice_rows(12, [1, 1, 1, 1, 1])
+            + choice_rows(13, [4, 2, 2, 1, None]))
+    pairs = analyse([10, 11, 12, 13], rows)
+    assert pairs[0] == (0, 1, 3, 0, 5, 3.0)
+    assert all(shared >= collusion.MIN_SHARED_WRONG for _, _, shared, _, _, _ in pairs)
+    assert not any(2 in pair[:2] for pair in pairs)
+
+
+def test_differing_answers_lower_the_score():
+    rows = (choice_rows(1, [2, 2, 2, 2, 2, 2])
+            + choice_rows(2, [2, 2, 2, 2, 2, 2])
+            + choice_rows(3, [2, 2, 2, 4, 4, 4]))
+    pairs = analyse([1, 2, 3], rows)
+    assert [(i, j) for i, j, *_ in pairs] == [(0, 1), (0, 2), (1, 2)]
+    assert pairs[1] == (0, 2, 3, 3, 6, 0.75)
+
+
+def test_short_answers_match_when_normalized():
+    rows = [(s, q, None, text, 'short-answer', None, 'Paris')
+            for s, texts in ((1, ['Rome', 'Lyon', 'Nice']), (2, ['rome.', ' LYON', 'nice']))
+            for q, text in enumerate(texts, 1)]
+    assert analyse([1, 2], rows) == [(0, 1, 3, 0, 3, 3.0)]
+
+
+def test_results_do_not_depend_on_block_size():
+    rng = np.random.default_rng(7)
+    submission_ids = list(range(40))
+    rows = [row for s in submission_ids for row in choice_rows(s, rng.choice([1, 2, 4], size=20, p=[.5, .3, .2]))]
+    # Pairs tied on score may come out in either order.
+    expected = sorted(analyse(submission_ids, rows, limit=1000))
+    assert expected
+    assert sorted(analyse(submission_ids, rows, limit=1000, block_bytes=1)) == expected
+
+
+def test_report_keeps_the_best_pairs():
+    rows = [row for s in range(6) for row in choice_rows(s, [2] * (3 + s))]
+    pairs = analyse(list(range(6)), rows, limit=3)
+    assert len(pairs) == 3
+    assert [score for *_, score in pairs] == sorted((score for *_, score in pairs), reverse=True)
+    assert pairs[0][:2] == (4, 5)
+
+
+def test_nothing_to_compare():
+    assert analyse([], []) == []
+    assert analyse([1], choice_rows(1, [2, 2, 2])) == []
@@ -0,0 +1,91 @@
+import types
+
+import psycopg2
+import pytest
+from google.oauth2 import id_token
+
+
+@pytest.fixture
+def claims():
+    return {'iss': 'accounts.google.com', 'email': 'google-student@example.com', 'name': 'Google Student'}
+
+
+@pytest.fixture
+def cbt(database_url, claims, monkeypatch):
+    """The Flask app against the test database, with Google replaced by a fake provider."""
+    monkeypatch.setenv('DATABASE_URL', database_url)
+    import database
+    database.init_db()
+    import app as cbt
+
+    cbt.app.config['TESTING'] = True
+    flow = types.SimpleNamespace(fetch_token=lambda **kwargs: None,
+                                 credentials=types.SimpleNamespace(id_token='token'))
+    monkeypatch.setattr(cbt, 'get_google_flow', lambda: flow)
+    monkeypatch.setattr(cbt, 'get_google_token_request', lambda: None)
+    monkeypatch.setattr(id_token, 'verify_token', lambda *args, **kwargs: dict(claims))
+
+    conn = psycopg2.connect(database_url)
+    conn.cursor().execute("DELETE FROM users WHERE email = %s", (claims['email'],))
+    conn.commit()
+    yield cbt
+    conn.cursor().execute("DELETE FROM users WHERE email = %s", (claims['email'],))
+    conn.commit()
+    conn.close()
+
+
+def google_login(cbt):
+    client = cbt.app.test_client()
+    response = client.get('/google/callback?code=code&state=state')
+    with client.session_transaction() as session:
+        user_id = session.get('_user_id')
+    return response, user_id
+
+
+def user_ids(db, email):
+    cur = db.cursor()
+    cur.execute("SELECT id FROM users WHERE email = %s", (email,))
+    ids = [row[0] for row in cur.fetchall()]
+    db.commit()
+    return ids
+
+
+def test_new_user_is_created_as_student(cbt, claims, db):
+    response, user_id = google_login(cbt)
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/student/dashboard')
+    assert user_ids(db, claims['email']) == [int(user_id)]
+    cur = db.cursor()
+    cur.execute("SELECT fullname, role FROM users WHERE id = %s", (int(user_id),))
+    assert cur.fetchone() == ('Google Student', 'student')
+
+
+def test_existing_user_is_logged_in_without_a_write(cbt, claims, db, monkeypatch):
+    _, first_id = google_login(cbt)
+    monkeypatch.setattr(cbt, 'hash_password', lambda password: pytest.fail('an existing user was inserted again'))
+    response, user_id = google_login(cbt)
+    assert response.status_code == 302
+    assert user_id == first_id
+    assert user_ids(db, claims['email']) == [int(first_id)]
+
+
+def test_user_created_by_a_concurrent_login_is_looked_up_again(cbt, claims, db, monkeypatch):
+    # The other login inserts the user between this one's lookup and insert,
+    # so the insert conflicts and returns nothing.
+    hash_password = cbt.hash_password
+
+    def concurrent_login(password):
+        cur = db.cursor()
+        cur.execute("INSERT INTO users (fullname, email, password_hash, role, status) "
+                    "VALUES ('Google Student', %s, 'x', 'student', 'approved') RETURNING id", (claims['email'],))
+        concurrent_ids.append(cur.fetchone()[0])
+        db.commit()
+        return hash_password(password)
+
+    concurrent_ids = []
+    monkeypatch.setattr(cbt, 'hash_password', concurrent_login)
+    response, user_id = google_login(cbt)
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/student/dashboard')
+    assert int(user_id) == concurrent_ids[0]
+    assert user_ids(db, claims['email']) == concurrent_ids
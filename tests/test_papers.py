@@ -0,0 +1,79 @@
+import pytest
+
+import papers
+
+ROWS = [
+    (1, 'Algebra', 'easy'),
+    (2, 'Algebra', 'hard'),
+    (3, 'Geometry', 'easy'),
+    (4, 'Algebra', 'easy'),
+    (5, None, None),
+]
+
+
+def exam(draw_spec=None, randomize=False):
+    return {'id': 1, 'draw_spec': draw_spec, 'randomize_questions': randomize}
+
+
+def test_build_pools():
+    pools = papers.build_pools(ROWS)
+    assert pools[('Algebra', 'easy')] == (1, 4)
+    assert pools[('Algebra', None)] == (1, 2, 4)
+    assert pools[(None, 'easy')] == (1, 3, 4)
+    assert pools[(None, None)] == (1, 2, 3, 4, 5)
+
+
+def test_untagged_question_is_pooled_once():
+    assert papers.build_pools([(7, None, None)]) == {(None, None): (7,)}
+
+
+def test_draw_without_spec_takes_every_question_in_order():
+    assert papers.draw_paper(papers.build_pools(ROWS), exam(), 1) == [1, 2, 3, 4, 5]
+
+
+def test_draw_is_reproducible_from_seed():
+    pools = papers.build_pools(ROWS)
+    spec = [{'topic': 'Algebra', 'difficulty': None, 'count': 2}, {'topic': None, 'difficulty': None, 'count': 2}]
+    first = papers.draw_paper(pools, exam(spec, randomize=True), 42)
+    assert first == papers.draw_paper(pools, exam(spec, randomize=True), 42)
+    assert len(first) == len(set(first))
+
+
+def test_draw_follows_rules():
+    pools = papers.build_pools(ROWS)
+    spec = [{'topic': 'Algebra', 'difficulty': 'easy', 'count': 5}, {'topic': 'Geometry', 'difficulty': None, 'count': 1}]
+    for seed in range(20):
+        # A rule asking for more than its pool holds takes the whole pool.
+        assert sorted(papers.draw_paper(pools, exam(spec), seed)) == [1, 3, 4]
+
+
+def test_draw_skips_questions_drawn_by_an_earlier_rule():
+    pools = papers.build_pools(ROWS)
+    spec = [{'topic': 'Algebra', 'difficulty': 'easy', 'count': 2}, {'topic': 'Algebra', 'difficulty': None, 'count': 3}]
+    assert sorted(papers.draw_paper(pools, exam(spec), 3)) == [1, 2, 4]
+
+
+def test_draw_from_missing_pool_is_empty():
+    spec = [{'topic': 'History', 'difficulty': None, 'count': 3}]
+    assert papers.draw_paper(papers.build_pools(ROWS), exam(spec), 1) == []
+
+
+def test_parse_draw_spec():
+    rules = papers.parse_draw_spec('Algebra, easy, 5\n\n*, hard, 2\n, , 1\n')
+    assert rules == [
+        {'topic': 'Algebra', 'difficulty': 'easy', 'count': 5},
+        {'topic': None, 'difficulty': 'hard', 'count': 2},
+        {'topic': None, 'difficulty': None, 'count': 1},
+    ]
+    assert papers.parse_draw_spec(papers.format_draw_spec(rules)) == rules
+
+
+@pytest.mark.parametrize('text', ['', '  \n', None])
+def test_parse_empty_draw_spec(text):
+    assert papers.parse_draw_spec(text) is None
+
+
+@pytest.mark.parametrize('text', ['Algebra, easy', 'Algebra, easy, many', 'Algebra, easy, 0', 'a, b, 1, 2'])
+def test_parse_invalid_draw_spec(text):
+    with pytest.raises(ValueError):
+        papers.parse_draw_spec(text)
@@ -0,0 +1,56 @@
+import psycopg2
+import psycopg2.errors
+import pytest
+
+import database
+import prepared
+
+prepared.register('test_widgets', 'int', 'SELECT * FROM test_widgets WHERE id = $1')
+
+
+@pytest.fixture
+def widgets(db, monkeypatch):
+    monkeypatch.setattr(database, 'DB_POOL_SIZE', 4)
+    cur = db.cursor()
+    cur.execute('DROP TABLE IF EXISTS test_widgets; CREATE TABLE test_widgets (id INTEGER)')
+    cur.execute('INSERT INTO test_widgets VALUES (1)')
+    db.commit()
+    yield cur
+    db.rollback()
+    cur.execute('DEALLOCATE ALL; DROP TABLE test_widgets')
+    db.commit()
+
+
+def add_column(database_url):
+    other = psycopg2.connect(database_url)
+    other.cursor().execute('ALTER TABLE test_widgets ADD COLUMN name TEXT')
+    other.commit()
+    other.close()
+
+
+def test_statement_is_prepared_once(widgets):
+    prepared.execute(widgets, 'test_widgets', (1,))
+    prepared.execute(widgets, 'test_widgets', (1,))
+    widgets.execute("SELECT count(*) FROM pg_prepared_statements WHERE name = 'test_widgets'")
+    assert widgets.fetchone()[0] == 1
+
+
+def test_changed_columns_at_transaction_start_are_prepared_again(db, database_url, widgets):
+    prepared.execute(widgets, 'test_widgets', (1,))
+    db.commit()
+    add_column(database_url)
+    prepared.execute(widgets, 'test_widgets', (1,))
+    assert widgets.fetchall() == [(1, None)]
+
+
+def test_changed_columns_mid_transaction_recover_in_the_next_one(db, database_url, widgets):
+    prepared.execute(widgets, 'test_widgets', (1,))
+    db.commit()
+    add_column(database_url)
+    widgets.execute('SELECT 1')
+    with pytest.raises(psycopg2.errors.FeatureNotSupported):
+        prepared.execute(widgets, 'test_widgets', (1,))
+    db.rollback()
+    for _ in range(2):
+        prepared.execute(widgets, 'test_widgets', (1,))
+        assert widgets.fetchall() == [(1, None)]
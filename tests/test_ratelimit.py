@@ -0,0 +1,87 @@
+import pytest
+
+import ratelimit
+import shared_state
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return ratelimit.MemoryBackend()
+    if request.param == 'sqlite':
+        return ratelimit.SQLiteBackend(str(tmp_path / 'buckets.sqlite3'))
+    fakeredis = pytest.importorskip('fakeredis')
+    return shared_state.RedisState(fakeredis.FakeRedis(decode_responses=True))
+
+
+def stored_buckets(backend):
+    if isinstance(backend, ratelimit.MemoryBackend):
+        return dict(backend._buckets)
+    if isinstance(backend, ratelimit.SQLiteBackend):
+        return backend._connection().execute("SELECT key, tokens, updated FROM rate_limit_buckets").fetchall()
+    return {key: backend.client.hgetall(key) for key in backend.client.keys('ratelimit:*')}
+
+
+def test_bucket_empties_and_refills(backend):
+    for now in (0, 0, 0):
+        assert backend.take('k', 3, 1, 1, now)
+    assert not backend.take('k', 3, 1, 1, 0)
+    assert backend.take('k', 3, 1, 1, 1)
+    assert not backend.take('k', 3, 1, 1, 1)
+
+
+def test_refill_is_capped_at_capacity(backend):
+    assert backend.take('k', 2, 1, 1, 0)
+    for _ in range(2):
+        assert backend.take('k', 2, 1, 1, 1000)
+    assert not backend.take('k', 2, 1, 1, 1000)
+
+
+def test_zero_cost_checks_without_consuming(backend):
+    assert backend.take('k', 1, 1, 0, 0)
+    assert backend.take('k', 1, 1, 1, 0)
+    assert not backend.take('k', 1, 1, 0, 0)
+
+
+def test_keys_are_independent(backend):
+    assert backend.take('a', 1, 1, 1, 0)
+    assert not backend.take('a', 1, 1, 1, 0)
+    assert backend.take('b', 1, 1, 1, 0)
+
+
+def test_checks_do_not_write(backend):
+    assert backend.take('k', 2, 1, 0, 0)
+    assert not stored_buckets(backend)
+    backend.take('k', 2, 1, 1, 0)
+    before = stored_buckets(backend)
+    assert backend.take('k', 2, 1, 0, 0.5)
+    assert stored_buckets(backend) == before
+
+
+def test_full_buckets_are_forgotten(backend):
+    backend.take('k', 2, 1, 1, 0)
+    assert stored_buckets(backend)
+    if isinstance(backend, shared_state.RedisState):
+        # Redis expires the bucket once it has refilled instead.
+        assert 0 < backend.client.ttl('ratelimit:k') <= 2
+        return
+    backend.take('k', 2, 1, 0, 5)
+    assert not stored_buckets(backend)
+
+
+def test_limiter_blocked_does_not_consume(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: 100.0)
+    limiter = ratelimit.RateLimiter('login', 2, 60, ratelimit.MemoryBackend())
+    assert not limiter.blocked('1.2.3.4')
+    assert limiter.hit('1.2.3.4')
+    assert not limiter.blocked('1.2.3.4')
+    assert limiter.hit('1.2.3.4')
+    assert limiter.blocked('1.2.3.4')
+    assert not limiter.hit('1.2.3.4')
+    assert not limiter.blocked('5.6.7.8')
+
+
+def test_parse_limit():
+    assert ratelimit.parse_limit('20/60') == (20, 60.0)
+    with pytest.raises(ValueError):
+        ratelimit.parse_limit('20')
@@ -0,0 +1,64 @@
+import pytest
+
+import database
+
+
+@pytest.fixture
+def primary(database_url, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', database_url)
+    monkeypatch.delenv('DATABASE_REPLICA_URL', raising=False)
+    monkeypatch.setattr(database, '_replica_down_until', 0.0)
+    return database_url
+
+
+@pytest.fixture
+def replica(primary, monkeypatch):
+    # The test database stands in for the replica: it isn't in recovery, so
+    # it has no lag, and its connections are made read-only like a replica's.
+    monkeypatch.setenv('DATABASE_REPLICA_URL', primary)
+    return primary
+
+
+def connection_kind(conn):
+    cur = conn.cursor()
+    cur.execute('SHOW transaction_read_only')
+    read_only = cur.fetchone()[0] == 'on'
+    cur.close()
+    pooled = isinstance(conn, database.PooledConnection)
+    conn.close()
+    assert read_only != pooled
+    return 'replica' if read_only else 'primary'
+
+
+@database.read_replica
+def read_view():
+    return connection_kind(database.get_db_connection())
+
+
+def write_view():
+    return connection_kind(database.get_db_connection())
+
+
+def test_reads_use_the_replica(replica):
+    assert read_view() == 'replica'
+
+
+def test_writes_stay_on_the_primary(replica):
+    assert write_view() == 'primary'
+    assert read_view() == 'replica'
+    assert write_view() == 'primary'
+
+
+def test_reads_fall_back_without_a_replica(primary):
+    assert read_view() == 'primary'
+
+
+def test_reads_fall_back_while_the_replica_is_unreachable(primary, monkeypatch):
+    monkeypatch.setenv('DATABASE_REPLICA_URL', 'postgresql://postgres@/cbt?host=/nonexistent')
+    assert read_view() == 'primary'
+    assert database._replica_down_until > 0
+
+
+def test_reads_fall_back_while_the_replica_lags(replica, monkeypatch):
+    monkeypatch.setattr(database, 'REPLICA_MAX_LAG_SECONDS', -1)
+    assert read_view() == 'primary'
@@ -0,0 +1,46 @@
+import psycopg2
+import pytest
+
+import reaper
+
+
+@pytest.fixture
+def schema(database_url, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', database_url)
+    import database
+    database.init_db()
+
+
+def deleted_user(cur, email):
+    cur.execute("""
+        INSERT INTO users (fullname, email, password_hash, role, deleted_at)
+        VALUES ('Reaped', %s, 'x', 'student', now()) RETURNING id
+    """, (email,))
+    return cur.fetchone()[0]
+
+
+def test_a_user_that_stays_locked_is_skipped(schema, db, database_url, monkeypatch, capsys):
+    monkeypatch.setattr(reaper, 'LOCK_TIMEOUT', '10ms')
+    monkeypatch.setattr(reaper, 'LOCK_RETRIES', 2)
+    cur = db.cursor()
+    cur.execute("DELETE FROM users WHERE email LIKE 'reaped-%%@example.com'")
+    locked = deleted_user(cur, 'reaped-locked@example.com')
+    cur.execute("INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (%s, 'reaper-test', now())",
+                (locked,))
+    other = deleted_user(cur, 'reaped-other@example.com')
+    db.commit()
+
+    # Another transaction holds the locked user's token row until the run is over.
+    holder = psycopg2.connect(database_url)
+    holder.cursor().execute("SELECT * FROM password_reset_tokens WHERE user_id = %s FOR UPDATE", (locked,))
+    try:
+        removed = reaper.reap(db, pause=0)
+    finally:
+        holder.rollback()
+        holder.close()
+
+    assert removed[1] >= 1
+    cur.execute("SELECT id FROM users WHERE id IN (%s, %s)", (locked, other))
+    assert [row[0] for row in cur.fetchall()] == [locked]
+    assert f'user {locked}' in capsys.readouterr().out
+    assert reaper.reap(db, pause=0)[1] >= 1
@@ -0,0 +1,22 @@
+import regrade
+
+
+def test_stored_papers_and_answered_questions_make_the_pairs():
+    submissions = [(1, [10, 11, 12]), (2, None)]
+    answered = [(2, 10), (2, 13)]
+    params = regrade.score_params([1, 2], submissions, answered, [])
+    assert params == ([1, 2], [1, 1, 1, 2, 2], [10, 11, 12, 10, 13], [], [])
+
+
+def test_only_correct_short_answers_on_the_paper_are_marked():
+    short_rows = [
+        (1, 11, 'Paris', 'paris'),
+        (1, 12, 'Rome', 'paris'),
+        (1, 99, 'Paris', 'paris'),  # answered, but not on the stored paper
+    ]
+    params = regrade.score_params([1], [(1, [10, 11, 12])], [], short_rows)
+    assert params[3:] == ([1], [11])
+
+
+def test_unstored_papers():
+    assert regrade.unstored_papers([(1, [10]), (2, None), (3, [])]) == [2]
@@ -0,0 +1,66 @@
+import flask
+import pytest
+
+import sessions
+
+
+@pytest.fixture
+def store(tmp_path):
+    return sessions.SQLiteSessionStore(str(tmp_path / 'sessions.sqlite3'))
+
+
+@pytest.fixture
+def client(store):
+    app = flask.Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = sessions.ServerSideSessionInterface(store)
+
+    @app.route('/visit')
+    def visit():
+        flask.session['visits'] = flask.session.get('visits', 0) + 1
+        return ''
+
+    @app.route('/login/<user_id>')
+    def login(user_id):
+        flask.session['_user_id'] = user_id
+        return ''
+
+    @app.route('/logout')
+    def logout():
+        flask.session.pop('_user_id', None)
+        return ''
+
+    return app.test_client()
+
+
+def session_id(client):
+    cookie = client.get_cookie('session')
+    app = client.application
+    return app.session_interface._signer(app).unsign(cookie.value).decode()
+
+
+def test_unchanged_user_keeps_the_session_id(client, store):
+    client.get('/visit')
+    sid = session_id(client)
+    client.get('/visit')
+    assert session_id(client) == sid
+    assert store.load(sid) is not None
+
+
+@pytest.mark.parametrize('path', ['/login/2', '/logout'])
+def test_change_of_user_rotates_the_session_id(client, store, path):
+    client.get('/login/1')
+    client.get('/visit')
+    planted = session_id(client)
+    client.get(path)
+    assert session_id(client) != planted
+    assert store.load(planted) is None
+    assert store.load(session_id(client)) is not None
+
+
+def test_login_from_a_planted_session_rotates_its_id(client, store):
+    client.get('/visit')
+    planted = session_id(client)
+    client.get('/login/1')
+    assert session_id(client) != planted
+    assert store.load(planted) is None
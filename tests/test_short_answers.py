@@ -0,0 +1,60 @@
+import pytest
+
+import short_answers
+
+
+@pytest.mark.parametrize('answer, key', [
+    ('Paris', 'paris'),
+    ('  PARIS. ', 'Paris'),
+    ('x = 5', 'x=5'),
+    ('new   york', 'New York'),
+    ('3.0', '3'),
+    ('1,000', '1000'),
+    ('3.141', '3.14 +- 0.01'),
+    ('3.15', '3.14 ± 0.01'),
+    ('photosynthsis', 'photosynthesis ~2'),
+    ('color', '/colou?r/'),
+    ('Lagos', 'Abuja | Lagos'),
+])
+def test_accepts(answer, key):
+    assert short_answers.is_correct(answer, key)
+
+
+@pytest.mark.parametrize('answer, key', [
+    ('x+1', 'x-1'),
+    ('C', 'C++'),
+    ('C#', 'C'),
+    ('-5', '5'),
+    ('1,00', '100'),
+    ('3.2', '3.14 +- 0.01'),
+    ('photo', 'photosynthesis ~2'),
+    ('colours', '/colou?r/'),
+    ('', 'Paris'),
+    ('Paris', ''),
+    ('anything', '/[/'),
+])
+def test_rejects(answer, key):
+    assert not short_answers.is_correct(answer, key)
+
+
+def test_symbol_only_key_compares_as_written():
+    assert short_answers.is_correct(' ? ', '?')
+    assert not short_answers.is_correct('!', '?')
+
+
+@pytest.mark.parametrize('text, number', [
+    ('42', 42.0),
+    (' -3.5 ', -3.5),
+    ('+.5', 0.5),
+    ('1e3', 1000.0),
+    ('12,345', 12345.0),
+    ('1,234,567.5', 1234567.5),
+    ('1,00', None),
+    ('1234,567', None),
+    (',100', None),
+    ('12 apples', None),
+    ('', None),
+])
+def test_parse_number(text, number):
+    assert short_answers.parse_number(text) == number
+